@@ -9,11 +9,56 @@ Params = {
     "port": 8000,
     'url': '/assets/report/',
     'request_timeout': 30,
+    # 增量汇报：只发送相对上一次被确认数据的变化部分
+    'delta_report': True,
+    # 汇报格式：1 为旧的表单格式，2 为压缩后直接放在请求体中的格式
+    'report_format': 2,
+    # 格式 2 的序列化方式（json 或 msgpack，msgpack 需要另外安装）和压缩方式（gzip、deflate 或 None）
+    'serializer': 'json',
+    'compression': 'gzip',
+    # 常驻模式（daemon）的汇报周期，以及在本机固定偏移量之外再叠加的随机抖动（秒）
+    'report_interval': 3600,
+    'jitter': 60,
+    # 发送失败时的重试次数，以及指数退避的起始和最大等待时间（秒）
+    'max_retries': 5,
+    'retry_base_delay': 2,
+    'retry_max_delay': 300,
+    # 最多暂存多少份发送失败的汇报，0 表示不暂存
+    'spool_max': 100,
 }
 
 # 日志文件配置
 
 PATH = os.path.join(os.path.dirname(os.getcwd()), 'log', 'cmdb.log')
 
+# 最近一次被服务器确认的汇报数据，作为增量汇报的基线
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.getcwd()), 'log', 'last_report.json')
+
+# 发送失败的汇报暂存目录，服务器恢复后补发
+SPOOL_DIR = os.path.join(os.path.dirname(os.getcwd()), 'log', 'spool')
+
+# 变化很少的硬件信息的本地缓存及其有效期（秒），没有列出的探测项每次都重新收集
+COLLECT_CACHE_PATH = os.path.join(os.path.dirname(os.getcwd()), 'log', 'collect_cache.json')
+COLLECT_CACHE_TTL = {
+    'dmi': 86400,
+    'cpu': 86400,
+}
+
+# 低开销模式的资源预算，也可以在命令行加 --low-overhead 临时开启
+BUDGET = {
+    'enabled': False,
+    # 整次收集的时间预算（秒）
+    'wall_time': 5,
+    # 同时运行的外部命令数量
+    'max_subprocesses': 1,
+    # 本进程的内存上限（MB）
+    'max_rss_mb': 64,
+    # 降低 CPU 优先级（nice 值增量），并把 IO 优先级设为 idle
+    'nice': 10,
+    'ionice_idle': True,
+    # 预算用尽后跳过的探测项（dmi 中有资产 sn，不能跳过）
+    'expensive_probes': ('ram', 'disk'),
+}
+
 
 # 更多配置，请都集中在此文件中
\ No newline at end of file
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+客户端的资源预算。
+
+客户端运行在承载线上业务的主机上，低开销模式下：
+降低自身的 CPU / IO 调度优先级，限制同时运行的外部命令数量，
+超出时间或内存预算后跳过开销大的探测项，并在汇报中标明被跳过的部分。
+每次运行的实际开销都会记录到 cmdb.log 中。
+"""
+
+import os
+import time
+import ctypes
+import platform
+import resource
+import threading
+from contextlib import contextmanager
+
+from conf import settings
+
+# ioprio_set 系统调用号，其他架构上不设置 IO 优先级
+IOPRIO_SET_SYSCALL = {'x86_64': 251, 'aarch64': 30, 'i686': 289}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+_priority_applied = False
+
+
+def current_rss_mb():
+    """当前进程的常驻内存（MB）"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (IOError, OSError, ValueError, IndexError):
+        return 0.0
+    return pages * resource.getpagesize() / 1024.0 / 1024.0
+
+
+class ResourceBudget(object):
+
+    def __init__(self, enabled=False, wall_time=None, max_subprocesses=None, max_rss_mb=None, nice=0,
+                 ionice_idle=False, expensive_probes=()):
+        self.enabled = enabled
+        self.wall_time = wall_time
+        self.max_rss_mb = max_rss_mb
+        self.nice = nice
+        self.ionice_idle = ionice_idle
+        self.expensive_probes = set(expensive_probes)
+        self._slots = threading.BoundedSemaphore(max_subprocesses) if max_subprocesses else None
+        self.skipped = []
+        self.started = time.time()
+        self._usage = self._rusage()
+
+    @classmethod
+    def from_settings(cls):
+        config = settings.BUDGET
+        if not config.get('enabled'):
+            return cls()
+        return cls(True, config.get('wall_time'), config.get('max_subprocesses'), config.get('max_rss_mb'),
+                   config.get('nice', 0), config.get('ionice_idle', False), config.get('expensive_probes', ()))
+
+    @staticmethod
+    def _rusage():
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+    def apply_priority(self):
+        """降低本进程（以及之后启动的子进程）的 CPU 和 IO 优先级，每个进程只设置一次"""
+        global _priority_applied
+        if not self.enabled or _priority_applied:
+            return
+        _priority_applied = True
+        if self.nice:
+            try:
+                os.nice(self.nice)
+            except OSError:
+                pass
+        syscall = IOPRIO_SET_SYSCALL.get(platform.machine())
+        if self.ionice_idle and syscall:
+            try:
+                libc = ctypes.CDLL(None, use_errno=True)
+                libc.syscall(syscall, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT)
+            except (OSError, AttributeError):
+                pass
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def remaining(self):
+        """剩余的时间预算（秒），没有限制时返回 None"""
+        if not self.enabled or not self.wall_time:
+            return None
+        return max(self.wall_time - self.elapsed(), 0.0)
+
+    def exhausted(self):
+        if not self.enabled:
+            return False
+        if self.wall_time and self.elapsed() >= self.wall_time:
+            return True
+        return bool(self.max_rss_mb) and current_rss_mb() >= self.max_rss_mb
+
+    def allow(self, probe):
+        """预算用尽后，开销大的探测项不再执行"""
+        if probe in self.expensive_probes and self.exhausted():
+            self.skip(probe)
+            return False
+        return True
+
+    def skip(self, probe):
+        if probe not in self.skipped:
+            self.skipped.append(probe)
+
+    @contextmanager
+    def subprocess_slot(self):
+        """限制同时运行的外部命令数量"""
+        if self._slots is None:
+            yield
+            return
+        with self._slots:
+            yield
+
+    def summary(self):
+        """本次运行的实际开销，写入 cmdb.log"""
+        text = '耗时 %.2fs CPU %.2fs 内存峰值 %.1fMB' % (
+            self.elapsed(), self._rusage() - self._usage,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)
+        if self.skipped:
+            text += ' 跳过 %s' % ','.join(self.skipped)
+        return text
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+增量汇报。
+客户端在本地保存最近一次被服务器确认的完整汇报（快照），
+之后只发送相对该快照新增、移除和变化的部分，服务器根据 base_hash 校验基线。
+"""
+
+import os
+import json
+
+from conf import settings
+
+# 各类组件在同一台资产中的识别字段，与服务器端模型的 unique_together 保持一致
+COMPONENT_KEYS = {
+    'ram': ('slot',),
+    'physical_disk_driver': ('sn',),
+    'nic': ('model', 'mac'),
+}
+
+
+def load_snapshot():
+    """读取上一次被确认的快照，没有或者损坏时返回 None"""
+    try:
+        with open(settings.SNAPSHOT_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def save_snapshot(asset_data):
+    """先写临时文件再替换，避免进程中断时留下半个快照"""
+    tmp_path = settings.SNAPSHOT_PATH + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(asset_data, f, ensure_ascii=False)
+    os.replace(tmp_path, settings.SNAPSHOT_PATH)
+
+
+def _index(entries, key_fields):
+    return {tuple(entry.get(k) for k in key_fields): entry for entry in entries or ()}
+
+
+def build_delta(baseline, asset_data):
+    """
+    计算 asset_data 相对 baseline 的增量汇报。
+    基线不可用（没有快照、sn 变化或没有指纹）时返回 None，此时应发送完整汇报。
+    """
+    if not baseline or not baseline.get('report_hash') or baseline.get('sn') != asset_data.get('sn'):
+        return None
+    delta = {
+        'report_type': 'delta',
+        'sn': asset_data.get('sn'),
+        'asset_type': asset_data.get('asset_type'),
+        'base_hash': baseline['report_hash'],
+        'report_hash': asset_data.get('report_hash'),
+        'changed': {},
+        'components': {},
+    }
+    for key, value in asset_data.items():
+        if key in COMPONENT_KEYS or key == 'report_hash':
+            continue
+        if baseline.get(key) != value:
+            delta['changed'][key] = value
+    for key, value in baseline.items():
+        # 本次没有采集到的字段显式置空，否则服务器会认为它没有变化而保留旧值
+        if key not in asset_data and key not in COMPONENT_KEYS and key != 'report_hash' and value is not None:
+            delta['changed'][key] = None
+    for key, key_fields in COMPONENT_KEYS.items():
+        if key not in asset_data:
+            continue
+        old = _index(baseline.get(key), key_fields)
+        new = _index(asset_data.get(key), key_fields)
+        section = {
+            'added': [entry for k, entry in new.items() if k not in old],
+            'changed': [entry for k, entry in new.items() if k in old and old[k] != entry],
+            'removed': [entry for k, entry in old.items() if k not in new],
+        }
+        if any(section.values()):
+            delta['components'][key] = section
+    return delta
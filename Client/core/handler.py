@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
-import json
+import os
 import time
-import urllib.parse
-import urllib.request
+import random
+import socket
 from core import info_collection
+from core import delta
+from core import transport
+from core import budget
 from conf import settings
 
 
@@ -20,6 +23,8 @@ class ArgvHandler(object):
         分析参数，如果有参数指定的功能，则执行该功能，如果没有，打印帮助说明。
         :return:
         """
+        if '--low-overhead' in self.args:
+            settings.BUDGET['enabled'] = True
         if len(self.args) > 1 and hasattr(self, self.args[1]):
             func = getattr(self, self.args[1])
             func()
@@ -33,45 +38,166 @@ class ArgvHandler(object):
         :return:
         """
         msg = '''
-        collect_data        收集硬件信息
+        collect_data        收集硬件信息（加 --timings 显示每项探测的耗时）
         report_data         收集硬件信息并汇报
+        daemon              常驻运行，按周期收集硬件信息并汇报
+        --low-overhead      低开销模式：降低优先级，按 settings.BUDGET 限制资源，超出预算时跳过部分探测
         '''
         print(msg)
 
-    @staticmethod
-    def collect_data():
-        """收集硬件信息,用于测试！"""
-        info = info_collection.InfoCollection()
-        asset_data = info.collect()
+    def collect_data(self):
+        """收集硬件信息,用于测试！加上 --timings 参数时打印每一项探测的耗时"""
+        started = time.perf_counter()
+        asset_data, info = ArgvHandler.collect()
+        elapsed = time.perf_counter() - started
         print(asset_data)
+        if '--timings' in self.args:
+            for name, seconds in sorted(info.timings.items(), key=lambda item: -item[1]):
+                print('%-10s %8.1f ms' % (name, seconds * 1000))
+            print('%-10s %8.1f ms' % ('total', elapsed * 1000))
+            print(info.budget.summary())
 
     @staticmethod
     def report_data():
         """
         收集硬件信息，然后发送到服务器。
+        开启增量汇报时，只发送相对上一次被确认的快照的变化部分。
         :return:
         """
         # 收集信息
-        info = info_collection.InfoCollection()
-        asset_data = info.collect()
-        # 将数据打包到一个字典内，并转换为json格式
-        data = {"asset_data": json.dumps(asset_data)}
-        # 根据settings中的配置，构造url
-        url = "http://%s:%s%s" % (settings.Params['server'], settings.Params['port'], settings.Params['url'])
-        print('正在将数据发送至： [%s]  ......' % url)
+        asset_data, info = ArgvHandler.collect()
+        client = ArgvHandler.get_client()
+        spool = transport.Spool(settings.SPOOL_DIR, settings.Params['spool_max'])
+        print('正在将数据发送至： [%s]  ......' % client.address)
         try:
-            # 使用Python内置的urllib.request库，发送post请求。
-            # 需要先将数据进行封装，并转换成bytes类型
-            data_encode = urllib.parse.urlencode(data).encode()
-            response = urllib.request.urlopen(url=url, data=data_encode, timeout=settings.Params['request_timeout'])
+            # 先补发更早暂存的汇报，保证服务器按时间顺序收到数据
+            ArgvHandler.replay_spool(client, spool)
+            message = ArgvHandler.deliver(client, asset_data)
             print("\033[31;1m发送完毕！\033[0m ")
-            message = response.read().decode()
             print("返回结果：%s" % message)
-        except Exception as e:
+        except transport.RetryableError as e:
             message = "发送失败"
-            print("\033[31;1m发送失败，%s\033[0m" % e)
-        # 记录发送日志
+            if spool.push(asset_data):
+                print("\033[31;1m发送失败，%s，数据已暂存，恢复后补发\033[0m" % e)
+            else:
+                print("\033[31;1m发送失败，%s，未开启暂存，本次数据已丢弃\033[0m" % e)
+        finally:
+            client.close()
+        ArgvHandler.write_log(client.address, message, info.budget)
+
+    @staticmethod
+    def daemon():
+        """
+        常驻模式：按 report_interval 周期性收集并汇报，复用同一个长连接。
+        每台主机在周期内有固定的偏移量，再叠加随机抖动；
+        发送失败时指数退避重试，仍然失败则暂存到本地，服务器恢复后补发。
+        """
+        interval = settings.Params['report_interval']
+        client = ArgvHandler.get_client()
+        spool = transport.Spool(settings.SPOOL_DIR, settings.Params['spool_max'])
+        offset = transport.splay(socket.getfqdn(), interval)
+        # 第一次汇报时间：对齐到当前周期的起点，再加上本机的偏移量
+        next_run = time.time() // interval * interval + offset
+        if next_run < time.time():
+            next_run += interval
+        print('常驻模式已启动，汇报周期 %s 秒，本机偏移 %s 秒' % (interval, offset))
+        try:
+            while True:
+                delay = next_run - time.time() + random.uniform(0, settings.Params['jitter'])
+                if delay > 0:
+                    time.sleep(delay)
+                next_run += interval
+                ArgvHandler.report_cycle(client, spool)
+        except KeyboardInterrupt:
+            print('常驻模式已退出')
+        finally:
+            client.close()
+
+    @staticmethod
+    def report_cycle(client, spool):
+        """常驻模式下的一次汇报"""
+        asset_data, info = ArgvHandler.collect()
+        message = "发送失败"
+        delays = transport.backoff_delays(settings.Params['max_retries'], settings.Params['retry_base_delay'],
+                                          settings.Params['retry_max_delay'])
+        while True:
+            try:
+                ArgvHandler.replay_spool(client, spool)
+                message = ArgvHandler.deliver(client, asset_data)
+                break
+            except transport.RetryableError as e:
+                delay = next(delays, None)
+                if delay is None:
+                    if spool.push(asset_data):
+                        print("发送失败，%s，数据已暂存，恢复后补发" % e)
+                    else:
+                        print("发送失败，%s，未开启暂存，本次数据已丢弃" % e)
+                    break
+                print("发送失败，%s，%.1f 秒后重试" % (e, delay))
+                time.sleep(delay)
+        ArgvHandler.write_log(client.address, message, info.budget)
+
+    @staticmethod
+    def collect():
+        """按资源预算收集硬件信息，返回 (硬件数据, InfoCollection 对象)"""
+        resource_budget = budget.ResourceBudget.from_settings()
+        resource_budget.apply_priority()
+        info = info_collection.InfoCollection(resource_budget)
+        return info.collect(), info
+
+    @staticmethod
+    def get_client():
+        return transport.ReportClient(
+            settings.Params['server'], settings.Params['port'], settings.Params['url'],
+            settings.Params['request_timeout'], settings.Params.get('report_format', 1),
+            settings.Params.get('serializer', 'json'), settings.Params.get('compression', 'gzip'))
+
+    @staticmethod
+    def deliver(client, asset_data, use_delta=True):
+        """
+        发送一份完整的硬件数据，开启增量汇报时先尝试只发送变化部分。
+        返回服务器的原始返回内容；网络异常时抛出 RetryableError。
+        """
+        payload = None
+        if use_delta and settings.Params.get('delta_report'):
+            payload = delta.build_delta(delta.load_snapshot(), asset_data)
+        status, message = client.send(payload or asset_data)
+        if status == 'full_report_required':
+            # 服务器上的基线与本地快照不一致，改为发送完整数据
+            print("服务器要求提交完整数据，重新发送......")
+            status, message = client.send(asset_data)
+        if status in ('updated', 'unchanged', 'new_asset_zone', 'queued'):
+            # 只有被服务器确认的数据才能作为下一次增量汇报的基线
+            delta.save_snapshot(asset_data)
+        return message
+
+    @staticmethod
+    def replay_spool(client, spool):
+        """
+        按时间顺序补发暂存的汇报，服务器返回 2xx 的才从暂存目录删除。
+        服务器没有接收时（例如 4xx）停止补发，保留这一份和之后的汇报，下次再按顺序补发；
+        暂存目录的文件数有上限，一直无法补发的汇报最终会被丢弃。
+        暂存的都是完整数据，补发时不走增量汇报，也不更新快照。
+        """
+        for path in spool.pending():
+            asset_data = spool.load(path)
+            if asset_data is None:
+                # 文件已损坏，无法补发
+                spool.remove(path)
+                continue
+            client.send(asset_data)
+            if not 200 <= client.status_code < 300:
+                print("补发暂存的汇报未被服务器接收（HTTP %s），保留在暂存目录：%s" % (
+                    client.status_code, os.path.basename(path)))
+                return
+            spool.remove(path)
+            print("已补发暂存的汇报：%s" % os.path.basename(path))
+
+    @staticmethod
+    def write_log(url, message, resource_budget):
+        # 记录发送日志，以及本次运行的开销
         with open(settings.PATH, 'ab') as f:
-            string = '发送时间：%s \t 服务器地址：%s \t 返回结果：%s \n' % (time.strftime('%Y-%m-%d %H:%M:%S'), url, message)
+            string = '发送时间：%s \t 服务器地址：%s \t 返回结果：%s \t 开销：%s \n' % (
+                time.strftime('%Y-%m-%d %H:%M:%S'), url, message, resource_budget.summary())
             f.write(string.encode())
-            print("日志记录成功！")
\ No newline at end of file
+            print("日志记录成功！")
@@ -2,12 +2,24 @@
 # -*- coding:utf-8 -*-
 
 import sys
+import json
+import hashlib
 import platform
 
 
-def linux_sys_info():
+def fingerprint(data):
+    """
+    计算硬件数据的指纹。
+    使用规范化的 JSON（键排序、紧凑分隔符）再做 sha256，与服务器端的算法保持一致。
+    """
+    payload = {k: v for k, v in data.items() if k != 'report_hash'}
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def linux_sys_info(timings=None, budget=None):
     from plugins.linux import sys_info
-    return sys_info.collect()
+    return sys_info.collect(timings, budget)
 
 
 def windows_sys_info():
@@ -17,6 +29,12 @@ def windows_sys_info():
 
 class InfoCollection(object):
 
+    def __init__(self, budget=None):
+        # 各项探测的耗时（秒），由平台插件填写
+        self.timings = {}
+        # 资源预算（core.budget.ResourceBudget），为 None 时不做限制
+        self.budget = budget
+
     def collect(self):
         # 收集平台信息
         # 首先判断当前平台，根据平台的不同，执行不同的方法
@@ -30,11 +48,13 @@ class InfoCollection(object):
 
     def Linux(self):
 
-        return linux_sys_info()
+        return linux_sys_info(self.timings, self.budget)
 
     def Windows(self):
         return windows_sys_info()
 
     def build_report_data(self, data):
         # 留下一个接口，方便以后增加功能或者过滤数据
+        # 附上数据指纹，服务器据此判断硬件信息是否有变化
+        data['report_hash'] = fingerprint(data)
         return data
\ No newline at end of file
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+与服务器通信。
+ReportClient 复用同一个 HTTP 长连接发送汇报；Spool 保存发送失败的汇报，服务器恢复后按顺序补发。
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import http.client
+import urllib.parse
+
+from core import wire
+
+
+class RetryableError(Exception):
+    """网络异常或服务器 5xx，可以稍后重试"""
+
+
+class ReportClient(object):
+
+    def __init__(self, server, port, url, timeout, report_format=2, serializer='json', compression='gzip'):
+        self.server = server
+        self.port = port
+        self.url = url
+        self.timeout = timeout
+        self.report_format = report_format
+        self.serializer = serializer
+        self.compression = compression
+        # 最近一次请求的 HTTP 状态码
+        self.status_code = None
+        self._conn = None
+
+    @property
+    def address(self):
+        return "http://%s:%s%s" % (self.server, self.port, self.url)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def send(self, asset_data):
+        """
+        发送一份汇报（完整或增量），返回服务器给出的处理状态和原始返回内容；HTTP 状态码见 status_code。
+        优先使用压缩后的新格式，服务器不支持（返回 415）时退回旧的表单格式，并在之后都使用旧格式。
+        """
+        # 在请求头中带上sn和数据指纹，数据没有变化时服务器无需解析请求体即可返回
+        headers = {
+            'X-Asset-SN': asset_data.get('sn', ''),
+            'X-Report-Hash': asset_data.get('report_hash', ''),
+        }
+        if self.report_format == 2:
+            body, wire_headers = wire.encode(asset_data, self.serializer, self.compression)
+            headers.update(wire_headers)
+            code, message = self._post(body, headers)
+            if code != 415:
+                return self._parse(message)
+            print("服务器不支持新的数据格式，改用表单格式发送......")
+            self.report_format = 1
+            for key in wire_headers:
+                headers.pop(key)
+        # 将数据打包到一个字典内，并转换为json格式，再封装成表单
+        body = urllib.parse.urlencode({"asset_data": json.dumps(asset_data)}).encode()
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        code, message = self._post(body, headers)
+        return self._parse(message)
+
+    def _post(self, body, headers):
+        """
+        在长连接上发送一次 POST。
+        服务器可能已经关闭了空闲连接，这种情况下重新建立连接再试一次。
+        """
+        for attempt in (1, 2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.server, self.port, timeout=self.timeout)
+            try:
+                self._conn.request('POST', self.url, body=body, headers=headers)
+                response = self._conn.getresponse()
+                message = response.read().decode()
+            except (http.client.HTTPException, OSError) as e:
+                self.close()
+                if attempt == 2:
+                    raise RetryableError(e)
+                continue
+            if response.getheader('Connection', '').lower() == 'close':
+                self.close()
+            self.status_code = response.status
+            if response.status >= 500:
+                raise RetryableError('服务器错误 %s：%s' % (response.status, message[:200]))
+            return response.status, message
+
+    @staticmethod
+    def _parse(message):
+        try:
+            status = json.loads(message)['results'][0]['status']
+        except (ValueError, KeyError, IndexError, TypeError):
+            status = None
+        return status, message
+
+
+def backoff_delays(retries, base, cap):
+    """指数退避加全随机抖动：第 n 次重试前等待 [0, min(cap, base * 2 ** n)] 秒"""
+    for n in range(retries):
+        yield random.uniform(0, min(cap, base * 2 ** n))
+
+
+def splay(key, interval):
+    """
+    根据主机标识得到一个固定的偏移量（0 ~ interval 秒），
+    让成千上万台主机的汇报时间均匀分散在整个周期内，而不是同一秒涌向服务器。
+    """
+    digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+    return int(digest, 16) % max(int(interval), 1)
+
+
+class Spool(object):
+    """
+    发送失败的汇报暂存在本地目录，每份一个文件，按时间顺序补发。
+    max_files 为最多保留的文件数，超过时丢弃最旧的；max_files <= 0 时不暂存，push 直接丢弃汇报。
+    """
+
+    def __init__(self, directory, max_files=100):
+        self.directory = directory
+        self.max_files = max_files
+        os.makedirs(self.directory, exist_ok=True)
+
+    def push(self, asset_data):
+        """暂存一份汇报，返回是否已暂存"""
+        if self.max_files <= 0:
+            return False
+        name = '%.6f-%s.json' % (time.time(), os.getpid())
+        tmp_path = os.path.join(self.directory, name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(asset_data, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+        # 超过上限时丢弃最旧的汇报
+        for path in self.pending()[:-self.max_files]:
+            os.remove(path)
+        return True
+
+    def pending(self):
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        return [os.path.join(self.directory, name) for name in names]
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Linux 平台硬件信息收集。
+
+尽量直接读取 /proc 和 /sys，只有内存条信息需要调用 dmidecode。
+各项探测（系统、CPU、主板、内存、硬盘、网卡）互不依赖，放到线程池中并发执行；
+主板序列号、CPU 型号这类几乎不变的数据按 TTL 缓存在本地文件中。
+"""
+
+import os
+import json
+import time
+import fcntl
+import socket
+import struct
+import platform
+import subprocess
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from conf import settings
+
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+
+# 不属于物理硬盘的块设备前缀
+VIRTUAL_BLOCK_PREFIXES = ('loop', 'ram', 'zram', 'dm-', 'sr', 'md', 'nbd', 'fd')
+
+# 本次收集的资源预算（core.budget.ResourceBudget），由 collect 设置
+_budget = None
+
+
+def read_file(path, default=''):
+    try:
+        with open(path, 'r', errors='replace') as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return default
+
+
+def run_command(cmd, timeout=10):
+    """执行外部命令，失败时返回空字符串；受资源预算限制并发数量和超时时间"""
+    budget = _budget
+    with budget.subprocess_slot() if budget is not None else nullcontext():
+        if budget is not None:
+            remaining = budget.remaining()
+            if remaining is not None:
+                if remaining <= 0:
+                    return ''
+                timeout = min(timeout, remaining)
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=timeout)
+        except (OSError, subprocess.SubprocessError):
+            return ''
+    if result.returncode != 0:
+        return ''
+    return result.stdout.decode('utf-8', errors='replace')
+
+
+class ProbeCache(object):
+    """按探测项保存结果和时间戳，超过 TTL 后重新探测"""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        except (IOError, ValueError):
+            self.data = {}
+        self.dirty = False
+
+    def get(self, name):
+        entry = self.data.get(name)
+        if entry and time.time() - entry['time'] < self.ttl.get(name, 0):
+            return entry['value']
+        return None
+
+    def set(self, name, value):
+        if self.ttl.get(name):
+            self.data[name] = {'time': time.time(), 'value': value}
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except (IOError, OSError):
+            pass
+
+
+def os_info():
+    release = {}
+    for line in read_file('/etc/os-release').splitlines():
+        if '=' in line:
+            key, value = line.split('=', 1)
+            release[key] = value.strip('"')
+    return {
+        'os_type': platform.system(),
+        'os_distribution': release.get('NAME', ''),
+        'os_release': release.get('PRETTY_NAME', platform.release()),
+    }
+
+
+def cpu_info():
+    model = ''
+    physical_ids = set()
+    cores = set()
+    processors = 0
+    physical_id = core_id = None
+    for line in read_file('/proc/cpuinfo').splitlines() + ['']:
+        if not line.strip():
+            if physical_id is not None:
+                physical_ids.add(physical_id)
+                cores.add((physical_id, core_id))
+            physical_id = core_id = None
+            continue
+        key, _, value = line.partition(':')
+        key, value = key.strip(), value.strip()
+        if key == 'processor':
+            processors += 1
+        elif key == 'model name' and not model:
+            model = value
+        elif key == 'physical id':
+            physical_id = value
+        elif key == 'core id':
+            core_id = value
+    return {
+        'cpu_model': model,
+        'cpu_count': len(physical_ids) or 1,
+        'cpu_core_count': len(cores) or processors or 1,
+    }
+
+
+def dmi_info():
+    """主板信息，序列号需要 root 权限才能从 /sys 读取，读不到时再尝试 dmidecode"""
+    base = '/sys/class/dmi/id/'
+    data = {
+        'manufacturer': read_file(base + 'sys_vendor'),
+        'model': read_file(base + 'product_name'),
+        'sn': read_file(base + 'product_serial'),
+        'uuid': read_file(base + 'product_uuid'),
+    }
+    if not data['sn']:
+        data['sn'] = run_command(['dmidecode', '-s', 'system-serial-number']).strip()
+    return data
+
+
+def ram_info():
+    ram = []
+    block = None
+    for line in run_command(['dmidecode', '-t', '17']).splitlines() + ['']:
+        line = line.strip()
+        if line.startswith('Memory Device'):
+            block = {}
+            continue
+        if block is None:
+            continue
+        if not line:
+            size = block.get('Size', '')
+            if size and not size.startswith('No Module'):
+                number, _, unit = size.partition(' ')
+                capacity = int(number) * 1024 if unit.upper() == 'GB' else int(number)
+                ram.append({
+                    'slot': block.get('Locator', ''),
+                    'capacity': capacity,
+                    'model': block.get('Part Number', ''),
+                    'manufacturer': block.get('Manufacturer', ''),
+                    'sn': block.get('Serial Number', ''),
+                })
+            block = None
+            continue
+        key, _, value = line.partition(':')
+        block[key.strip()] = value.strip()
+    if ram:
+        ram_size = sum(item['capacity'] for item in ram)
+    else:
+        # 没有 dmidecode 或者没有权限时，只能从 /proc/meminfo 得到总量
+        mem_total = read_file('/proc/meminfo').split('\n')[0].split()
+        ram_size = int(mem_total[1]) // 1024 if len(mem_total) > 1 else 0
+    return {'ram': ram, 'ram_size': ram_size}
+
+
+def _udev_properties(major_minor):
+    props = {}
+    for line in read_file('/run/udev/data/b%s' % major_minor).splitlines():
+        if line.startswith('E:') and '=' in line:
+            key, value = line[2:].split('=', 1)
+            props[key] = value
+    return props
+
+
+def disk_info():
+    disks = []
+    for name in sorted(os.listdir('/sys/block')):
+        if name.startswith(VIRTUAL_BLOCK_PREFIXES):
+            continue
+        base = '/sys/block/%s/' % name
+        udev = _udev_properties(read_file(base + 'dev'))
+        sectors = read_file(base + 'size', '0')
+        if read_file(base + 'queue/rotational') == '0':
+            iface_type = 'SSD'
+        else:
+            iface_type = {'ata': 'SATA', 'scsi': 'SAS'}.get(udev.get('ID_BUS'), 'unknown')
+        device = os.path.realpath(base + 'device')
+        disks.append({
+            'slot': os.path.basename(device) if os.path.exists(base + 'device') else name,
+            'sn': udev.get('ID_SERIAL_SHORT') or read_file(base + 'device/serial') or name,
+            'model': udev.get('ID_MODEL') or read_file(base + 'device/model'),
+            'manufacturer': udev.get('ID_VENDOR') or read_file(base + 'device/vendor'),
+            'capacity': round(int(sectors) * 512 / 1024.0 ** 3, 2) if sectors.isdigit() else 0,
+            'iface_type': iface_type,
+        })
+    return {'physical_disk_driver': disks}
+
+
+def _ioctl_ipv4(sock, ifname, request):
+    try:
+        packed = fcntl.ioctl(sock.fileno(), request, struct.pack('256s', ifname[:15].encode()))
+    except OSError:
+        return ''
+    return socket.inet_ntoa(packed[20:24])
+
+
+def nic_info():
+    nics = []
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for name in sorted(os.listdir('/sys/class/net')):
+            base = '/sys/class/net/%s/' % name
+            if name == 'lo' or not os.path.exists(base + 'device'):
+                # 没有 device 链接的是虚拟网卡（网桥、bond、veth 等）
+                continue
+            driver = os.path.basename(os.path.realpath(base + 'device/driver'))
+            pci_id = '%s:%s' % (read_file(base + 'device/vendor'), read_file(base + 'device/device'))
+            master = base + 'master'
+            nics.append({
+                'name': name,
+                'mac': read_file(base + 'address'),
+                'model': '%s %s' % (driver, pci_id) if driver else pci_id,
+                'ip_address': _ioctl_ipv4(sock, name, SIOCGIFADDR),
+                'net_mask': _ioctl_ipv4(sock, name, SIOCGIFNETMASK),
+                'bonding': os.path.basename(os.path.realpath(master)) if os.path.exists(master) else 0,
+            })
+    finally:
+        sock.close()
+    return {'nic': nics}
+
+
+# 探测项名称 -> 函数；缓存时间在 settings.COLLECT_CACHE_TTL 中配置
+PROBES = (
+    ('os', os_info),
+    ('cpu', cpu_info),
+    ('dmi', dmi_info),
+    ('ram', ram_info),
+    ('disk', disk_info),
+    ('nic', nic_info),
+)
+
+
+def _timed(func):
+    started = time.perf_counter()
+    return func(), time.perf_counter() - started
+
+
+def collect(timings=None, budget=None):
+    """
+    并发执行各项探测并合并结果。
+    timings 为字典时，记录每一项探测的耗时（秒），命中缓存的记为 0。
+    budget 为资源预算，超出预算的探测项被跳过，并记录在 skipped_sections 中。
+    """
+    global _budget
+    _budget = budget
+    cache = ProbeCache(settings.COLLECT_CACHE_PATH, settings.COLLECT_CACHE_TTL)
+    data = {'asset_type': 'server'}
+    pending = []
+    executor = ThreadPoolExecutor(max_workers=len(PROBES))
+    try:
+        for name, func in PROBES:
+            cached = cache.get(name)
+            if cached is not None:
+                data.update(cached)
+                if timings is not None:
+                    timings[name] = 0.0
+                continue
+            if budget is not None and not budget.allow(name):
+                continue
+            pending.append((name, executor.submit(_timed, func)))
+        for name, future in pending:
+            try:
+                result, elapsed = future.result(timeout=budget.remaining() if budget is not None else None)
+            except TimeoutError:
+                # 超时的探测项不再等待，结果丢弃
+                budget.skip(name)
+                continue
+            cache.set(name, result)
+            data.update(result)
+            if timings is not None:
+                timings[name] = elapsed
+    finally:
+        executor.shutdown(wait=False)
+        _budget = None
+    if budget is not None and budget.skipped:
+        data['skipped_sections'] = list(budget.skipped)
+    cache.save()
+    return data
@@ -37,9 +37,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'assets.apps.AssetsConfig',
 ]
 
 MIDDLEWARE = [
+    'assets.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,13 +76,76 @@ WSGI_APPLICATION = 'Django_asset_management_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+# 环境变量 ASSET_DB_PROFILE 选择数据库配置：
+#   sqlite      单个 SQLite 连接，默认的回滚日志模式
+#   sqlite-wal  WAL 模式，busy_timeout、synchronous=NORMAL、mmap；写连接用 BEGIN IMMEDIATE，读走同一文件上的只读连接
+#   server      MySQL / PostgreSQL，持久连接；事件、容量、历史等统计类查询发往只读副本 replica
+# 用 `manage.py bench_db_profiles` 以相同的汇报负载比较各个配置。
+ASSET_DB_PROFILE = os.environ.get('ASSET_DB_PROFILE', 'sqlite')
+
+SQLITE_PATH = os.path.join(BASE_DIR, 'db.sqlite3')
+SQLITE_PRAGMAS = {
+    'busy_timeout': 30000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
 }
 
+if ASSET_DB_PROFILE == 'sqlite-wal':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'assets.sqlite_wal',
+            'NAME': SQLITE_PATH,
+            'OPTIONS': {
+                'timeout': 30,
+                'immediate': True,
+                'pragmas': dict(SQLITE_PRAGMAS, journal_mode='WAL'),
+            },
+        },
+        'read': {
+            'ENGINE': 'assets.sqlite_wal',
+            'NAME': SQLITE_PATH,
+            'OPTIONS': {
+                'timeout': 30,
+                'pragmas': dict(SQLITE_PRAGMAS, query_only='ON'),
+            },
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+    DATABASE_ROUTERS = ['assets.routers.ReadRouter']
+    ASSET_DB_READ = {
+        'ALIAS': 'read',
+        'MODELS': None,
+    }
+elif ASSET_DB_PROFILE == 'server':
+    SERVER_DB = {
+        'ENGINE': os.environ.get('ASSET_DB_ENGINE', 'django.db.backends.mysql'),
+        'NAME': os.environ.get('ASSET_DB_NAME', 'asset_management'),
+        'USER': os.environ.get('ASSET_DB_USER', 'asset'),
+        'PASSWORD': os.environ.get('ASSET_DB_PASSWORD', ''),
+        'HOST': os.environ.get('ASSET_DB_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('ASSET_DB_PORT', ''),
+        # 持久连接，每个工作线程复用自己的连接，超过 CONN_MAX_AGE 秒后在请求结束时重连
+        'CONN_MAX_AGE': int(os.environ.get('ASSET_DB_CONN_MAX_AGE', 300)),
+    }
+    DATABASES = {
+        'default': SERVER_DB,
+        'replica': dict(SERVER_DB, HOST=os.environ.get('ASSET_DB_REPLICA_HOST', SERVER_DB['HOST']),
+                        TEST={'MIRROR': 'default'}),
+    }
+    DATABASE_ROUTERS = ['assets.routers.ReadRouter']
+    ASSET_DB_READ = {
+        'ALIAS': 'replica',
+        'MODELS': ('assets.EventLog', 'assets.AssetCapacity', 'assets.CapacityRollup', 'assets.AssetSnapshot',
+                   'assets.AssetDelta'),
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_PATH,
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -119,3 +184,96 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Asset report ingestion
+# ASYNC 为 True 时，汇报接口只校验并写入队列，由 `manage.py ingest_worker` 批量入库
+
+ASSET_INGEST = {
+    'ASYNC': False,
+    'QUEUE_PATH': os.path.join(BASE_DIR, 'ingest_queue.sqlite3'),
+    'WORKERS': 4,
+    'BATCH_SIZE': 200,
+}
+
+
+# EventLog retention and archival
+# 超过 RETENTION_DAYS 天的事件由 `manage.py archive_events` 移到 DIR 下按月分区的压缩归档文件中
+
+EVENT_ARCHIVE = {
+    'DIR': os.path.join(BASE_DIR, 'event_archive'),
+    'RETENTION_DAYS': 180,
+    'ARCHIVE_KEEP_MONTHS': None,
+    'CHUNK_SIZE': 5000,
+}
+
+
+# EventLog recorder
+# BACKGROUND 为 True 时，事务之外记录的事件先写入 JOURNAL_PATH 日志文件，由后台线程成批写入 EventLog
+
+EVENT_RECORDER = {
+    'BACKGROUND': False,
+    'JOURNAL_PATH': os.path.join(BASE_DIR, 'event_journal.sqlite3'),
+    'FLUSH_INTERVAL': 1.0,
+    'BATCH_SIZE': 1000,
+}
+
+
+# Asset history
+# 资产每次变化保存一条增量，每 SNAPSHOT_EVERY 个版本或每隔 SNAPSHOT_DAYS 天保存一份完整快照
+
+ASSET_HISTORY = {
+    'SNAPSHOT_EVERY': 20,
+    'SNAPSHOT_DAYS': 30,
+}
+
+# Asset search
+# 各进程的内存搜索索引按 SearchChange 变更日志同步；日志保留 JOURNAL_KEEP 条，落后超过 SYNC_LIMIT 条时在后台重建索引
+ASSET_SEARCH = {
+    'JOURNAL_KEEP': 100000,
+    'SYNC_LIMIT': 5000,
+}
+
+# Caches
+# assets 缓存保存资产详情（asset_cache），键中带有每台资产的版本号，变化时由信号改写版本号，不需要过期时间。
+# 版本号由写入数据的进程改写，读取详情的进程必须能看到：
+# 单进程时用进程内的 LRU 缓存；开启异步入库（ingest_worker 是另外的进程）或者 WEB_CONCURRENCY 大于 1 时，
+# 默认改用同一台机器上共享的文件缓存。跨机器部署时应换成 memcached / redis 等共享缓存。
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'assets': {
+        'BACKEND': 'assets.cache_backends.LRUCache',
+        'LOCATION': 'assets',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+if ASSET_INGEST['ASYNC'] or WEB_CONCURRENCY > 1:
+    CACHES['assets'].update(BACKEND='assets.cache_backends.FileCache', LOCATION=os.path.join(BASE_DIR, 'asset_cache'))
+
+# Asset detail cache
+ASSET_CACHE = {
+    'ALIAS': 'assets',
+    'MAX_EVENTS': 100,
+}
+
+# Request and SQL metrics
+# 由 /metrics 以 Prometheus 文本格式输出；SAMPLE_RATE 为记录耗时直方图和 SQL 统计的请求比例
+ASSET_METRICS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'SLOW_QUERY_MS': 100,
+    'SLOW_QUERIES': 20,
+}
+
+# Expiry calendar
+# 保修、合同、授权到期前 NOTICE_DAYS 天由 expiry_calendar 命令写入提醒事件，也是“即将到期”接口的默认范围
+ASSET_EXPIRY = {
+    'NOTICE_DAYS': 30,
+    'BATCH_SIZE': 1000,
+}
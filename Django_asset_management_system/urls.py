@@ -14,8 +14,12 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
+
+from assets import views as asset_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('assets/', include('assets.urls')),
+    path('metrics', asset_views.metrics, name='metrics'),
 ]
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Django_asset_management_system.settings")
 
 application = get_wsgi_application()
+
+# 在后台构建资产搜索索引，构建完成前搜索请求使用 FTS5 / ORM 查询
+from assets import search  # noqa: E402
+search.index.build_in_background()
+
+# 开启了后台写入 EventLog 时启动写入线程，同时补写上次退出前日志中剩余的事件
+from assets import events  # noqa: E402
+if events.get_config()['BACKGROUND']:
+    events.background_writer().start()
@@ -1,3 +1,36 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+
+from . import models
+from .approval import ApprovalBatch
 
 # Register your models here.
+
+
+@admin.register(models.BusinessUnit)
+class BusinessUnitAdmin(admin.ModelAdmin):
+    list_display = ('name', 'parent_unit', 'memo')
+    search_fields = ('name',)
+
+
+@admin.register(models.NewAssetApprovalZone)
+class NewAssetApprovalZoneAdmin(admin.ModelAdmin):
+    list_display = ('sn', 'asset_type', 'manufacturer', 'model', 'cpu_model', 'ram_size', 'disk_size', 'nic_count',
+                    'os_release', 'approved', 'c_time')
+    list_filter = ('approved', 'asset_type', 'manufacturer')
+    search_fields = ('sn',)
+    # 原始汇报数据只在详情页中展示，列表页不读取
+    readonly_fields = ('data',)
+    actions = ['approve_selected']
+
+    def approve_selected(self, request, queryset):
+        """整批在一个事务中上线，失败的记录逐条列出原因"""
+        results = ApprovalBatch(queryset.values_list('id', flat=True), user=request.user).process()
+        approved = [result for result in results if result['status'] == 'approved']
+        failed = [result for result in results if result['status'] != 'approved']
+        if approved:
+            self.message_user(request, '成功审批 %d 台资产。' % len(approved), messages.SUCCESS)
+        for result in failed[:20]:
+            self.message_user(request, '%s：%s' % (result['sn'], result['message']), messages.WARNING)
+        if len(failed) > 20:
+            self.message_user(request, '另有 %d 条记录审批失败。' % (len(failed) - 20), messages.WARNING)
+    approve_selected.short_description = '批量审批选中的资产'
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+资产的只读 JSON 接口。
+
+列表按 (c_time, id) 倒序做游标（keyset）分页，翻到多深都只是一次索引范围扫描；
+子类型、CPU、厂商等一对一 / 外键数据用 select_related 一次取出，
+内存、硬盘、网卡、标签各用一次 prefetch_related，查询次数与每页条数无关。
+"""
+
+import base64
+import binascii
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
+
+from . import models
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# 资产的子类型表，与 Asset.asset_type 对应
+SUB_TYPES = ('server', 'networkdevice', 'storagedevice', 'securitydevice')
+
+ASSET_FIELDS = ('id', 'asset_type', 'name', 'sn', 'status', 'manage_ip', 'purchase_day', 'expire_day', 'price',
+                'memo', 'c_time', 'm_time')
+SUB_TYPE_FIELDS = {
+    'server': ('sub_asset_type', 'created_by', 'model', 'raid_type', 'os_type', 'os_distribution', 'os_release'),
+    'networkdevice': ('sub_asset_type', 'vlan_ip', 'intranet_ip', 'model', 'firmware', 'port_num', 'device_detail'),
+    'storagedevice': ('sub_asset_type',),
+    'securitydevice': ('sub_asset_type',),
+}
+CPU_FIELDS = ('cpu_model', 'cpu_count', 'cpu_core_count')
+RAM_FIELDS = ('slot', 'sn', 'model', 'manufacturer', 'capacity')
+DISK_FIELDS = ('slot', 'sn', 'model', 'manufacturer', 'capacity', 'interface_type')
+NIC_FIELDS = ('name', 'model', 'mac', 'ip_address', 'net_mask', 'bonding')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def asset_queryset():
+    """固定 5 次查询：资产及其一对一 / 外键数据 1 次，内存、硬盘、网卡、标签各 1 次"""
+    return models.Asset.objects.select_related(
+        'manufacturer', 'business_unit', 'idc', 'contract', 'admin', 'cpu',
+        'server__hosted_on__asset', 'networkdevice', 'storagedevice', 'securitydevice',
+    ).prefetch_related(
+        Prefetch('ram_set', queryset=models.RAM.objects.order_by('slot')),
+        Prefetch('disk_set', queryset=models.Disk.objects.order_by('slot', 'sn')),
+        Prefetch('nic_set', queryset=models.NIC.objects.order_by('name', 'mac')),
+        Prefetch('tags', queryset=models.Tag.objects.order_by('name')),
+    )
+
+
+def encode_cursor(asset):
+    raw = '%s|%s' % (asset.c_time.isoformat(), asset.id)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        c_time, asset_id = raw.rsplit('|', 1)
+        c_time = parse_datetime(c_time)
+        asset_id = int(asset_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('无效的分页游标：%s' % cursor)
+    if c_time is None:
+        raise InvalidCursor('无效的分页游标：%s' % cursor)
+    return c_time, asset_id
+
+
+def page(queryset, cursor=None, size=DEFAULT_PAGE_SIZE):
+    """
+    按 (c_time, id) 倒序取一页，返回 (资产列表, 下一页游标)。
+    游标之后的条件写成 c_time <= t 且排除 (c_time = t 且 id >= i)，能直接使用 asset_ctime_id_idx。
+    """
+    queryset = queryset.order_by('-c_time', '-id')
+    if cursor:
+        c_time, asset_id = decode_cursor(cursor)
+        queryset = queryset.filter(c_time__lte=c_time).exclude(c_time=c_time, id__gte=asset_id)
+    # 多取一条用来判断是否还有下一页
+    assets = list(queryset[:size + 1])
+    next_cursor = encode_cursor(assets[size - 1]) if len(assets) > size else None
+    return assets[:size], next_cursor
+
+
+def _related(obj, name):
+    """select_related 取不到的反向一对一会缓存为 None，访问时抛出 DoesNotExist 而不会再查询"""
+    try:
+        return getattr(obj, name)
+    except ObjectDoesNotExist:
+        return None
+
+
+def _fields(obj, fields):
+    return {field: getattr(obj, field) for field in fields}
+
+
+def _name(obj):
+    return obj.name if obj is not None else None
+
+
+def serialize_asset(asset):
+    data = _fields(asset, ASSET_FIELDS)
+    data.update({
+        'manufacturer': _name(asset.manufacturer),
+        'business_unit': _name(asset.business_unit),
+        'idc': _name(asset.idc),
+        'contract': _name(asset.contract),
+        'admin': asset.admin.username if asset.admin is not None else None,
+        'tags': [tag.name for tag in asset.tags.all()],
+        'sub_type': None,
+    })
+    for sub_type in SUB_TYPES:
+        device = _related(asset, sub_type)
+        if device is None:
+            continue
+        data['sub_type'] = dict(_fields(device, SUB_TYPE_FIELDS[sub_type]), type=sub_type)
+        if sub_type == 'server' and device.hosted_on is not None:
+            host = device.hosted_on.asset
+            data['sub_type']['hosted_on'] = {'id': host.id, 'name': host.name, 'sn': host.sn}
+        break
+    cpu = _related(asset, 'cpu')
+    data['cpu'] = _fields(cpu, CPU_FIELDS) if cpu is not None else None
+    data['ram'] = [_fields(ram, RAM_FIELDS) for ram in asset.ram_set.all()]
+    data['disk'] = [_fields(disk, DISK_FIELDS) for disk in asset.disk_set.all()]
+    data['nic'] = [_fields(nic, NIC_FIELDS) for nic in asset.nic_set.all()]
+    return data
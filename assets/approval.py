@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+新资产批量审批。
+
+机架上线时一次会有成百上千台新机器进入待审批区，ApprovalBatch 在一个事务中把它们转成正式资产：
+先逐条解析 data 并检查（失败的记录单独给出原因，不影响其余记录），
+厂商用一次查询解析、不存在的批量创建（操作系统版本只记录在 Server.os_release 上，不创建软件授权记录）；
+之后按 chunk_size 分批 bulk_create 资产、设备、CPU、内存、硬盘、网卡，每批完成后回调 progress(done, total)。
+写入过程中出现数据库错误时整个事务回滚，所有记录都标记为失败，不会出现只上线了一部分的情况。
+"""
+
+import json
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import models
+from . import signals
+from .asset_handler import (COMPONENT_SPECS, CPU_FIELDS, SERVER_FIELDS, LookupCache, clean_field_value,
+                            report_fingerprint, validate_report)
+from .events import EventRecorder, event_name
+
+CHUNK_SIZE = 200
+NAME_MAX_LENGTH = models.Asset._meta.get_field('name').max_length
+
+# 资产类型 -> (设备表, 从汇报中同步的字段)
+DEVICE_MODELS = {
+    'server': (models.Server, SERVER_FIELDS),
+    'networkdevice': (models.NetworkDevice, ('model', 'firmware', 'port_num', 'vlan_ip', 'intranet_ip')),
+    'storagedevice': (models.StorageDevice, ()),
+    'securitydevice': (models.SecurityDevice, ()),
+}
+
+
+# 待审批队列返回的字段，不包含原始汇报数据
+QUEUE_FIELDS = ('id', 'sn', 'asset_type', 'manufacturer', 'model', 'ram_size', 'cpu_model', 'cpu_count',
+                'cpu_core_count', 'os_type', 'os_distribution', 'os_release', 'raid_type', 'disk_count', 'disk_size',
+                'nic_count', 'approved', 'c_time')
+# 查询参数 -> 待审批区字段上的条件
+QUEUE_FILTERS = {
+    'asset_type': 'asset_type',
+    'manufacturer': 'manufacturer',
+    'model': 'model',
+    'cpu_model': 'cpu_model',
+    'os_type': 'os_type',
+    'os_release': 'os_release',
+    'min_ram_size': 'ram_size__gte',
+    'min_disk_size': 'disk_size__gte',
+}
+# 查询参数 -> (组件类型, 组件字段)，组件类型为 None 时匹配任意组件
+COMPONENT_FILTERS = {
+    'ram_model': ('ram', 'model'),
+    'disk_model': ('disk', 'model'),
+    'nic_model': ('nic', 'model'),
+    'mac': ('nic', 'mac'),
+    'ip': ('nic', 'ip_address'),
+    'component_sn': (None, 'sn'),
+}
+
+
+def pending_queue(params):
+    """
+    按查询参数筛选未审批的记录，只读取结构化字段；
+    组件上的条件用 NewAssetComponent 子查询匹配，每个条件各自命中一个索引。
+    """
+    queryset = models.NewAssetApprovalZone.objects.filter(approved=False).only(*QUEUE_FIELDS)
+    for param, lookup in QUEUE_FILTERS.items():
+        if params.get(param):
+            queryset = queryset.filter(**{lookup: params[param]})
+    for param, (component, field) in COMPONENT_FILTERS.items():
+        if params.get(param):
+            components = models.NewAssetComponent.objects.filter(**{field: params[param]})
+            if component:
+                components = components.filter(component=component)
+            queryset = queryset.filter(id__in=components.values('approval_id'))
+    return queryset
+
+
+def serialize_pending(obj):
+    return {field: getattr(obj, field) for field in QUEUE_FIELDS}
+
+
+def asset_name(asset_type, sn):
+    return '%s: %s' % (asset_type, sn)
+
+
+class ApprovalBatch(object):
+    """
+    批量审批待审批区中的记录，返回每条记录的结果：
+    {'id', 'sn', 'status', 'message', 'asset_id'}，status 为 approved / error / not_found / already_approved。
+    """
+
+    def __init__(self, approval_ids, user=None, progress=None, chunk_size=CHUNK_SIZE):
+        self.approval_ids = sorted(set(approval_ids))
+        self.user = user
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.now = timezone.now()
+        self.results = {}
+        self.events = EventRecorder(user)
+        self.manufacturers = LookupCache(models.Manufacturer, 'name')
+        # 上线的资产及其设备、组件行，提交后随 assets_changed 信号传给接收方
+        self.rows = {}
+
+    def process(self):
+        try:
+            with transaction.atomic():
+                approved = self._approve()
+        except DatabaseError as e:
+            # 事务已回滚，本批次中原本可以上线的记录都没有写入
+            for approval_id in self.approval_ids:
+                result = self.results.get(approval_id)
+                if result is None or result['status'] == 'approved':
+                    self._result(approval_id, result and result['sn'], 'error', '写入失败，整批已回滚：%s' % e)
+            return self._ordered()
+        if approved:
+            transaction.on_commit(partial(signals.assets_changed.send, sender=self.__class__, asset_ids=approved,
+                                          rows=self.rows))
+        return self._ordered()
+
+    def _ordered(self):
+        return [self.results[approval_id] for approval_id in self.approval_ids]
+
+    def _result(self, approval_id, sn, status, message, asset_id=None):
+        self.results[approval_id] = {'id': approval_id, 'sn': sn, 'status': status, 'message': message,
+                                     'asset_id': asset_id}
+
+    def _approve(self):
+        """在事务中完成审批，返回上线的资产 id"""
+        zones = {obj.id: obj for obj in
+                 models.NewAssetApprovalZone.objects.defer(None).select_for_update()
+                 .filter(id__in=self.approval_ids)}
+        for approval_id in self.approval_ids:
+            if approval_id not in zones:
+                self._result(approval_id, None, 'not_found', '待审批区中没有这条记录！')
+        prepared = self._prepare([zone for zone in zones.values() if self._pending(zone)])
+        self.manufacturers.resolve(item['manufacturer'] for item in prepared)
+
+        asset_ids = []
+        total = len(prepared)
+        if self.progress:
+            self.progress(0, total)
+        for start in range(0, total, self.chunk_size):
+            chunk = prepared[start:start + self.chunk_size]
+            asset_ids += self._create(chunk)
+            if self.progress:
+                self.progress(start + len(chunk), total)
+        if prepared:
+            models.NewAssetApprovalZone.objects.filter(id__in=[item['zone'].id for item in prepared]).update(
+                approved=True, m_time=self.now)
+        self.events.flush()
+        return asset_ids
+
+    def _pending(self, zone):
+        if zone.approved:
+            self._result(zone.id, zone.sn, 'already_approved', '该资产已经审批过了！')
+            return False
+        return True
+
+    def _fail(self, zone, message):
+        self._result(zone.id, zone.sn, 'error', message)
+        self.events.record(event_name(zone.sn, 'approval_failed'), message, new_asset=zone)
+
+    def _prepare(self, zones):
+        """解析并检查每条记录，全部转换成字段值后才开始写入；返回可以上线的记录"""
+        prepared = []
+        for zone in zones:
+            try:
+                data = json.loads(zone.data)
+            except ValueError:
+                self._fail(zone, '资产数据不是合法的 JSON！')
+                continue
+            if isinstance(data, dict):
+                # 汇报中的 asset_type 可能为空，以待审批区中的为准
+                data.setdefault('asset_type', zone.asset_type)
+                data.setdefault('sn', zone.sn)
+            error = validate_report(data)
+            if error:
+                self._fail(zone, error)
+                continue
+            if data['asset_type'] not in dict(models.Asset.asset_type_choice):
+                self._fail(zone, '不支持的资产类型：%s' % data['asset_type'])
+                continue
+            if len(asset_name(data['asset_type'], data['sn'])) > NAME_MAX_LENGTH:
+                self._fail(zone, 'sn 过长，无法生成资产名称！')
+                continue
+            try:
+                prepared.append(self._clean(zone, data))
+            except ValidationError as e:
+                self._fail(zone, '数据格式错误：%s' % '; '.join(e.messages))
+
+        # sn 或名称已被占用的记录不能上线，一次查询检查整批
+        taken_sns = set(models.Asset.objects.filter(sn__in=[item['sn'] for item in prepared])
+                        .values_list('sn', flat=True))
+        taken_names = set(models.Asset.objects.filter(name__in=[item['name'] for item in prepared])
+                          .values_list('name', flat=True))
+        result = []
+        for item in prepared:
+            if item['sn'] in taken_sns:
+                self._fail(item['zone'], '已存在 sn 为 %s 的资产！' % item['sn'])
+            elif item['name'] in taken_names:
+                self._fail(item['zone'], '已存在名称为 %s 的资产！' % item['name'])
+            else:
+                result.append(item)
+        return result
+
+    @staticmethod
+    def _clean(zone, data):
+        asset_type = data['asset_type']
+        item = {
+            'zone': zone,
+            'sn': data['sn'],
+            'asset_type': asset_type,
+            'name': asset_name(asset_type, data['sn']),
+            'hash': report_fingerprint(data),
+            'manufacturer': data.get('manufacturer') or None,
+            'device': None,
+            'cpu': None,
+            'components': {},
+        }
+        if asset_type in DEVICE_MODELS:
+            model, fields = DEVICE_MODELS[asset_type]
+            item['device'] = {f: clean_field_value(model, f, data.get(f)) for f in fields}
+        if asset_type == 'server':
+            if any(data.get(f) is not None for f in CPU_FIELDS):
+                item['cpu'] = {f: clean_field_value(models.CPU, f, data.get(f)) for f in CPU_FIELDS}
+        for spec in COMPONENT_SPECS:
+            cleaned = {}
+            for entry in data.get(spec.report_key) or ():
+                values = spec.clean(entry)
+                # 同一自然键出现多次时以最后一条为准，避免违反唯一约束
+                cleaned[spec.key_of(values)] = values
+            item['components'][spec] = list(cleaned.values())
+        return item
+
+    def _create(self, chunk):
+        assets = [models.Asset(
+            asset_type=item['asset_type'], name=item['name'], sn=item['sn'],
+            manufacturer=self.manufacturers.get(item['manufacturer']), approved_by=self.user,
+            report_hash=item['hash'],
+        ) for item in chunk]
+        models.Asset.objects.bulk_create(assets)
+        # SQLite / MySQL 的 bulk_create 不返回主键，按 sn 查回来
+        ids = dict(models.Asset.objects.filter(sn__in=[item['sn'] for item in chunk]).values_list('sn', 'id'))
+
+        devices, cpus, components = {}, [], {spec: [] for spec in COMPONENT_SPECS}
+        for item, asset in zip(chunk, assets):
+            asset.id = ids[item['sn']]
+            entry = self.rows[asset.id] = {'asset': asset, 'server': None, 'cpu': None}
+            if item['device'] is not None:
+                model = DEVICE_MODELS[item['asset_type']][0]
+                device = model(asset_id=asset.id, **item['device'])
+                devices.setdefault(model, []).append(device)
+                if model is models.Server:
+                    entry['server'] = device
+            if item['cpu'] is not None:
+                entry['cpu'] = models.CPU(asset_id=asset.id, **item['cpu'])
+                cpus.append(entry['cpu'])
+            for spec, rows in item['components'].items():
+                entry[spec.name] = [spec.model(asset_id=asset.id, **values) for values in rows]
+                components[spec] += entry[spec.name]
+            self._result(item['zone'].id, item['sn'], 'approved', '资产审批通过，已上线！', asset.id)
+            self.events.record(event_name('%s <%s>' % (asset.name, asset.sn), 'increased_asset'), '资产审批通过，已上线',
+                               asset=asset, new_asset=item['zone'], event_type=2)
+        for model, rows in devices.items():
+            model.objects.bulk_create(rows)
+        models.CPU.objects.bulk_create(cpus)
+        for spec, rows in components.items():
+            spec.model.objects.bulk_create(rows)
+        return [asset.id for asset in assets]
@@ -3,3 +3,22 @@ from django.apps import AppConfig
 
 class AssetsConfig(AppConfig):
     name = 'assets'
+
+    def ready(self):
+        from . import asset_cache
+        from . import bu_tree
+        from . import capacity
+        from . import conflicts
+        from . import expiry
+        from . import history
+        from . import search
+        from . import signals
+        # 业务线树要先于容量汇总更新
+        bu_tree.connect_signals()
+        capacity.connect_signals()
+        expiry.connect_signals()
+        conflicts.connect_signals()
+        history.connect_signals()
+        search.connect_signals()
+        asset_cache.connect_signals()
+        signals.connect_signals()
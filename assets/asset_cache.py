@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+资产详情的读穿缓存。
+
+每台资产在缓存中有一个版本号，资产本身、设备、CPU、内存、硬盘、网卡、标签、事件，
+以及它引用的厂商、业务线、机房、合同、管理员发生变化时，在事务提交后由信号把版本号加一。
+缓存的键中带有版本号（asset:<id>:<部分>:<版本>），版本号变化后旧的条目不会再被读到，
+由缓存后端按 LRU 淘汰，不需要设置过期时间。
+版本号每次变化都重新生成（当前时间的微秒数加随机数），不会与之前用过的重复；
+不用 incr 是因为文件缓存的 incr 不是原子的，两个进程同时加一会丢掉一次变化。
+
+m_time 在每次汇报时都会刷新，不放在缓存中：命中时用一次主键查询取 m_time，同时确认资产仍然存在。
+在事务中读取时直接查询数据库，不读也不写缓存（事务中的修改尚未提交，版本号也还没有变化）。
+
+缓存后端由 CACHES 中 ALIAS 对应的配置决定。各进程的内存缓存互相看不到对方的版本号变化，
+所以只有单进程时才用进程内的 LRUCache；开启异步入库或有多个 Web 进程时，settings 默认改用 FileCache（同一台机器上共享）。
+"""
+
+import random
+import threading
+import time
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+from . import api
+from . import cache_backends
+from . import models
+from . import signals
+from .asset_handler import COMPONENT_SPECS
+
+DEFAULTS = {
+    # CACHES 中的缓存别名
+    'ALIAS': 'assets',
+    # 详情中最多返回多少条最近的事件
+    'MAX_EVENTS': 100,
+}
+
+EVENT_FIELDS = ('id', 'name', 'event_type', 'component', 'detail', 'date')
+
+# 资产引用的数据：(模型, Asset 上的外键字段)，名称变化时引用它的资产都要失效
+REFERENCES = (
+    (models.Manufacturer, 'manufacturer_id'),
+    (models.BusinessUnit, 'business_unit_id'),
+    (models.IDC, 'idc_id'),
+    (models.Contract, 'contract_id'),
+)
+
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ASSET_CACHE', {}))
+    return config
+
+
+def get_cache():
+    return caches[get_config()['ALIAS']]
+
+
+def _version_key(asset_id):
+    return 'asset:%s:v' % asset_id
+
+
+def _count(name, result):
+    with _lock:
+        _counters['%s_%s' % (name, result)] += 1
+
+
+def _new_version():
+    return '%x%04x' % (int(time.time() * 1000000), random.getrandbits(16))
+
+
+def version(asset_id):
+    cache = get_cache()
+    key = _version_key(asset_id)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _new_version(), None)
+        value = cache.get(key)
+    return value
+
+
+def bump(asset_ids):
+    """重新生成资产的版本号，缓存中的旧条目随之失效"""
+    cache = get_cache()
+    for asset_id in asset_ids:
+        key = _version_key(asset_id)
+        # 版本号不在缓存中（从未读取过或已被淘汰）时不必写入，下次读取时重新生成
+        if cache.get(key) is not None:
+            cache.set(key, _new_version(), None)
+
+
+def schedule_bump(asset_ids):
+    signals.defer_until_commit(bump, asset_ids)
+
+
+def read_through(asset_id, name, loader):
+    """按资产当前版本读取缓存，未命中时调用 loader() 读数据库并写入缓存；loader 返回 None 时不缓存"""
+    if connection.in_atomic_block:
+        return loader()
+    cache = get_cache()
+    key = 'asset:%s:%s:%s' % (asset_id, name, version(asset_id))
+    value = cache.get(key)
+    if value is not None:
+        _count(name, 'hits')
+        return value
+    _count(name, 'misses')
+    value = loader()
+    if value is not None:
+        cache.set(key, value, None)
+    return value
+
+
+# 缓存的内容从 default 读取：版本号在 default 提交后变化，只读副本可能还没有同步到
+def _load_detail(asset_id):
+    asset = api.asset_queryset().using(DEFAULT_DB_ALIAS).filter(id=asset_id).first()
+    if asset is None:
+        return None
+    return api.serialize_asset(asset)
+
+
+def _load_events(asset_id, limit):
+    return list(models.EventLog.objects.using(DEFAULT_DB_ALIAS).filter(asset_id=asset_id).order_by('-date', '-id')
+                .values(*EVENT_FIELDS)[:limit])
+
+
+def asset_detail(asset_id, events=0):
+    """
+    资产详情，与 api.serialize_asset 的结果相同；events 大于 0 时在 recent_events 中附上最近的事件。
+    资产不存在时返回 None。
+    """
+    loaded = {}
+
+    def load_detail():
+        data = _load_detail(asset_id)
+        if data is not None:
+            loaded['m_time'] = data.pop('m_time')
+        return data
+
+    data = read_through(asset_id, 'detail', load_detail)
+    if data is None:
+        return None
+    if 'm_time' in loaded:
+        m_time = loaded['m_time']
+    else:
+        m_time = models.Asset.objects.filter(id=asset_id).values_list('m_time', flat=True).first()
+        if m_time is None:
+            return None
+    data = dict(data, m_time=m_time)
+    if events > 0:
+        limit = min(events, get_config()['MAX_EVENTS'])
+        data['recent_events'] = read_through(asset_id, 'events:%d' % limit, lambda: _load_events(asset_id, limit))
+    return data
+
+
+def clear():
+    get_cache().clear()
+
+
+def stats():
+    """本进程中的命中、未命中次数（按缓存的部分统计），以及缓存后端淘汰的条数"""
+    cache = get_cache()
+    with _lock:
+        counters = dict(_counters)
+    hits = sum(value for key, value in counters.items() if key.endswith('_hits'))
+    misses = sum(value for key, value in counters.items() if key.endswith('_misses'))
+    location = getattr(cache, 'location', None)
+    return {
+        'backend': '%s.%s' % (cache.__class__.__module__, cache.__class__.__name__),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        'evictions': cache_backends.evictions(location) if location is not None else None,
+        'counters': counters,
+    }
+
+
+def reset_stats():
+    with _lock:
+        _counters.clear()
+
+
+# ---- 失效 ----
+
+def _on_asset_change(sender, instance, **kwargs):
+    # 虚拟机的详情中带有宿主机的名称和 sn
+    hosted = models.Server.objects.filter(hosted_on__asset_id=instance.pk).values_list('asset_id', flat=True)
+    schedule_bump([instance.pk] + list(hosted))
+
+
+def _on_component_change(sender, instance, **kwargs):
+    if instance.asset_id is not None:
+        schedule_bump([instance.asset_id])
+
+
+def _on_reference_change(sender, instance, field, **kwargs):
+    schedule_bump(models.Asset.objects.filter(**{field: instance.pk}).values_list('id', flat=True))
+
+
+def _on_admin_change(sender, instance, update_fields=None, **kwargs):
+    # 登录时只更新 last_login，不影响详情
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    schedule_bump(models.Asset.objects.filter(admin_id=instance.pk).values_list('id', flat=True))
+
+
+def _on_tag_change(sender, instance, **kwargs):
+    schedule_bump(models.Asset.tags.through.objects.filter(tag_id=instance.pk).values_list('asset_id', flat=True))
+
+
+def _on_tags_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        schedule_bump([instance.pk])
+    elif action == 'pre_clear':
+        schedule_bump(instance.asset_set.values_list('id', flat=True))
+    elif pk_set:
+        schedule_bump(pk_set)
+
+
+def _on_assets_changed(sender, asset_ids, **kwargs):
+    if asset_ids:
+        schedule_bump(asset_ids)
+
+
+def connect_signals():
+    post_save.connect(_on_asset_change, sender=models.Asset, dispatch_uid='cache_asset_save')
+    post_delete.connect(_on_asset_change, sender=models.Asset, dispatch_uid='cache_asset_delete')
+    for model in (models.Server, models.NetworkDevice, models.StorageDevice, models.SecurityDevice, models.CPU,
+                  models.EventLog) + tuple(spec.model for spec in COMPONENT_SPECS):
+        post_save.connect(_on_component_change, sender=model, dispatch_uid='cache_%s_save' % model.__name__)
+        post_delete.connect(_on_component_change, sender=model, dispatch_uid='cache_%s_delete' % model.__name__)
+    for model, field in REFERENCES:
+        post_save.connect(partial(_on_reference_change, field=field), sender=model, weak=False,
+                          dispatch_uid='cache_%s_save' % model.__name__)
+        # 删除时 Asset 上的外键被置空，需要在删除之前找到引用它的资产
+        pre_delete.connect(partial(_on_reference_change, field=field), sender=model, weak=False,
+                           dispatch_uid='cache_%s_delete' % model.__name__)
+    post_save.connect(_on_admin_change, sender=User, dispatch_uid='cache_user_save')
+    pre_delete.connect(_on_admin_change, sender=User, dispatch_uid='cache_user_delete')
+    post_save.connect(_on_tag_change, sender=models.Tag, dispatch_uid='cache_tag_save')
+    pre_delete.connect(_on_tag_change, sender=models.Tag, dispatch_uid='cache_tag_delete')
+    m2m_changed.connect(_on_tags_m2m, sender=models.Asset.tags.through, dispatch_uid='cache_tags_m2m')
+    signals.assets_changed.connect(_on_assets_changed, dispatch_uid='cache_assets_changed')
+    signals.events_changed.connect(_on_assets_changed, dispatch_uid='cache_events_changed')
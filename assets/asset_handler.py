@@ -0,0 +1,554 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+资产汇报数据的入库处理。
+
+客户端一次可以汇报一台或多台资产。同一批汇报在一个事务内处理：
+先把所有需要的旧数据一次性查出来，在内存中按 unique_together 定义的自然键比对，
+再用 bulk_create / bulk_update / 批量 delete 写回数据库。
+因此每批汇报的查询次数是固定的，与资产拥有多少内存条、硬盘、网卡无关。
+提交后 assets_changed 信号带上写入后的行，容量汇总、资产历史、搜索索引直接使用，不再各自查询一遍。
+"""
+
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import models
+from . import signals
+from .events import EventRecorder, event_name
+
+
+class BaselineMissing(Exception):
+    """增量汇报需要的基线行（服务器或 CPU）在库中不存在，只能改为提交完整汇报"""
+
+
+class ComponentSpec(object):
+    """
+    描述一种可以有多条记录的组件（内存、硬盘、网卡）。
+    report_key: 汇报数据中对应的键
+    natural_key: 同一资产下用来识别同一个组件的字段，与模型的 unique_together 保持一致
+    fields: 其余需要同步的字段
+    """
+
+    def __init__(self, model, report_key, natural_key, fields, aliases=None):
+        self.model = model
+        self.report_key = report_key
+        self.natural_key = natural_key
+        self.fields = fields
+        # 汇报数据中的键名与模型字段名不一致时，在这里做映射
+        self.aliases = aliases or {}
+        self.name = model._meta.model_name
+
+    def clean(self, entry):
+        """把汇报中的一条组件数据转换成模型字段 -> 值的字典"""
+        if not isinstance(entry, dict):
+            raise ValidationError('%s 数据必须为字典格式' % self.report_key)
+        values = {}
+        for field_name in self.natural_key + self.fields:
+            raw = entry.get(field_name)
+            if raw is None:
+                for alias in self.aliases.get(field_name, ()):
+                    if alias in entry:
+                        raw = entry[alias]
+                        break
+            values[field_name] = clean_field_value(self.model, field_name, raw)
+        return values
+
+    def key_of(self, values):
+        return tuple(values[f] for f in self.natural_key)
+
+    def row_key(self, obj):
+        return tuple(getattr(obj, f) for f in self.natural_key)
+
+
+COMPONENT_SPECS = (
+    ComponentSpec(models.RAM, 'ram', ('slot',), ('sn', 'model', 'manufacturer', 'capacity')),
+    ComponentSpec(models.Disk, 'physical_disk_driver', ('sn',),
+                  ('slot', 'model', 'manufacturer', 'capacity', 'interface_type'),
+                  aliases={'interface_type': ('iface_type',), 'capacity': ('size',)}),
+    ComponentSpec(models.NIC, 'nic', ('model', 'mac'), ('name', 'ip_address', 'net_mask', 'bonding')),
+)
+
+# 直接写到 Server / CPU 表上的标量字段
+SERVER_FIELDS = ('model', 'raid_type', 'os_type', 'os_distribution', 'os_release')
+CPU_FIELDS = ('cpu_model', 'cpu_count', 'cpu_core_count')
+
+# 新资产待审批区中单独拆出来的字段
+APPROVAL_FIELDS = ('asset_type', 'manufacturer', 'model', 'ram_size', 'cpu_model', 'cpu_count', 'cpu_core_count',
+                   'os_distribution', 'os_type', 'os_release', 'raid_type')
+# 由组件数据汇总出来的字段
+APPROVAL_SUMMARY_FIELDS = ('disk_count', 'disk_size', 'nic_count')
+# 待审批区组件行（NewAssetComponent）从组件数据中保存的字段
+APPROVAL_COMPONENT_FIELDS = ('slot', 'name', 'sn', 'model', 'manufacturer', 'capacity', 'mac', 'ip_address')
+
+
+def clean_field_value(model, field_name, raw):
+    """按模型字段的类型转换数据，空字符串对可为空的字段视为 None"""
+    field = model._meta.get_field(field_name)
+    if raw in (None, '') and field.null:
+        return None
+    if raw is None:
+        return field.get_default()
+    value = field.to_python(raw)
+    if field.choices and value not in dict(field.flatchoices):
+        value = field.get_default()
+    return value
+
+
+def approval_components(data):
+    """汇报中的内存、硬盘、网卡 -> 待审批区组件行的字段值；数据不合法时抛出 ValidationError"""
+    rows = []
+    for spec in COMPONENT_SPECS:
+        for entry in data.get(spec.report_key) or ():
+            values = spec.clean(entry)
+            rows.append(dict({f: values.get(f) for f in APPROVAL_COMPONENT_FIELDS}, component=spec.name))
+    return rows
+
+
+def approval_summary(components):
+    disks = [row for row in components if row['component'] == 'disk']
+    return {
+        'disk_count': len(disks),
+        'disk_size': sum(row['capacity'] or 0 for row in disks),
+        'nic_count': sum(row['component'] == 'nic' for row in components),
+    }
+
+
+def report_fingerprint(data):
+    """
+    汇报数据的指纹：规范化 JSON（键排序、紧凑分隔符）的 sha256。
+    客户端 InfoCollection 使用同样的算法，report_hash 字段本身不参与计算。
+    """
+    payload = {k: v for k, v in data.items() if k != 'report_hash'}
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def is_delta(data):
+    """
+    增量汇报只包含相对上一次被确认的汇报（base_hash）的变化：
+    changed 为变化的标量字段，components 中按组件类型给出 added / changed / removed 列表。
+    """
+    return data.get('report_type') == 'delta'
+
+
+def validate_report(data):
+    """检查一份汇报的必填字段，合法时返回 None，否则返回错误信息"""
+    if not isinstance(data, dict):
+        return '数据必须为字典格式！'
+    if not data.get('sn'):
+        return '没有资产sn序列号，请检查数据！'
+    if not isinstance(data['sn'], str):
+        return '资产sn序列号必须为字符串！'
+    if not data.get('asset_type'):
+        return '没有资产类型，请检查数据！'
+    if not isinstance(data['asset_type'], str):
+        return '资产类型必须为字符串！'
+    if is_delta(data) and not all(isinstance(data.get(key), str) and data[key] for key in ('base_hash', 'report_hash')):
+        return '增量汇报缺少基线指纹，请检查数据！'
+    return None
+
+
+def stale_deltas(reports):
+    """
+    异步模式入队前检查增量汇报的基线，返回基线与服务器不一致的汇报序号集合。
+    客户端收到 queued 后会把这份汇报当作新的基线，不一致的增量汇报必须同步要求完整汇报，
+    不能等入库时才发现。同一请求中排在前面的汇报视为已被接受，它的指纹作为后续增量汇报的基线。
+    """
+    deltas = {data['sn'] for data in reports if is_delta(data)}
+    if not deltas:
+        return set()
+    expected = dict(models.Asset.objects.filter(sn__in=deltas).values_list('sn', 'report_hash'))
+    stale = set()
+    for index, data in enumerate(reports):
+        sn = data['sn']
+        if not is_delta(data):
+            expected[sn] = report_fingerprint(data)
+        elif expected.get(sn) is None or expected[sn] != data['base_hash']:
+            stale.add(index)
+        else:
+            expected[sn] = data['report_hash']
+    return stale
+
+
+def report_label(data, index):
+    """出错的汇报在结果中的标识：合法的 sn，否则为它在批次中的序号"""
+    sn = data.get('sn') if isinstance(data, dict) else None
+    return sn if sn and isinstance(sn, str) else '#%s' % index
+
+
+def touch_if_unchanged(sn, report_hash):
+    """
+    指纹与库中一致时只刷新 m_time，不再解析和比对汇报内容。
+    返回 True 表示资产数据没有变化。
+    """
+    if not sn or not report_hash:
+        return False
+    return models.Asset.objects.filter(sn=sn, report_hash=report_hash).update(m_time=timezone.now()) > 0
+
+
+def parse_reports(raw_reports):
+    """
+    把 asset_data 字段的内容解析为汇报列表。
+    asset_data 可以是一台资产的字典，也可以是多台资产组成的列表；允许同一请求中出现多个 asset_data 字段。
+    """
+    reports = []
+    for raw in raw_reports:
+        data = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+        if isinstance(data, dict):
+            reports.append(data)
+        elif isinstance(data, list):
+            reports.extend(data)
+        else:
+            raise ValueError('数据必须为字典或字典列表格式！')
+    return reports
+
+
+class LookupCache(object):
+    """
+    按唯一字段缓存的 get-or-create（厂商、软件版本等）。
+    resolve 一次查询取出所有已有的对象，不存在的批量创建后再查一次，之后同一个值直接从缓存中取。
+    """
+
+    def __init__(self, model, field, defaults=None):
+        self.model = model
+        self.field = field
+        self.defaults = defaults or {}
+        self._cache = {}
+
+    def resolve(self, values):
+        """返回 值 -> 对象 的字典，空值被忽略"""
+        missing = {value for value in values if value not in (None, '') and value not in self._cache}
+        if missing:
+            self._load(missing)
+            created = missing - set(self._cache)
+            if created:
+                # 并发创建同一个值时忽略唯一约束冲突，以库中的那条为准
+                self.model.objects.bulk_create([self.model(**dict(self.defaults, **{self.field: value}))
+                                                for value in created], ignore_conflicts=True)
+                self._load(created)
+        return self._cache
+
+    def get(self, value):
+        return self._cache.get(value)
+
+    def _load(self, values):
+        for obj in self.model.objects.filter(**{'%s__in' % self.field: values}):
+            self._cache[getattr(obj, self.field)] = obj
+
+
+class ReportBatch(object):
+    """
+    一批资产汇报。
+    已存在的资产直接比对更新，未知的资产放入新资产待审批区。
+    """
+
+    def __init__(self, reports, user=None):
+        self.reports = reports
+        self.user = user
+        self.now = timezone.now()
+        self.results = {}
+        self.events = EventRecorder(user)
+        self.hashes = {}
+        # 本批次中组件数据发生变化的资产，提交后通过 assets_changed 信号通知，同时带上写入后的数据
+        self.changed_assets = set()
+        self.changed_rows = {}
+
+    def process(self):
+        """处理整批汇报，返回每台资产的处理结果列表"""
+        valid = self._validate()
+        with transaction.atomic():
+            # 在写入之前登记，提交后先于模型信号登记的刷新执行，接收方可以跳过这些重复的刷新
+            transaction.on_commit(self._send_changed)
+            assets = {obj.sn: obj for obj in models.Asset.objects.filter(sn__in=list(valid))}
+            new_reports = {}
+            for sn, data in valid.items():
+                if sn in assets:
+                    continue
+                if is_delta(data):
+                    # 未上线的资产没有基线，必须提交完整数据
+                    self._result(sn, 'full_report_required', '服务器上没有该资产的基线数据，请提交完整汇报！')
+                else:
+                    new_reports[sn] = data
+            known_reports = {sn: (assets[sn], data) for sn, data in valid.items() if sn in assets}
+            if new_reports:
+                self._stage_new_assets(new_reports)
+            if known_reports:
+                self._update_assets(known_reports)
+            # 本批次的事件合并后一次写入，与资产数据在同一个事务中提交
+            self.events.flush()
+        return list(self.results.values())
+
+    def _send_changed(self):
+        if self.changed_assets:
+            signals.assets_changed.send(sender=self.__class__, asset_ids=sorted(self.changed_assets),
+                                        rows=self.changed_rows)
+
+    def _result(self, sn, status, message):
+        self.results[sn] = {'sn': sn, 'status': status, 'message': message}
+
+    def _validate(self):
+        """
+        检查必填字段，同一批次中重复的 sn 以最后一份为准。
+        增量汇报（report_type 为 delta）无法在服务器端还原完整数据，直接采用客户端给出的新指纹。
+        """
+        valid = {}
+        for index, data in enumerate(self.reports):
+            error = validate_report(data)
+            if error:
+                self._result(report_label(data, index), 'error', error)
+                continue
+            sn = data['sn']
+            if is_delta(data):
+                self.hashes[sn] = data['report_hash']
+            else:
+                self.hashes[sn] = report_fingerprint(data)
+            valid[sn] = data
+        return valid
+
+    def _stage_new_assets(self, reports):
+        """
+        新资产写入待审批区；已在待审批区中且未批准的，用最新数据覆盖。
+        汇报数据在这里拆成结构化字段和组件行，原始数据压缩保存。
+        """
+        pending = {obj.sn: obj for obj in models.NewAssetApprovalZone.objects.filter(sn__in=list(reports))}
+        to_create, to_update, components = [], [], {}
+        for sn, data in reports.items():
+            obj = pending.get(sn)
+            if obj is None:
+                obj = models.NewAssetApprovalZone(sn=sn)
+                to_create.append(obj)
+            elif obj.approved:
+                self._result(sn, 'error', '该资产已批准上线，请等待资产数据同步！')
+                continue
+            else:
+                to_update.append(obj)
+            try:
+                for field_name in APPROVAL_FIELDS:
+                    setattr(obj, field_name,
+                            clean_field_value(models.NewAssetApprovalZone, field_name, data.get(field_name)))
+                components[sn] = approval_components(data)
+            except ValidationError as e:
+                if obj in to_create:
+                    to_create.remove(obj)
+                else:
+                    to_update.remove(obj)
+                self._result(sn, 'error', '数据格式错误：%s' % '; '.join(e.messages))
+                continue
+            for field_name, value in approval_summary(components[sn]).items():
+                setattr(obj, field_name, value)
+            obj.data = json.dumps(data)
+            obj.m_time = self.now
+            self._result(sn, 'new_asset_zone', '资产已经加入或更新待审批区！')
+        if to_create:
+            models.NewAssetApprovalZone.objects.bulk_create(to_create)
+        if to_update:
+            models.NewAssetApprovalZone.objects.bulk_update(
+                to_update, APPROVAL_FIELDS + APPROVAL_SUMMARY_FIELDS + ('raw_data', 'm_time'))
+            models.NewAssetComponent.objects.filter(approval_id__in=[obj.id for obj in to_update]).delete()
+        if components:
+            ids = dict(models.NewAssetApprovalZone.objects.filter(sn__in=list(components)).values_list('sn', 'id'))
+            models.NewAssetComponent.objects.bulk_create([
+                models.NewAssetComponent(approval_id=ids[sn], **row) for sn, rows in components.items() for row in rows
+            ])
+
+    def _update_assets(self, reports):
+        """已上线资产：一次性读出服务器、CPU 及各类组件，在内存中比对后批量写回"""
+        unchanged = [asset for sn, (asset, _) in reports.items() if asset.report_hash == self.hashes[sn]]
+        if unchanged:
+            # 指纹未变的资产只刷新 m_time
+            models.Asset.objects.filter(id__in=[asset.id for asset in unchanged]).update(m_time=self.now)
+            for asset in unchanged:
+                self._result(asset.sn, 'unchanged', '资产数据没有变化！')
+                del reports[asset.sn]
+        for sn, (asset, data) in list(reports.items()):
+            if is_delta(data) and asset.report_hash != data['base_hash']:
+                self._result(sn, 'full_report_required', '增量汇报的基线与服务器不一致，请提交完整汇报！')
+                del reports[sn]
+        if not reports:
+            return
+        asset_ids = [asset.id for asset, _ in reports.values()]
+        manufacturers = self._resolve_manufacturers(reports)
+        servers = {obj.asset_id: obj for obj in models.Server.objects.filter(asset_id__in=asset_ids)}
+        cpus = {obj.asset_id: obj for obj in models.CPU.objects.filter(asset_id__in=asset_ids)}
+        existing = {}
+        for spec in COMPONENT_SPECS:
+            rows = {}
+            for obj in spec.model.objects.filter(asset_id__in=asset_ids):
+                rows.setdefault(obj.asset_id, {})[spec.row_key(obj)] = obj
+            existing[spec] = rows
+
+        writes = {
+            'server': ([], [], set()),
+            'cpu': ([], [], set()),
+        }
+        component_writes = {spec: ([], [], set(), []) for spec in COMPONENT_SPECS}
+        touched_assets = []
+
+        for sn, (asset, data) in reports.items():
+            event_mark = self.events.mark()
+            try:
+                staged = self._diff_asset(asset, data, manufacturers, servers, cpus, existing)
+            except ValidationError as e:
+                # 出错的资产整份丢弃，已经生成的事件也一并撤销
+                self.events.rollback(event_mark)
+                self._result(sn, 'error', '数据格式错误：%s' % '; '.join(e.messages))
+                continue
+            except BaselineMissing as e:
+                self.events.rollback(event_mark)
+                self._result(sn, 'full_report_required', str(e))
+                continue
+            for name, (create, update, fields) in staged['scalars'].items():
+                writes[name][0].extend(create)
+                writes[name][1].extend(update)
+                writes[name][2].update(fields)
+            for spec, (create, update, fields, delete) in staged['components'].items():
+                component_writes[spec][0].extend(create)
+                component_writes[spec][1].extend(update)
+                component_writes[spec][2].update(fields)
+                component_writes[spec][3].extend(delete)
+            asset.m_time = self.now
+            asset.report_hash = self.hashes[sn]
+            touched_assets.append(asset)
+            self.changed_assets.add(asset.id)
+            self._result(sn, 'updated', '资产数据已经更新！')
+
+        for name, model in (('server', models.Server), ('cpu', models.CPU)):
+            create, update, fields = writes[name]
+            if create:
+                model.objects.bulk_create(create)
+            if update:
+                model.objects.bulk_update(update, sorted(fields))
+        for spec, (create, update, fields, delete) in component_writes.items():
+            if delete:
+                spec.model.objects.filter(id__in=delete).delete()
+            if create:
+                spec.model.objects.bulk_create(create)
+            if update:
+                spec.model.objects.bulk_update(update, sorted(fields))
+        if touched_assets:
+            models.Asset.objects.bulk_update(touched_assets, ['manufacturer', 'm_time', 'report_hash'])
+        self._collect_rows(touched_assets, servers, cpus, existing, writes, component_writes)
+
+    def _collect_rows(self, assets, servers, cpus, existing, writes, component_writes):
+        """写入后各资产的服务器、CPU 和组件行，即已读出的行去掉删除的、加上新建的"""
+        for asset in assets:
+            entry = {'asset': asset, 'server': servers.get(asset.id), 'cpu': cpus.get(asset.id)}
+            for spec in COMPONENT_SPECS:
+                entry[spec.name] = list(existing[spec].get(asset.id, {}).values())
+            self.changed_rows[asset.id] = entry
+        for name in ('server', 'cpu'):
+            for obj in writes[name][0]:
+                self.changed_rows[obj.asset_id][name] = obj
+        for spec, (create, _, _, delete) in component_writes.items():
+            if delete:
+                deleted = set(delete)
+                for entry in self.changed_rows.values():
+                    entry[spec.name] = [obj for obj in entry[spec.name] if obj.id not in deleted]
+            for obj in create:
+                self.changed_rows[obj.asset_id][spec.name].append(obj)
+
+    def _resolve_manufacturers(self, reports):
+        """一次查询解析所有厂商名称，不存在的批量创建"""
+        return LookupCache(models.Manufacturer, 'name').resolve(data.get('manufacturer') for _, data in reports.values())
+
+    def _diff_asset(self, asset, data, manufacturers, servers, cpus, existing):
+        """
+        比对一台资产的汇报数据和库中数据，返回需要写回的对象。
+        只处理汇报中出现的部分，汇报中没有的组件类型保持不变。
+        """
+        staged = {'scalars': {}, 'components': {}}
+        delta = is_delta(data)
+        # 增量汇报中，标量字段只包含发生变化的部分
+        scalars = (data.get('changed') or {}) if delta else data
+
+        manufacturer = manufacturers.get(scalars.get('manufacturer'))
+        if manufacturer is not None and asset.manufacturer_id != manufacturer.id:
+            self._event(asset, 'manufacturer', '厂商变更为 %s' % manufacturer.name)
+            asset.manufacturer = manufacturer
+
+        if asset.asset_type == 'server':
+            staged['scalars']['server'] = self._diff_scalars(
+                asset, models.Server, servers.get(asset.id), SERVER_FIELDS, scalars, delta)
+        if any(f in scalars for f in CPU_FIELDS):
+            staged['scalars']['cpu'] = self._diff_scalars(
+                asset, models.CPU, cpus.get(asset.id), CPU_FIELDS, scalars, delta)
+
+        for spec in COMPONENT_SPECS:
+            rows = existing[spec].get(asset.id, {})
+            if delta:
+                section = (data.get('components') or {}).get(spec.report_key)
+                if not section:
+                    continue
+                reported = self._clean_entries(spec, (section.get('added') or []) + (section.get('changed') or []))
+                removed = set(self._clean_entries(spec, section.get('removed') or []))
+                staged['components'][spec] = self._diff_components(asset, spec, rows, reported, removed)
+            elif spec.report_key in data:
+                reported = self._clean_entries(spec, data[spec.report_key] or ())
+                staged['components'][spec] = self._diff_components(asset, spec, rows, reported)
+        return staged
+
+    @staticmethod
+    def _clean_entries(spec, entries):
+        """组件列表 -> {自然键: 字段值}"""
+        cleaned = {}
+        for entry in entries:
+            values = spec.clean(entry)
+            cleaned[spec.key_of(values)] = values
+        return cleaned
+
+    def _diff_scalars(self, asset, model, obj, field_names, data, delta=False):
+        present = [f for f in field_names if f in data]
+        values = {f: clean_field_value(model, f, data[f]) for f in present}
+        if obj is None:
+            if delta:
+                # 增量汇报只有变化的字段，不能据此新建一行
+                raise BaselineMissing('服务器上没有该资产的%s基线数据，请提交完整汇报！' % model._meta.verbose_name)
+            self._event(asset, model._meta.model_name, '新增%s数据' % model._meta.verbose_name)
+            return [model(asset=asset, **values)], [], set()
+        changed = set()
+        for f, value in values.items():
+            old = getattr(obj, f)
+            if old != value:
+                self._event(asset, model._meta.model_name, '%s 由 %s 变更为 %s' % (f, old, value))
+                setattr(obj, f, value)
+                changed.add(f)
+        return [], [obj] if changed else [], changed
+
+    def _diff_components(self, asset, spec, rows, reported, removed=None):
+        """
+        rows: 库中该资产已有的组件，自然键 -> 对象
+        reported: 汇报中的组件，自然键 -> 字段值
+        removed: 增量汇报中明确移除的组件自然键；为 None 表示完整汇报，库中有而汇报中没有的组件视为已移除
+        """
+        create, update, fields, delete = [], [], set(), []
+        for key, values in reported.items():
+            obj = rows.get(key)
+            if obj is None:
+                create.append(spec.model(asset=asset, **values))
+                self._event(asset, spec.name, '新增%s：%s' % (spec.model._meta.verbose_name, '/'.join(map(str, key))))
+                continue
+            changed = [f for f in spec.fields if getattr(obj, f) != values[f]]
+            if changed:
+                for f in changed:
+                    self._event(asset, spec.name, '%s %s: %s 由 %s 变更为 %s' % (
+                        spec.model._meta.verbose_name, '/'.join(map(str, key)), f, getattr(obj, f), values[f]))
+                    setattr(obj, f, values[f])
+                update.append(obj)
+                fields.update(changed)
+        if removed is None:
+            removed = set(rows) - set(reported)
+        for key, obj in rows.items():
+            if key in removed and key not in reported:
+                delete.append(obj.id)
+                self._event(asset, spec.name, '移除%s：%s' % (spec.model._meta.verbose_name, '/'.join(map(str, key))))
+        return create, update, fields, delete
+
+    def _event(self, asset, component, detail):
+        self.events.record(event_name('%s <%s>' % (asset.name, asset.sn), 'hardware_alternation'), detail,
+                           asset=asset, event_type=1, component=component)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+业务线树。
+
+BusinessUnitClosure 闭包表在业务线新建、移动、删除时同步维护，任意子树都能用一次查询取出；
+整棵树另外在进程内缓存一份（业务线很少变化，但几乎每个看板请求都要用到），
+版本号与资产详情缓存放在同一个缓存别名（ASSET_CACHE['ALIAS']）中，任何进程修改业务线后换一个新的版本号，
+各进程下次读取时发现版本变化即重新加载。开启异步入库或有多个 Web 进程时，settings 把这个别名配置为
+同一台机器上共享的 FileCache，其他进程的修改也能看到。
+版本号每次都重新生成而不用 incr：文件缓存的 incr 不是原子的，两个进程同时加一会丢掉一次变化。
+"""
+
+import threading
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from . import asset_cache
+from . import models
+
+VERSION_KEY = 'assets:bu_tree:version'
+# SQLite 单条语句的参数个数有限，按业务线 id 分批查询
+ID_BATCH = 500
+
+
+# ---- 闭包表维护 ----
+
+def insert_node(unit):
+    """新建的业务线：到自身的一行，加上父业务线所有上级到它的行"""
+    rows = [models.BusinessUnitClosure(ancestor_id=unit.pk, descendant_id=unit.pk, depth=0)]
+    if unit.parent_unit_id:
+        rows += [models.BusinessUnitClosure(ancestor_id=ancestor_id, descendant_id=unit.pk, depth=depth + 1)
+                 for ancestor_id, depth in models.BusinessUnitClosure.objects.filter(
+                     descendant_id=unit.parent_unit_id).values_list('ancestor_id', 'depth')]
+    models.BusinessUnitClosure.objects.bulk_create(rows)
+
+
+def move_node(unit):
+    """
+    业务线换了上级：先断开整个子树与原上级们的关系，
+    再把新上级的每个上级与子树的每个节点连起来。
+    """
+    subtree = list(models.BusinessUnitClosure.objects.filter(ancestor_id=unit.pk).values_list('descendant_id', 'depth'))
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    models.BusinessUnitClosure.objects.filter(descendant_id__in=subtree_ids).exclude(
+        ancestor_id__in=subtree_ids).delete()
+    if unit.parent_unit_id:
+        parents = models.BusinessUnitClosure.objects.filter(
+            descendant_id=unit.parent_unit_id).values_list('ancestor_id', 'depth')
+        models.BusinessUnitClosure.objects.bulk_create([
+            models.BusinessUnitClosure(ancestor_id=ancestor_id, descendant_id=descendant_id,
+                                       depth=parent_depth + depth + 1)
+            for ancestor_id, parent_depth in parents for descendant_id, depth in subtree
+        ])
+
+
+def rebuild_closure():
+    """按 parent_unit 整体重建闭包表"""
+    parents = dict(models.BusinessUnit.objects.values_list('id', 'parent_unit_id'))
+    rows = []
+    for unit_id, chain in _ancestor_chains(parents).items():
+        rows += [models.BusinessUnitClosure(ancestor_id=ancestor_id, descendant_id=unit_id, depth=depth)
+                 for depth, ancestor_id in enumerate(chain)]
+    with transaction.atomic():
+        models.BusinessUnitClosure.objects.all().delete()
+        models.BusinessUnitClosure.objects.bulk_create(rows, batch_size=500)
+
+
+def ancestors_of(unit_ids=None):
+    """
+    从闭包表读取业务线 id -> [自身, 上级, 上上级, ...]，unit_ids 为空时读取全部。
+    在调用方的事务中读取，其他进程刚提交的移动也能看到；需要与数据一致的写入用它，不用进程内缓存。
+    """
+    links = models.BusinessUnitClosure.objects.order_by('descendant_id', 'depth')
+    if unit_ids is None:
+        batches = [links]
+    else:
+        unit_ids = sorted(set(unit_ids))
+        batches = [links.filter(descendant_id__in=unit_ids[start:start + ID_BATCH])
+                   for start in range(0, len(unit_ids), ID_BATCH)]
+    result = defaultdict(list)
+    for batch in batches:
+        for descendant_id, ancestor_id in batch.values_list('descendant_id', 'ancestor_id'):
+            result[descendant_id].append(ancestor_id)
+    return dict(result)
+
+
+def _ancestor_chains(parents):
+    chains = {}
+    for unit_id in parents:
+        chain, current = [], unit_id
+        # 防止数据中出现环
+        while current is not None and current not in chain:
+            chain.append(current)
+            current = parents.get(current)
+        chains[unit_id] = chain
+    return chains
+
+
+# ---- 进程内缓存 ----
+
+class TreeCache(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._nodes = None
+        self._ancestors = None
+
+    def _load(self):
+        cache = asset_cache.get_cache()
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # 版本号不存在（首次使用或被缓存淘汰）时生成一个，各进程都会因版本变化重新加载
+            cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+        with self._lock:
+            if self._nodes is not None and self._version == version:
+                return self._nodes, self._ancestors
+        nodes = {unit_id: {'id': unit_id, 'name': name, 'parent_id': parent_id, 'children': []}
+                 for unit_id, name, parent_id in models.BusinessUnit.objects.values_list('id', 'name', 'parent_unit_id')}
+        for node in nodes.values():
+            parent = nodes.get(node['parent_id'])
+            if parent is not None:
+                parent['children'].append(node['id'])
+        ancestors = _ancestor_chains({unit_id: node['parent_id'] for unit_id, node in nodes.items()})
+        with self._lock:
+            self._nodes, self._ancestors, self._version = nodes, ancestors, version
+        return nodes, ancestors
+
+    def nodes(self):
+        return self._load()[0]
+
+    def ancestors(self):
+        """业务线 id -> [自身, 上级, 上上级, ...]"""
+        return self._load()[1]
+
+    def descendant_ids(self, unit_id, include_self=True):
+        nodes = self.nodes()
+        if unit_id not in nodes:
+            return []
+        result, stack = [], [unit_id]
+        while stack:
+            current = stack.pop()
+            result.append(current)
+            stack.extend(nodes[current]['children'])
+        return result if include_self else result[1:]
+
+    def tree(self, root_id=None):
+        """嵌套结构的业务线树，root_id 为空时返回所有顶级业务线"""
+        nodes = self.nodes()
+
+        def build(unit_id):
+            node = nodes[unit_id]
+            return {'id': unit_id, 'name': node['name'], 'children': [build(child) for child in node['children']]}
+        if root_id is not None:
+            return [build(root_id)] if root_id in nodes else []
+        return [build(unit_id) for unit_id, node in nodes.items() if node['parent_id'] not in nodes]
+
+    def invalidate(self):
+        with self._lock:
+            self._nodes = self._ancestors = None
+        # 通知其他进程
+        asset_cache.get_cache().set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+tree_cache = TreeCache()
+
+
+# ---- 信号 ----
+
+def _check_parent(sender, instance, raw=False, **kwargs):
+    """表单在 BusinessUnit.clean() 中已经检查过，这里拦住不经过表单的保存"""
+    if not raw:
+        instance.clean()
+
+
+def _on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        # loaddata 导入时上下级的顺序不确定，导入后调用 rebuild_closure 重建
+        return
+    if created:
+        insert_node(instance)
+    else:
+        current = models.BusinessUnitClosure.objects.filter(descendant_id=instance.pk, depth=1).values_list(
+            'ancestor_id', flat=True).first()
+        if current != instance.parent_unit_id:
+            move_node(instance)
+    tree_cache.invalidate()
+    transaction.on_commit(tree_cache.invalidate)
+
+
+def _on_pre_delete(sender, instance, **kwargs):
+    """下级业务线的 parent_unit 会被数据库置空成为顶级业务线，先断开它们与被删业务线的上级的关系"""
+    subtree_ids = list(models.BusinessUnitClosure.objects.filter(ancestor_id=instance.pk, depth__gt=0)
+                       .values_list('descendant_id', flat=True))
+    if subtree_ids:
+        models.BusinessUnitClosure.objects.filter(descendant_id__in=subtree_ids).exclude(
+            ancestor_id__in=subtree_ids).delete()
+
+
+def _on_delete(sender, instance, **kwargs):
+    tree_cache.invalidate()
+    transaction.on_commit(tree_cache.invalidate)
+
+
+def connect_signals():
+    pre_save.connect(_check_parent, sender=models.BusinessUnit, dispatch_uid='bu_tree_check_parent')
+    post_save.connect(_on_save, sender=models.BusinessUnit, dispatch_uid='bu_tree_save')
+    pre_delete.connect(_on_pre_delete, sender=models.BusinessUnit, dispatch_uid='bu_tree_pre_delete')
+    post_delete.connect(_on_delete, sender=models.BusinessUnit, dispatch_uid='bu_tree_delete')
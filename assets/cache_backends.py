@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+统计淘汰次数的缓存后端，供 asset_cache 使用。
+
+LRUCache：进程内的 LocMemCache，写满时只淘汰最久未使用的那一条（LocMemCache 默认一次淘汰 1/CULL_FREQUENCY）。
+FileCache：FileBasedCache，同一台机器上的多个进程共享，写满时按 CULL_FREQUENCY 随机删除一部分文件。
+"""
+
+import threading
+from collections import Counter
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# 缓存位置 -> 本进程中淘汰的条数
+_evictions = Counter()
+_lock = threading.Lock()
+
+
+def evictions(location):
+    with _lock:
+        return _evictions[location]
+
+
+def _count(location, removed):
+    if removed:
+        with _lock:
+            _evictions[location] += removed
+
+
+class LRUCache(LocMemCache):
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.location = name
+
+    def _cull(self):
+        # 调用时已持有锁，并且缓存已满：淘汰最久未使用的条目，留出一条的位置
+        removed = 0
+        while self._cache and len(self._cache) >= self._max_entries:
+            key, _ = self._cache.popitem()
+            del self._expire_info[key]
+            removed += 1
+        _count(self.location, removed)
+
+
+class FileCache(FileBasedCache):
+
+    def __init__(self, directory, params):
+        super().__init__(directory, params)
+        self.location = directory
+
+    def _cull(self):
+        before = len(self._list_cache_files())
+        super()._cull()
+        _count(self.location, before - len(self._list_cache_files()))
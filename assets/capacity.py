@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+容量汇总：按机房、业务线（包含所有下级业务线）和全局统计各状态的资产数、CPU 核数、内存、硬盘。
+
+AssetCapacity 保存每台资产的贡献，CapacityRollup 保存汇总结果。
+资产或组件变化后，在事务提交时重新计算这些资产的贡献，把新旧贡献之差累加到相关的汇总行上；
+rebuild 用 INSERT ... SELECT 和 GROUP BY 在数据库里整体重算，用于初始化和纠正偏差。
+汇总接口只读取汇总表，耗时与资产数量无关。
+"""
+
+from collections import defaultdict
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, IntegerField, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from . import bu_tree
+from . import models
+from . import signals
+from .export import component_total
+
+SCOPES = ('idc', 'business_unit', 'all')
+METRICS = ('asset_count', 'cpu_cores', 'ram_mb', 'disk_gb')
+CONTRIBUTION_FIELDS = ('asset_id', 'idc_id', 'business_unit_id', 'status', 'cpu_cores', 'ram_mb', 'disk_gb')
+# SQLite 单条语句的参数个数有限，按资产 id 分批查询
+ID_BATCH = 500
+
+
+def contribution_queryset():
+    """每台资产的贡献，一条 SQL；字段顺序与 CONTRIBUTION_FIELDS 一致"""
+    return models.Asset.objects.order_by().annotate(
+        cpu_cores=Coalesce(F('cpu__cpu_core_count'), 0),
+        ram_mb=component_total(models.RAM, Sum('capacity'), IntegerField()),
+        disk_gb=component_total(models.Disk, Sum('capacity'), FloatField()),
+    ).values_list('id', 'idc_id', 'business_unit_id', 'status', 'cpu_cores', 'ram_mb', 'disk_gb')
+
+
+def contributions_from_rows(rows):
+    """由 assets_changed 信号带来的行计算贡献，与 contribution_queryset 的结果一致，不需要查询"""
+    result = {}
+    for asset_id, entry in rows.items():
+        asset, cpu = entry['asset'], entry.get('cpu')
+        result[asset_id] = (
+            asset_id, asset.idc_id, asset.business_unit_id, asset.status,
+            (cpu.cpu_core_count or 0) if cpu is not None else 0,
+            sum(ram.capacity for ram in entry.get('ram', ()) if ram.capacity is not None),
+            sum(disk.capacity for disk in entry.get('disk', ()) if disk.capacity is not None),
+        )
+    return result
+
+
+def rollup_keys(idc_id, business_unit_id, status, ancestors):
+    yield 'all', 0, status
+    yield 'idc', idc_id or 0, status
+    for unit_id in ancestors.get(business_unit_id, [0]):
+        yield 'business_unit', unit_id, status
+
+
+def _add(deltas, contribution, ancestors, sign):
+    _, idc_id, business_unit_id, status, cpu_cores, ram_mb, disk_gb = contribution
+    for key in rollup_keys(idc_id, business_unit_id, status, ancestors):
+        delta = deltas[key]
+        delta[0] += sign
+        delta[1] += sign * cpu_cores
+        delta[2] += sign * ram_mb
+        delta[3] += sign * disk_gb
+
+
+def apply_deltas(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    models.CapacityRollup.objects.bulk_create(
+        [models.CapacityRollup(scope=scope, scope_id=scope_id, status=status) for scope, scope_id, status in deltas],
+        ignore_conflicts=True)
+    now = timezone.now()
+    for (scope, scope_id, status), delta in deltas.items():
+        # 用 F 表达式在数据库中累加，多个进程同时更新同一行也不会互相覆盖
+        models.CapacityRollup.objects.filter(scope=scope, scope_id=scope_id, status=status).update(
+            m_time=now, **{metric: F(metric) + value for metric, value in zip(METRICS, delta)})
+
+
+def refresh(asset_ids, contributions=None):
+    """
+    重新计算这些资产的贡献，并把变化量累加到汇总表。
+    contributions 为调用方已经算好的当前贡献（见 contributions_from_rows），给出时不再从数据库读取。
+    """
+    asset_ids = sorted(asset_ids)
+    with transaction.atomic():
+        current, previous = dict(contributions or {}), {}
+        for start in range(0, len(asset_ids), ID_BATCH):
+            batch = asset_ids[start:start + ID_BATCH]
+            if contributions is None:
+                current.update((row[0], row) for row in contribution_queryset().filter(id__in=batch))
+            previous.update((row[0], row) for row in models.AssetCapacity.objects.filter(asset_id__in=batch)
+                            .values_list(*CONTRIBUTION_FIELDS))
+        # 业务线的上级从闭包表读取，与汇总的修改在同一个事务中；进程内的业务线树缓存可能落后于其他进程的移动
+        ancestors = bu_tree.ancestors_of(contribution[2] for contribution in
+                                         list(current.values()) + list(previous.values()) if contribution[2])
+        deltas = defaultdict(lambda: [0, 0, 0, 0.0])
+        for asset_id in asset_ids:
+            if previous.get(asset_id) == current.get(asset_id):
+                continue
+            if asset_id in previous:
+                _add(deltas, previous[asset_id], ancestors, -1)
+            if asset_id in current:
+                _add(deltas, current[asset_id], ancestors, 1)
+        changed = [asset_id for asset_id in asset_ids if previous.get(asset_id) != current.get(asset_id)]
+        for start in range(0, len(changed), ID_BATCH):
+            models.AssetCapacity.objects.filter(asset_id__in=changed[start:start + ID_BATCH]).delete()
+        models.AssetCapacity.objects.bulk_create([
+            models.AssetCapacity(**dict(zip(CONTRIBUTION_FIELDS, current[asset_id])))
+            for asset_id in changed if asset_id in current
+        ])
+        apply_deltas(deltas)
+
+
+def schedule_refresh(asset_ids):
+    signals.defer_until_commit(refresh, asset_ids)
+
+
+def rebuild_rollups(scopes=SCOPES):
+    """由 AssetCapacity 整体重算汇总表，GROUP BY 在数据库中完成"""
+    with transaction.atomic():
+        models.CapacityRollup.objects.filter(scope__in=scopes).delete()
+        contributions = models.AssetCapacity.objects.order_by()
+        totals = dict(asset_count=Count('asset_id'), cpu_cores=Sum('cpu_cores'), ram_mb=Sum('ram_mb'),
+                      disk_gb=Sum('disk_gb'))
+        ancestors = bu_tree.ancestors_of() if 'business_unit' in scopes else {}
+        rows = defaultdict(lambda: [0, 0, 0, 0.0])
+        for scope, group_by in (('all', None), ('idc', 'idc_id'), ('business_unit', 'business_unit_id')):
+            if scope not in scopes:
+                continue
+            fields = ['status', group_by] if group_by else ['status']
+            for row in contributions.values(*fields).annotate(**totals):
+                scope_ids = [row[group_by] or 0] if group_by else [0]
+                if scope == 'business_unit' and row[group_by]:
+                    # 下级业务线的数据同时计入所有上级
+                    scope_ids = ancestors.get(row[group_by], [row[group_by]])
+                for scope_id in scope_ids:
+                    total = rows[(scope, scope_id, row['status'])]
+                    for i, metric in enumerate(METRICS):
+                        total[i] += row[metric] or 0
+        models.CapacityRollup.objects.bulk_create([
+            models.CapacityRollup(scope=scope, scope_id=scope_id, status=status, **dict(zip(METRICS, total)))
+            for (scope, scope_id, status), total in rows.items()
+        ])
+
+
+def rebuild():
+    """从资产和组件表整体重算每台资产的贡献，再重算汇总表"""
+    sql, params = contribution_queryset().query.sql_with_params()
+    with transaction.atomic():
+        models.AssetCapacity.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO %s (%s) %s' % (
+                models.AssetCapacity._meta.db_table, ', '.join(CONTRIBUTION_FIELDS), sql), params)
+        rebuild_rollups()
+
+
+def summary(scope, scope_id=None):
+    """
+    读取汇总结果：{scope_id: {asset_count, cpu_cores, ram_mb, disk_gb, by_status: {状态: {...}}}}
+    只读汇总表中属于该范围的行，与资产数量无关。
+    """
+    rows = models.CapacityRollup.objects.filter(scope=scope)
+    if scope_id is not None:
+        rows = rows.filter(scope_id=scope_id)
+    status_names = dict(models.Asset.asset_status)
+    result = {}
+    for row in rows.values('scope_id', 'status', *METRICS):
+        entry = result.setdefault(row['scope_id'], dict({metric: 0 for metric in METRICS}, by_status={}))
+        for metric in METRICS:
+            entry[metric] += row[metric]
+        entry['by_status'][status_names.get(row['status'], row['status'])] = {metric: row[metric] for metric in METRICS}
+    return result
+
+
+# ---- 增量更新 ----
+
+def _on_asset_change(sender, instance, **kwargs):
+    schedule_refresh([instance.pk])
+
+
+def _on_component_change(sender, instance, **kwargs):
+    schedule_refresh([instance.asset_id])
+
+
+def _on_assets_changed(sender, asset_ids, rows=None, **kwargs):
+    rows = signals.committed_rows(rows, refresh, asset_ids)
+    if rows is None:
+        schedule_refresh(asset_ids)
+    else:
+        refresh(asset_ids, contributions_from_rows(rows))
+
+
+def _on_owner_delete(sender, instance, field, scope, **kwargs):
+    """
+    机房 / 业务线删除时，资产上的外键由数据库置空，不会触发资产的信号，
+    这里同步修改 AssetCapacity 并重算对应范围的汇总。
+    """
+    def clear():
+        models.AssetCapacity.objects.filter(**{field: instance.pk}).update(**{field: None})
+        rebuild_rollups([scope])
+    transaction.on_commit(clear)
+
+
+def _on_business_unit_save(sender, instance, **kwargs):
+    # 业务线的上下级关系可能变化，业务线的数量很少，直接按新的层级重算
+    transaction.on_commit(partial(rebuild_rollups, ['business_unit']))
+
+
+def connect_signals():
+    post_save.connect(_on_asset_change, sender=models.Asset, dispatch_uid='capacity_asset_save')
+    post_delete.connect(_on_asset_change, sender=models.Asset, dispatch_uid='capacity_asset_delete')
+    for model in (models.CPU, models.RAM, models.Disk):
+        post_save.connect(_on_component_change, sender=model, dispatch_uid='capacity_%s_save' % model.__name__)
+        post_delete.connect(_on_component_change, sender=model, dispatch_uid='capacity_%s_delete' % model.__name__)
+    signals.assets_changed.connect(_on_assets_changed, dispatch_uid='capacity_assets_changed')
+    post_delete.connect(partial(_on_owner_delete, field='idc_id', scope='idc'), sender=models.IDC, weak=False,
+                        dispatch_uid='capacity_idc_delete')
+    post_delete.connect(partial(_on_owner_delete, field='business_unit_id', scope='business_unit'),
+                        sender=models.BusinessUnit, weak=False, dispatch_uid='capacity_business_unit_delete')
+    post_save.connect(_on_business_unit_save, sender=models.BusinessUnit, dispatch_uid='capacity_business_unit_save')
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+IP、MAC、序列号冲突检测。
+
+AddressEntry 把所有带地址的字段规范化后集中到一张表中，(kind, value, group_id, asset_id) 上的索引相当于
+一份按值散列的地址索引：
+  ip   Asset.manage_ip、NIC.ip_address、NetworkDevice.vlan_ip / intranet_ip
+  mac  NIC.mac（小写，去掉 : - . 分隔符）
+  sn   Asset.sn、Disk.sn（内存条的序列号在不同厂商之间经常重复，不参与检测）
+虚拟机与宿主机属于同一组（group_id 为宿主机的资产 id）：虚拟机和宿主机、同一宿主机上的虚拟机之间共用的值是正常的，
+同一个值出现在两组以上时才记为冲突，保存在 AddressConflict 中。
+
+资产或组件变化的事务提交后（包括汇报入库的 assets_changed 信号），按资产 id 重新生成地址行，
+只写入有变化的行，再对涉及的值在索引上重新计数；接口直接读取冲突表。
+rebuild 用 INSERT ... SELECT 在数据库中整体重建地址索引，scan 在索引上做一遍全量分组统计，
+用 MIN(group_id) <> MAX(group_id) 代替 COUNT(DISTINCT)，顺序读一遍索引即可完成，用于初始化和纠正偏差。
+IGNORE 中的占位值（全零 MAC、回环地址等）不进入索引，修改后需要重建。
+"""
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import CharField, Count, F, Max, Min, Value
+from django.db.models.functions import Coalesce, Lower, Replace, Trim
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from . import models
+from . import signals
+
+DEFAULTS = {
+    # 不参与检测的占位值（规范化之后的形式）
+    'IGNORE': {
+        'ip': ['0.0.0.0', '127.0.0.1', '::1', '::'],
+        'mac': ['000000000000', 'ffffffffffff'],
+        'sn': ['unknown', 'none', 'n/a', 'na', '0', 'default string', 'to be filled by o.e.m.',
+               'not specified', 'system serial number'],
+    },
+}
+
+KINDS = ('ip', 'mac', 'sn')
+# (类型, 来源, 模型, 资产 id 字段, 地址字段)
+SOURCES = (
+    ('ip', 'asset.manage_ip', models.Asset, 'id', 'manage_ip'),
+    ('ip', 'nic.ip_address', models.NIC, 'asset_id', 'ip_address'),
+    ('ip', 'networkdevice.vlan_ip', models.NetworkDevice, 'asset_id', 'vlan_ip'),
+    ('ip', 'networkdevice.intranet_ip', models.NetworkDevice, 'asset_id', 'intranet_ip'),
+    ('mac', 'nic.mac', models.NIC, 'asset_id', 'mac'),
+    ('sn', 'asset.sn', models.Asset, 'id', 'sn'),
+    ('sn', 'disk.sn', models.Disk, 'asset_id', 'sn'),
+)
+ENTRY_FIELDS = ('asset_id', 'kind', 'value', 'group_id', 'source')
+# SQLite 单条语句的参数个数有限，按 id / 值分批查询
+ID_BATCH = 500
+# 各来源合成一条查询时，每个来源都带一份 id 列表
+UNION_BATCH = 100
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ASSET_CONFLICTS', {}))
+    return config
+
+
+def _normalized(kind, field):
+    # 以文本比较，避免 IP 字段把 '' 之类的比较值转换成 NULL
+    value = Lower(Trim(field), output_field=CharField())
+    if kind == 'mac':
+        for separator in (':', '-', '.'):
+            value = Replace(value, Value(separator), Value(''))
+    return value
+
+
+def source_queryset(kind, source, model, asset_field, field):
+    """一个来源的地址行，字段顺序与 ENTRY_FIELDS 一致；一条 SQL，在数据库中完成规范化"""
+    host = 'server__hosted_on__asset_id' if model is models.Asset else 'asset__server__hosted_on__asset_id'
+    return model.objects.order_by().filter(**{'%s__isnull' % field: False}).annotate(
+        address_kind=Value(kind, output_field=CharField()),
+        address_value=_normalized(kind, field),
+        address_group=Coalesce(F(host), F(asset_field)),
+        address_source=Value(source, output_field=CharField()),
+    ).exclude(address_value__in=[''] + list(get_config()['IGNORE'].get(kind, ()))).values_list(
+        asset_field, 'address_kind', 'address_value', 'address_group', 'address_source')
+
+
+def asset_sources(asset_ids):
+    """这些资产在所有来源中的地址行，各来源用 UNION ALL 合成一条查询"""
+    querysets = [source_queryset(*spec).filter(**{'%s__in' % spec[3]: asset_ids}) for spec in SOURCES]
+    return querysets[0].union(*querysets[1:], all=True)
+
+
+def rebuild():
+    """在数据库中整体重建地址索引，再全量统计冲突；返回 scan() 的结果"""
+    with transaction.atomic():
+        models.AddressEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            for spec in SOURCES:
+                sql, params = source_queryset(*spec).query.sql_with_params()
+                cursor.execute('INSERT INTO %s (%s) %s' % (
+                    models.AddressEntry._meta.db_table, ', '.join(ENTRY_FIELDS), sql), params)
+    return scan()
+
+
+def _conflicting(entries):
+    """出现在两组以上的 (kind, value)，按 (kind, value) 分组顺序读索引，不需要对组去重"""
+    candidates = entries.order_by().values_list('kind', 'value').annotate(
+        low=Min('group_id'), high=Max('group_id')).filter(high__gt=F('low'))
+    return [(kind, value) for kind, value, _, _ in candidates]
+
+
+def _counts(keys):
+    """这些值中仍然冲突的：{(kind, value): (组数, 资产数)}"""
+    counts = {}
+    by_kind = {}
+    for kind, value in keys:
+        by_kind.setdefault(kind, []).append(value)
+    for kind, values in by_kind.items():
+        for start in range(0, len(values), ID_BATCH):
+            rows = models.AddressEntry.objects.order_by().filter(kind=kind, value__in=values[start:start + ID_BATCH]) \
+                .values_list('value').annotate(groups=Count('group_id', distinct=True),
+                                               assets=Count('asset_id', distinct=True))
+            counts.update(((kind, value), (groups, assets)) for value, groups, assets in rows if groups > 1)
+    return counts
+
+
+def _save_conflicts(keys, counts):
+    """keys 范围内的冲突表与 counts 保持一致，返回 (新增, 解除) 的条数"""
+    now = timezone.now()
+    existing = {}
+    by_kind = {}
+    for kind, value in keys:
+        by_kind.setdefault(kind, []).append(value)
+    for kind, values in by_kind.items():
+        for start in range(0, len(values), ID_BATCH):
+            existing.update(((conflict.kind, conflict.value), conflict) for conflict in
+                            models.AddressConflict.objects.filter(kind=kind, value__in=values[start:start + ID_BATCH]))
+    resolved = [conflict.id for key, conflict in existing.items() if key not in counts]
+    for start in range(0, len(resolved), ID_BATCH):
+        models.AddressConflict.objects.filter(id__in=resolved[start:start + ID_BATCH]).delete()
+    created, updated = [], []
+    for (kind, value), (groups, assets) in counts.items():
+        conflict = existing.get((kind, value))
+        if conflict is None:
+            created.append(models.AddressConflict(kind=kind, value=value, group_count=groups, asset_count=assets,
+                                                  first_seen=now, m_time=now))
+        elif (conflict.group_count, conflict.asset_count) != (groups, assets):
+            conflict.group_count, conflict.asset_count, conflict.m_time = groups, assets, now
+            updated.append(conflict)
+    models.AddressConflict.objects.bulk_create(created, batch_size=ID_BATCH)
+    models.AddressConflict.objects.bulk_update(updated, ['group_count', 'asset_count', 'm_time'], batch_size=100)
+    return len(created), len(resolved)
+
+
+def scan():
+    """
+    在地址索引上全量统计冲突并同步冲突表，已有冲突的 first_seen 保持不变。
+    返回 {conflicts: {类型: 条数}, new: 新增, resolved: 解除}。
+    """
+    with transaction.atomic():
+        keys = _conflicting(models.AddressEntry.objects.all())
+        counts = _counts(keys)
+        stale = set(models.AddressConflict.objects.values_list('kind', 'value')) - set(counts)
+        new, resolved = _save_conflicts(set(counts) | stale, counts)
+    totals = dict.fromkeys(KINDS, 0)
+    for kind, _ in counts:
+        totals[kind] += 1
+    return {'conflicts': totals, 'new': new, 'resolved': resolved}
+
+
+def refresh(asset_ids):
+    """重新生成这些资产的地址行，只写入变化的部分，再对涉及的值重新计数"""
+    asset_ids = sorted(asset_ids)
+    touched = set()
+    with transaction.atomic():
+        for start in range(0, len(asset_ids), ID_BATCH):
+            batch = asset_ids[start:start + ID_BATCH]
+            old = {tuple(row[1:]): row[0] for row in models.AddressEntry.objects.filter(asset_id__in=batch)
+                   .values_list('id', *ENTRY_FIELDS)}
+            new = set()
+            for start_union in range(0, len(batch), UNION_BATCH):
+                new.update(asset_sources(batch[start_union:start_union + UNION_BATCH]))
+            removed = [entry_id for row, entry_id in old.items() if row not in new]
+            for start_id in range(0, len(removed), ID_BATCH):
+                models.AddressEntry.objects.filter(id__in=removed[start_id:start_id + ID_BATCH]).delete()
+            models.AddressEntry.objects.bulk_create([
+                models.AddressEntry(**dict(zip(ENTRY_FIELDS, row))) for row in new if row not in old
+            ], batch_size=ID_BATCH)
+            touched.update((row[1], row[2]) for row in new.symmetric_difference(old))
+        if touched:
+            _save_conflicts(touched, _counts(touched))
+    return len(touched)
+
+
+def schedule_refresh(asset_ids):
+    signals.defer_until_commit(refresh, asset_ids)
+
+
+def conflicts(kind=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    冲突列表，涉及资产最多的在前；每条附上持有该值的资产（名称、来源字段、所属的宿主机组）。
+    返回 (总条数, 列表)。
+    """
+    queryset = models.AddressConflict.objects.all()
+    if kind is not None:
+        queryset = queryset.filter(kind=kind)
+    rows = list(queryset.order_by('-group_count', 'kind', 'value')
+                .values('kind', 'value', 'group_count', 'asset_count', 'first_seen')[:limit])
+    holders = {}
+    for kind_name in {row['kind'] for row in rows}:
+        values = [row['value'] for row in rows if row['kind'] == kind_name]
+        for asset_id, value, group_id, source in models.AddressEntry.objects.filter(kind=kind_name, value__in=values) \
+                .order_by('asset_id', 'source').values_list('asset_id', 'value', 'group_id', 'source'):
+            assets = holders.setdefault((kind_name, value), {})
+            entry = assets.setdefault(asset_id, {'asset_id': asset_id, 'group_id': group_id, 'sources': []})
+            entry['sources'].append(source)
+    asset_ids = {asset_id for assets in holders.values() for asset_id in assets}
+    names = dict(models.Asset.objects.filter(id__in=asset_ids).values_list('id', 'name')) if asset_ids else {}
+    for row in rows:
+        row['assets'] = list(holders.get((row['kind'], row['value']), {}).values())
+        for entry in row['assets']:
+            entry['name'] = names.get(entry['asset_id'])
+    return queryset.count(), rows
+
+
+# ---- 增量更新 ----
+
+def _on_asset_change(sender, instance, **kwargs):
+    schedule_refresh([instance.pk])
+
+
+def _on_component_change(sender, instance, **kwargs):
+    # 虚拟机的 Server 行保存或删除时，它所属的组随之变化
+    schedule_refresh([instance.asset_id])
+
+
+def _on_assets_changed(sender, asset_ids, **kwargs):
+    schedule_refresh(asset_ids)
+
+
+def connect_signals():
+    post_save.connect(_on_asset_change, sender=models.Asset, dispatch_uid='conflicts_asset_save')
+    post_delete.connect(_on_asset_change, sender=models.Asset, dispatch_uid='conflicts_asset_delete')
+    for model in (models.NIC, models.Disk, models.NetworkDevice, models.Server):
+        post_save.connect(_on_component_change, sender=model, dispatch_uid='conflicts_%s_save' % model.__name__)
+        post_delete.connect(_on_component_change, sender=model, dispatch_uid='conflicts_%s_delete' % model.__name__)
+    signals.assets_changed.connect(_on_assets_changed, dispatch_uid='conflicts_assets_changed')
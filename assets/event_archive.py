@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+EventLog 的保留策略与归档。
+
+超过保留期的事件按月分区，追加写入归档目录下的 events-YYYY-MM.jsonl.gz；
+每批事件压缩成一个独立的 gzip 成员追加到文件末尾（多个成员首尾相接仍是合法的 gzip 文件），
+已经写入的内容不再改动。归档目录下的 index.sqlite3 记录每个成员所在的文件、偏移、长度、
+时间范围和涉及的资产，按资产和时间范围查询时只解压命中的成员，不需要把数据导回数据库。
+
+每批的步骤：写入归档文件并 fsync -> 索引中登记为 written -> 在业务库中删除这批事件 -> 索引中标记为 done。
+任何一步中断后重新运行：文件末尾未登记的内容会被截掉，written 状态的成员会重新执行删除，
+因此事件既不会丢失，也不会在归档中重复。
+"""
+
+import datetime
+import gzip
+import json
+import os
+import sqlite3
+import zlib
+from contextlib import closing
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import models
+from . import signals
+
+DEFAULTS = {
+    'DIR': os.path.join(settings.BASE_DIR, 'event_archive'),
+    # 业务库中保留最近多少天的事件
+    'RETENTION_DAYS': 180,
+    # 归档文件保留多少个月，None 表示永久保留
+    'ARCHIVE_KEEP_MONTHS': None,
+    'CHUNK_SIZE': 5000,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    min_date TEXT NOT NULL,
+    max_date TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'written'
+);
+CREATE INDEX IF NOT EXISTS members_file ON members (file, offset);
+CREATE INDEX IF NOT EXISTS members_date ON members (max_date, min_date);
+CREATE TABLE IF NOT EXISTS member_assets (
+    member_id INTEGER NOT NULL,
+    asset_id INTEGER NOT NULL,
+    PRIMARY KEY (asset_id, member_id)
+) WITHOUT ROWID;
+"""
+
+FIELDS = ('id', 'name', 'asset_id', 'new_asset_id', 'event_type', 'component', 'detail', 'date', 'user_id', 'memo')
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'EVENT_ARCHIVE', {}))
+    return config
+
+
+def _date_text(value):
+    """索引中的时间统一保存为 UTC 的 ISO 格式字符串，可以直接按字符串比较"""
+    return value.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+
+class EventArchive(object):
+
+    def __init__(self, directory=None, config=None):
+        self.config = config or get_config()
+        self.directory = directory or self.config['DIR']
+        os.makedirs(self.directory, exist_ok=True)
+        self.index = sqlite3.connect(os.path.join(self.directory, 'index.sqlite3'), isolation_level=None)
+        self.index.executescript(SCHEMA)
+
+    def close(self):
+        self.index.close()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    # ---- 写入 ----
+
+    def recover(self):
+        """处理上次中断留下的状态：截掉未登记的文件尾部，补完 written 状态成员的删除"""
+        for name in os.listdir(self.directory):
+            if not name.endswith('.jsonl.gz'):
+                continue
+            end = self.index.execute('SELECT COALESCE(MAX(offset + length), 0) FROM members WHERE file = ?',
+                                     (name,)).fetchone()[0]
+            if os.path.getsize(self.path(name)) > end:
+                with open(self.path(name), 'r+b') as f:
+                    f.truncate(end)
+        for member_id, name, offset, length in self.index.execute(
+                "SELECT id, file, offset, length FROM members WHERE state = 'written'").fetchall():
+            ids = [event['id'] for event in self._read_member(name, offset, length)]
+            self._delete_events(member_id, ids)
+
+    def _delete_events(self, member_id, ids):
+        with transaction.atomic():
+            asset_ids = set()
+            for start in range(0, len(ids), 500):
+                events = models.EventLog.objects.filter(id__in=ids[start:start + 500])
+                asset_ids.update(events.exclude(asset_id=None).values_list('asset_id', flat=True))
+                events.delete()
+            if asset_ids:
+                signals.events_changed.send(sender=models.EventLog, asset_ids=asset_ids)
+        self.index.execute("UPDATE members SET state = 'done' WHERE id = ?", (member_id,))
+
+    def _append(self, name, events):
+        """把一批事件压缩成一个 gzip 成员追加到归档文件，返回索引中的成员 id"""
+        # 时间保留到微秒（DjangoJSONEncoder 只保留到毫秒）
+        lines = ''.join(json.dumps(dict(event, date=event['date'].isoformat()), ensure_ascii=False) + '\n'
+                        for event in events)
+        data = gzip.compress(lines.encode('utf-8'))
+        with open(self.path(name), 'ab') as f:
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        dates = [_date_text(event['date']) for event in events]
+        self.index.execute('BEGIN IMMEDIATE')
+        try:
+            member_id = self.index.execute(
+                'INSERT INTO members (file, offset, length, count, min_date, max_date) VALUES (?, ?, ?, ?, ?, ?)',
+                (name, offset, len(data), len(events), min(dates), max(dates))).lastrowid
+            self.index.executemany('INSERT OR IGNORE INTO member_assets (member_id, asset_id) VALUES (?, ?)',
+                                   [(member_id, asset_id) for asset_id in
+                                    {event['asset_id'] for event in events if event['asset_id'] is not None}])
+            self.index.execute('COMMIT')
+        except Exception:
+            self.index.execute('ROLLBACK')
+            raise
+        return member_id
+
+    def archive(self, before, chunk_size=None, limit=None):
+        """
+        把 date < before 的事件分批移到归档文件中，返回移动的事件数。
+        limit 限制本次最多移动的事件数，便于在低峰期分多次执行。
+        """
+        chunk_size = chunk_size or self.config['CHUNK_SIZE']
+        self.recover()
+        moved = 0
+        while limit is None or moved < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - moved)
+            events = list(models.EventLog.objects.filter(date__lt=before).order_by('date', 'id')
+                          .values(*FIELDS)[:size])
+            if not events:
+                break
+            months = {}
+            for event in events:
+                months.setdefault(event['date'].astimezone(datetime.timezone.utc).strftime('%Y-%m'), []).append(event)
+            for month, month_events in sorted(months.items()):
+                member_id = self._append('events-%s.jsonl.gz' % month, month_events)
+                self._delete_events(member_id, [event['id'] for event in month_events])
+            moved += len(events)
+        return moved
+
+    def purge(self, keep_months=None):
+        """删除超过保留期的整月归档文件及其索引，返回删除的文件名"""
+        keep_months = keep_months if keep_months is not None else self.config['ARCHIVE_KEEP_MONTHS']
+        if keep_months is None:
+            return []
+        today = timezone.now().astimezone(datetime.timezone.utc)
+        month_index = today.year * 12 + today.month - 1 - keep_months
+        oldest = 'events-%04d-%02d.jsonl.gz' % (month_index // 12, month_index % 12 + 1)
+        removed = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.jsonl.gz') and name < oldest:
+                self.index.execute('BEGIN IMMEDIATE')
+                self.index.execute('DELETE FROM member_assets WHERE member_id IN (SELECT id FROM members WHERE file = ?)',
+                                   (name,))
+                self.index.execute('DELETE FROM members WHERE file = ?', (name,))
+                self.index.execute('COMMIT')
+                os.remove(self.path(name))
+                removed.append(name)
+        return removed
+
+    # ---- 查询 ----
+
+    def _read_member(self, name, offset, length):
+        with open(self.path(name), 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        # 每个成员是一个完整的 gzip 数据流
+        for line in zlib.decompress(data, 31).decode('utf-8').split('\n'):
+            if line:
+                yield json.loads(line)
+
+    def query(self, asset_id=None, start=None, end=None):
+        """
+        按资产和时间范围（start <= date < end）查询归档的事件，按时间顺序逐条返回。
+        先在索引中找到时间范围有交集、并且包含该资产的成员，只解压这些成员。
+        """
+        sql = 'SELECT m.file, m.offset, m.length FROM members m'
+        conditions, params = [], []
+        if asset_id is not None:
+            sql += ' JOIN member_assets a ON a.member_id = m.id'
+            conditions.append('a.asset_id = ?')
+            params.append(asset_id)
+        if start is not None:
+            conditions.append('m.max_date >= ?')
+            params.append(_date_text(start))
+        if end is not None:
+            conditions.append('m.min_date < ?')
+            params.append(_date_text(end))
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY m.min_date, m.id'
+        for name, offset, length in self.index.execute(sql, params).fetchall():
+            for event in self._read_member(name, offset, length):
+                if asset_id is not None and event['asset_id'] != asset_id:
+                    continue
+                date = parse_datetime(event['date'])
+                if (start is not None and date < start) or (end is not None and date >= end):
+                    continue
+                yield event
+
+    def stats(self):
+        with closing(self.index.cursor()) as cursor:
+            files, members, events = cursor.execute(
+                'SELECT COUNT(DISTINCT file), COUNT(*), COALESCE(SUM(count), 0) FROM members').fetchone()
+        size = sum(os.path.getsize(self.path(name)) for name in os.listdir(self.directory)
+                   if name.endswith('.jsonl.gz'))
+        return {'files': files, 'members': members, 'events': events, 'bytes': size}
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+批量记录 EventLog。
+
+EventRecorder 在处理一次汇报或审批的过程中收集事件，合并重复的事件，
+在事务提交之前用一条 bulk_create 写入，与业务数据同时提交或同时回滚，不会丢失也不会多出。
+不在事务中记录的事件（例如一次性的状态变更）可以交给后台写入线程：
+事件先追加到独立的 SQLite 日志文件（写入并 fsync 后才返回），再由后台线程成批写入 EventLog。
+多个 Web 进程共用同一个日志文件，各自的写入线程先在 BEGIN IMMEDIATE 事务中领取一批事件，
+同一条事件只会被一个进程写入 EventLog。
+进程崩溃后，它已领取但未写入的事件超过 CLAIM_TIMEOUT 后由其他写入线程重新领取补写；
+补写发生在“EventLog 已提交、日志尚未删除”之间崩溃的情况下可能重复一次，但不会丢失。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import models
+from . import signals
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKGROUND': False,
+    'JOURNAL_PATH': os.path.join(settings.BASE_DIR, 'event_journal.sqlite3'),
+    'FLUSH_INTERVAL': 1.0,
+    'BATCH_SIZE': 1000,
+    # 被领取后超过这个时间（秒）仍未删除的事件，视为领取它的进程已崩溃，可以被重新领取
+    'CLAIM_TIMEOUT': 300,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS event_journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    claimed_at REAL
+);
+"""
+
+# date 为 auto_now_add 字段，事件时间以写入 EventLog 的时间为准
+FIELDS = ('name', 'asset_id', 'new_asset_id', 'event_type', 'component', 'detail', 'user_id', 'memo')
+EVENT_NAME_LENGTH = models.EventLog._meta.get_field('name').max_length
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'EVENT_RECORDER', {}))
+    return config
+
+
+def event_name(subject, suffix):
+    """事件名称 '<subject>: <suffix>'，subject 过长时截断；MySQL / PostgreSQL 会拒绝超长的值，导致整批回滚"""
+    tail = ': %s' % suffix
+    return subject[:EVENT_NAME_LENGTH - len(tail)] + tail
+
+
+class EventRecorder(object):
+    """
+    收集一批事件。相同的事件（资产、类型、组件、内容都相同）只保存一条，并在备注中记下合并的次数。
+    mark() / rollback(mark) 用于撤销某台资产处理失败时已经记录的事件。
+    """
+
+    def __init__(self, user=None):
+        self.user = user
+        self._events = {}
+        self._log = []
+
+    def __len__(self):
+        return len(self._events)
+
+    def record(self, name, detail, asset=None, new_asset=None, event_type=0, component=None, user=None, memo=None):
+        asset_id = asset.pk if isinstance(asset, models.Asset) else asset
+        new_asset_id = new_asset.pk if isinstance(new_asset, models.NewAssetApprovalZone) else new_asset
+        user = user or self.user
+        user_id = user.pk if user is not None else None
+        key = (name, asset_id, new_asset_id, event_type, component, detail, user_id, memo)
+        entry = self._events.get(key)
+        if entry is None:
+            self._events[key] = [models.EventLog(
+                name=name, asset_id=asset_id, new_asset_id=new_asset_id, event_type=event_type,
+                component=component, detail=detail, user_id=user_id, memo=memo), 1]
+        else:
+            entry[1] += 1
+        self._log.append(key)
+
+    def mark(self):
+        return len(self._log)
+
+    def rollback(self, mark):
+        for key in self._log[mark:]:
+            entry = self._events[key]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._events[key]
+        del self._log[mark:]
+
+    def events(self):
+        result = []
+        for event, count in self._events.values():
+            if count > 1:
+                event.memo = '%s（合并了 %d 条相同的事件）' % (event.memo or '', count)
+            result.append(event)
+        return result
+
+    def flush(self):
+        """
+        写出收集到的事件并清空，返回写出的条数。
+        在事务中时直接 bulk_create，随事务一起提交；不在事务中并且开启了后台写入时，交给后台写入线程。
+        """
+        events = self.events()
+        self._events, self._log = {}, []
+        if not events:
+            return 0
+        if connection.in_atomic_block or not get_config()['BACKGROUND']:
+            models.EventLog.objects.bulk_create(events)
+            _events_changed(events)
+        else:
+            background_writer().submit(events)
+        return len(events)
+
+
+def _events_changed(events):
+    asset_ids = {event.asset_id for event in events if event.asset_id is not None}
+    if asset_ids:
+        signals.events_changed.send(sender=models.EventLog, asset_ids=asset_ids)
+
+
+@contextmanager
+def recording(user=None):
+    """
+    with recording() as recorder: 在一个事务中执行并记录事件，事务结束前一次写入。
+    块内抛出异常时事务回滚，事件也不会写入。
+    """
+    recorder = EventRecorder(user)
+    with transaction.atomic():
+        yield recorder
+        recorder.flush()
+
+
+class EventJournal(object):
+    """后台写入前的持久化日志，与业务库分开的 SQLite 文件"""
+
+    def __init__(self, path=None, claim_timeout=None):
+        config = get_config()
+        self.path = path or config['JOURNAL_PATH']
+        self.claim_timeout = claim_timeout if claim_timeout is not None else config['CLAIM_TIMEOUT']
+        self._conn = None
+        self._pid = None
+        # 请求线程和后台线程共用一个连接
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self):
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            # 每次写入都 fsync，append 返回后事件即已落盘
+            self._conn.execute('PRAGMA synchronous=FULL')
+            self._conn.executescript(SCHEMA)
+            # 旧版本创建的日志文件没有 claimed_at 列
+            columns = [row[1] for row in self._conn.execute('PRAGMA table_info(event_journal)')]
+            if 'claimed_at' not in columns:
+                self._conn.execute('ALTER TABLE event_journal ADD COLUMN claimed_at REAL')
+            self._pid = os.getpid()
+        return self._conn
+
+    def append(self, events):
+        rows = [(json.dumps({field: getattr(event, field) for field in FIELDS}),) for event in events]
+        with self._lock:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT INTO event_journal (payload) VALUES (?)', rows)
+            conn.execute('COMMIT')
+
+    def claim(self, limit):
+        """
+        领取最多 limit 条未被领取（或领取已超时）的事件，返回 [(id, payload), ...]。
+        BEGIN IMMEDIATE 保证多个进程不会领到同一条事件。
+        """
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    'SELECT id, payload FROM event_journal WHERE claimed_at IS NULL OR claimed_at < ? '
+                    'ORDER BY id LIMIT ?', (now - self.claim_timeout, limit)).fetchall()
+                conn.executemany('UPDATE event_journal SET claimed_at = ? WHERE id = ?',
+                                 [(now, row[0]) for row in rows])
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        return rows
+
+    def delete(self, ids):
+        """已写入 EventLog，删除"""
+        with self._lock:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('DELETE FROM event_journal WHERE id = ?', [(i,) for i in ids])
+            conn.execute('COMMIT')
+
+    def release(self, ids):
+        """写入 EventLog 失败，放回日志等待下一轮"""
+        with self._lock:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('UPDATE event_journal SET claimed_at = NULL WHERE id = ?', [(i,) for i in ids])
+            conn.execute('COMMIT')
+
+    def depth(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM event_journal').fetchone()[0]
+
+
+def drain(journal, batch_size):
+    """把日志中的事件成批领取并写入 EventLog，返回写入的条数"""
+    total = 0
+    while True:
+        rows = journal.claim(batch_size)
+        if not rows:
+            return total
+        ids = [row[0] for row in rows]
+        events = [models.EventLog(**json.loads(payload)) for _, payload in rows]
+        try:
+            with transaction.atomic():
+                models.EventLog.objects.bulk_create(events)
+                _events_changed(events)
+        except Exception:
+            journal.release(ids)
+            raise
+        journal.delete(ids)
+        total += len(events)
+
+
+class BackgroundWriter(object):
+    """后台写入线程：submit 把事件写进日志后立即返回，线程按 FLUSH_INTERVAL 成批写入 EventLog"""
+
+    def __init__(self, journal=None, interval=None, batch_size=None):
+        config = get_config()
+        self.journal = journal or EventJournal()
+        self.interval = interval if interval is not None else config['FLUSH_INTERVAL']
+        self.batch_size = batch_size or config['BATCH_SIZE']
+        # 同一进程内同一时间只允许一个线程写入 EventLog；进程之间靠领取避免重复写入
+        self._drain_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='eventlog-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, events):
+        self.journal.append(events)
+        self.start()
+
+    def flush(self):
+        """在当前线程中立即把日志中的事件写入 EventLog"""
+        with self._drain_lock:
+            return drain(self.journal, self.batch_size)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                try:
+                    self.flush()
+                except Exception:
+                    # 写入失败的事件仍在日志中，下一轮重试
+                    logger.exception('后台写入 EventLog 失败')
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+        finally:
+            connection.close()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def background_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = BackgroundWriter()
+        return _writer
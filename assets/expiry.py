@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+到期日历：资产保修、合同和软件授权的到期日预先写入 ExpiryEntry，按到期日建索引。
+
+- warranty：每台设置了 expire_day 的资产一行。
+- contract：每个设置了 end_day 的合同一行。
+- license：合同设置了 license_num 时，合同下的服务器所用的每种软件（Server.os_release 对应 Software.version）一行。
+  合同到期后该软件剩余的授权为 Software.license_num - Contract.license_num，
+  少于全部正在使用该软件的服务器数量时，差额即为需要续约的授权数（shortfall）。
+
+保修和合同的行在资产、合同保存或删除的事务提交后按 id 刷新；
+用 queryset.update() 批量修改 expire_day / end_day 后需要运行 `manage.py expiry_calendar --rebuild`。
+授权用到的服务器系统版本随每次汇报变化，由 expiry_calendar 每次运行时在数据库中分组统计后刷新。
+
+expiry_calendar 每次运行只处理尚未提醒、且到期日已进入提醒窗口（NOTICE_DAYS 天内或已过期）的行，
+经 expiry_pending_idx 一次范围查询取出，成批写入 EventLog 并标记为已提醒；到期日改变后重新提醒。
+“即将到期”接口只在 expiry_day_kind_idx / expiry_kind_day_idx 上做范围扫描，耗时与资产总数无关。
+"""
+
+import base64
+import binascii
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from . import models
+from . import signals
+from .events import EventRecorder
+
+DEFAULTS = {
+    # 到期前多少天开始提醒，也是接口默认的查询范围
+    'NOTICE_DAYS': 30,
+    # 每个事务中提醒的条目数
+    'BATCH_SIZE': 1000,
+}
+
+KINDS = ('warranty', 'contract', 'license')
+VALUE_FIELDS = ('asset_id', 'day', 'name', 'licensed', 'expiring', 'in_use')
+ENTRY_FIELDS = ('id', 'kind', 'object_id', 'software_id') + VALUE_FIELDS
+# SQLite 单条语句的参数个数有限，按 id 分批查询
+ID_BATCH = 500
+# 重建时每次处理的资产 id 范围
+REBUILD_RANGE = 20000
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# EventLog.event_type：maintance_routine
+EVENT_TYPE = 5
+EVENT_NAME_LENGTH = models.EventLog._meta.get_field('name').max_length
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ASSET_EXPIRY', {}))
+    return config
+
+
+def _sync(kind, current, entries):
+    """
+    current：{(object_id, software_id): VALUE_FIELDS 的值}，entries：同一范围内已有的行。
+    删除多余的行，写入新增的行，只更新发生变化的行；到期日变化的行重新等待提醒。返回变化的行数。
+    """
+    existing = {(entry.object_id, entry.software_id): entry for entry in entries}
+    stale = [entry.id for key, entry in existing.items() if key not in current]
+    created, updated = [], []
+    for key, values in current.items():
+        entry = existing.get(key)
+        if entry is None:
+            created.append(models.ExpiryEntry(kind=kind, object_id=key[0], software_id=key[1],
+                                              **dict(zip(VALUE_FIELDS, values))))
+        elif tuple(getattr(entry, field) for field in VALUE_FIELDS) != values:
+            if entry.day != values[1]:
+                entry.notified = False
+            for field, value in zip(VALUE_FIELDS, values):
+                setattr(entry, field, value)
+            updated.append(entry)
+    for start in range(0, len(stale), ID_BATCH):
+        models.ExpiryEntry.objects.filter(id__in=stale[start:start + ID_BATCH]).delete()
+    models.ExpiryEntry.objects.bulk_create(created, batch_size=ID_BATCH)
+    models.ExpiryEntry.objects.bulk_update(updated, VALUE_FIELDS + ('notified',), batch_size=50)
+    return len(stale) + len(created) + len(updated)
+
+
+def _warranty_rows(assets):
+    return {(asset_id, 0): (asset_id, day, name, None, None, None)
+            for asset_id, name, day in assets.filter(expire_day__isnull=False).values_list('id', 'name', 'expire_day')}
+
+
+def _contract_rows(contracts):
+    return {(contract_id, 0): (None, day, name, None, None, None)
+            for contract_id, name, day in contracts.filter(end_day__isnull=False).values_list('id', 'name', 'end_day')}
+
+
+def refresh_assets(asset_ids):
+    """按资产当前的 expire_day 刷新这些资产的保修行，返回变化的行数"""
+    asset_ids = sorted(asset_ids)
+    changed = 0
+    with transaction.atomic():
+        for start in range(0, len(asset_ids), ID_BATCH):
+            batch = asset_ids[start:start + ID_BATCH]
+            changed += _sync('warranty', _warranty_rows(models.Asset.objects.filter(id__in=batch)),
+                             models.ExpiryEntry.objects.filter(kind='warranty', object_id__in=batch))
+    return changed
+
+
+def refresh_contracts(contract_ids):
+    contract_ids = sorted(contract_ids)
+    changed = 0
+    with transaction.atomic():
+        for start in range(0, len(contract_ids), ID_BATCH):
+            batch = contract_ids[start:start + ID_BATCH]
+            changed += _sync('contract', _contract_rows(models.Contract.objects.filter(id__in=batch)),
+                             models.ExpiryEntry.objects.filter(kind='contract', object_id__in=batch))
+    return changed
+
+
+def refresh_licenses():
+    """
+    重新统计所有合同下的软件授权，两条分组查询：每种软件正在使用的服务器数，以及每个合同下的服务器用到的软件。
+    授权的行数只与合同数和软件种类有关，直接整体比对。
+    """
+    software = {version: (software_id, license_num) for software_id, version, license_num in
+                models.Software.objects.values_list('id', 'version', 'license_num')}
+    servers = models.Server.objects.order_by().filter(os_release__in=models.Software.objects.values('version'))
+    in_use = dict(servers.values_list('os_release').annotate(count=Count('id')))
+    pairs = servers.filter(asset__contract__end_day__isnull=False, asset__contract__license_num__isnull=False) \
+        .values_list('asset__contract_id', 'asset__contract__name', 'asset__contract__end_day',
+                     'asset__contract__license_num', 'os_release').distinct()
+    current = {}
+    for contract_id, name, day, license_num, version in pairs:
+        software_id, licensed = software[version]
+        current[(contract_id, software_id)] = (None, day, '%s: %s' % (name, version), licensed, license_num,
+                                               in_use[version])
+    with transaction.atomic():
+        return _sync('license', current, models.ExpiryEntry.objects.filter(kind='license'))
+
+
+def rebuild():
+    """按资产 id 范围逐段比对整个日历，已提醒过且到期日未变的行保持已提醒；返回变化的行数"""
+    changed = 0
+    last_id = models.Asset.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    last_id = max(last_id, models.ExpiryEntry.objects.filter(kind='warranty').order_by('-object_id')
+                  .values_list('object_id', flat=True).first() or 0)
+    for start in range(0, last_id + 1, REBUILD_RANGE):
+        end = start + REBUILD_RANGE
+        with transaction.atomic():
+            changed += _sync('warranty', _warranty_rows(models.Asset.objects.filter(id__gte=start, id__lt=end)),
+                             models.ExpiryEntry.objects.filter(kind='warranty', object_id__gte=start,
+                                                               object_id__lt=end))
+    with transaction.atomic():
+        changed += _sync('contract', _contract_rows(models.Contract.objects.all()),
+                         models.ExpiryEntry.objects.filter(kind='contract'))
+    return changed + refresh_licenses()
+
+
+def shortfall(entry):
+    """合同到期后缺少的授权数，只对 license 行有意义"""
+    if entry['kind'] != 'license':
+        return None
+    return max(0, entry['in_use'] - (entry['licensed'] - (entry['expiring'] or 0)))
+
+
+def _notice(entry, today):
+    """返回事件的 (name, detail)，name 截断到 EventLog.name 的长度"""
+    day = entry['day']
+    when = '已于 %s 到期' % day if day < today else '将于 %s 到期（%d 天后）' % (day, (day - today).days)
+    name = '%s: %s_expiring' % (entry['name'][:EVENT_NAME_LENGTH - 20], entry['kind'])
+    if entry['kind'] == 'warranty':
+        return name, '资产保修%s' % when
+    if entry['kind'] == 'contract':
+        return name, '合同%s' % when
+    return name, '合同中的 %s 个授权%s，剩余 %s 个，正在使用 %s 个，缺少 %s 个' % (
+        entry['expiring'], when, entry['licensed'] - entry['expiring'], entry['in_use'], shortfall(entry))
+
+
+def notify(today=None, days=None, batch_size=None):
+    """
+    为进入提醒窗口、尚未提醒的行成批写入 EventLog（event_type 为 maintance_routine）并标记为已提醒，
+    事件和标记在同一个事务中提交。返回 {类型: 提醒条数}。
+    """
+    config = get_config()
+    today = today or timezone.localdate()
+    horizon = today + datetime.timedelta(days=config['NOTICE_DAYS'] if days is None else days)
+    batch_size = batch_size or config['BATCH_SIZE']
+    counts = dict.fromkeys(KINDS, 0)
+    while True:
+        with transaction.atomic():
+            entries = list(models.ExpiryEntry.objects.filter(notified=False, day__lte=horizon)
+                           .order_by('notified', 'day').values(*ENTRY_FIELDS)[:batch_size])
+            if not entries:
+                return counts
+            recorder = EventRecorder()
+            for entry in entries:
+                name, detail = _notice(entry, today)
+                recorder.record(name, detail, asset=entry['asset_id'], event_type=EVENT_TYPE,
+                                component=entry['kind'])
+                counts[entry['kind']] += 1
+            recorder.flush()
+            ids = [entry['id'] for entry in entries]
+            for start in range(0, len(ids), ID_BATCH):
+                models.ExpiryEntry.objects.filter(id__in=ids[start:start + ID_BATCH]).update(notified=True)
+
+
+def encode_cursor(entry):
+    raw = '%s|%s|%s' % (entry['day'].isoformat(), entry['kind'], entry['id'])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        day, kind, entry_id = raw.split('|')
+        return datetime.date.fromisoformat(day), kind, int(entry_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('无效的分页游标：%s' % cursor)
+
+
+def expiring(days=None, kind=None, overdue=False, cursor=None, size=DEFAULT_PAGE_SIZE, today=None):
+    """
+    今天起 days 天内到期的行（overdue 为真时包含已过期的），按 (day, kind, id) 排序，游标翻页。
+    返回 {counts: {类型: 条数}, results: [...], next_cursor}；计数只扫描索引。
+    """
+    today = today or timezone.localdate()
+    until = today + datetime.timedelta(days=get_config()['NOTICE_DAYS'] if days is None else days)
+    entries = models.ExpiryEntry.objects.filter(day__lte=until)
+    if not overdue:
+        entries = entries.filter(day__gte=today)
+    if kind is not None:
+        entries = entries.filter(kind=kind)
+    # 条件计数只扫描一遍索引范围，不需要 GROUP BY 的临时表
+    counts = entries.aggregate(**{name: Count('id', filter=Q(kind=name)) for name in
+                                  (KINDS if kind is None else (kind,))})
+
+    page = entries.order_by('day', 'kind', 'id')
+    if cursor:
+        day, after_kind, entry_id = decode_cursor(cursor)
+        page = page.filter(day__gte=day).exclude(day=day, kind__lt=after_kind) \
+            .exclude(day=day, kind=after_kind, id__lte=entry_id)
+    rows = list(page.values(*ENTRY_FIELDS)[:size + 1])
+    next_cursor = encode_cursor(rows[size - 1]) if len(rows) > size else None
+    results = []
+    for entry in rows[:size]:
+        entry['days_left'] = (entry['day'] - today).days
+        entry['shortfall'] = shortfall(entry)
+        results.append(entry)
+    return {'today': today, 'until': until, 'counts': counts, 'results': results, 'next_cursor': next_cursor}
+
+
+def schedule_assets(asset_ids):
+    signals.defer_until_commit(refresh_assets, asset_ids)
+
+
+def schedule_contracts(contract_ids):
+    signals.defer_until_commit(refresh_contracts, contract_ids)
+
+
+def _on_asset_change(sender, instance, **kwargs):
+    schedule_assets([instance.pk])
+
+
+def _on_contract_change(sender, instance, **kwargs):
+    schedule_contracts([instance.pk])
+
+
+def connect_signals():
+    post_save.connect(_on_asset_change, sender=models.Asset, dispatch_uid='expiry_asset_save')
+    post_delete.connect(_on_asset_change, sender=models.Asset, dispatch_uid='expiry_asset_delete')
+    post_save.connect(_on_contract_change, sender=models.Contract, dispatch_uid='expiry_contract_save')
+    post_delete.connect(_on_contract_change, sender=models.Contract, dispatch_uid='expiry_contract_delete')
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+资产历史：某台资产在任意时刻的硬件和基本信息，以及任意两个时刻之间的差异。
+
+资产的状态整理成 {部分: {组件键: {字段: 值}}}，部分为 asset / server / cpu / ram / disk / nic，
+内存、硬盘、网卡以自然键为组件键，其余部分只有一行（键为空字符串）。
+资产或组件变化的事务提交后，把当前状态与 AssetHistoryHead 中的最新状态比对：
+没有变化时什么也不写；有变化时写一条只包含变化部分的 AssetDelta，
+每 SNAPSHOT_EVERY 个版本或距上一份快照超过 SNAPSHOT_DAYS 天时再写一份完整的 AssetSnapshot。
+还原某个时刻的状态时，从该时刻之前最近的快照开始依次应用之后的增量，最多应用 SNAPSHOT_EVERY 个。
+"""
+
+import datetime
+import hashlib
+import json
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import models
+from . import signals
+from .asset_handler import COMPONENT_SPECS, CPU_FIELDS
+
+DEFAULTS = {
+    # 每隔多少个版本保存一份完整快照
+    'SNAPSHOT_EVERY': 20,
+    # 距上一份快照超过多少天时，下一次变化保存完整快照
+    'SNAPSHOT_DAYS': 30,
+}
+
+# SQLite 单条语句的参数个数有限，按资产 id 分批查询
+ID_BATCH = 500
+
+ASSET_FIELDS = ('name', 'sn', 'asset_type', 'status', 'business_unit_id', 'manufacturer_id', 'manage_ip', 'admin_id',
+                'idc_id', 'contract_id', 'purchase_day', 'expire_day', 'price', 'approved_by_id', 'memo')
+SERVER_FIELDS = ('sub_asset_type', 'created_by', 'hosted_on_id', 'model', 'raid_type', 'os_type', 'os_distribution',
+                 'os_release')
+
+# 状态的各个部分：(名称, 模型, 指向资产的字段, 组件键字段, 其余字段)
+SECTIONS = (
+    ('asset', models.Asset, 'id', (), ASSET_FIELDS),
+    ('server', models.Server, 'asset_id', (), SERVER_FIELDS),
+    ('cpu', models.CPU, 'asset_id', (), CPU_FIELDS),
+) + tuple((spec.name, spec.model, 'asset_id', spec.natural_key, spec.fields) for spec in COMPONENT_SPECS)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ASSET_HISTORY', {}))
+    return config
+
+
+def pack(value):
+    return zlib.compress(json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+
+
+def state_hash(state):
+    return hashlib.sha256(json.dumps(state, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def load_states(asset_ids):
+    """从数据库中读出这些资产的当前状态，每个部分一条查询；不存在的资产不出现在结果中"""
+    states = {}
+    for name, model, asset_field, key_fields, fields in SECTIONS:
+        for row in model.objects.filter(**{'%s__in' % asset_field: asset_ids}).values(
+                asset_field, *(key_fields + fields)):
+            asset_id = row[asset_field]
+            if name != 'asset' and asset_id not in states:
+                continue
+            key = '/'.join(str(row[f]) for f in key_fields)
+            states.setdefault(asset_id, {}).setdefault(name, {})[key] = {f: _jsonable(row[f]) for f in fields}
+    return states
+
+
+def states_from_rows(rows):
+    """由 assets_changed 信号带来的行整理出状态，与 load_states 的结果一致，不需要查询"""
+    states = {}
+    for asset_id, entry in rows.items():
+        state = states[asset_id] = {}
+        for name, model, asset_field, key_fields, fields in SECTIONS:
+            objs = entry.get(name)
+            if objs is None:
+                continue
+            for obj in objs if isinstance(objs, list) else [objs]:
+                key = '/'.join(str(getattr(obj, f)) for f in key_fields)
+                state.setdefault(name, {})[key] = {f: _jsonable(getattr(obj, f)) for f in fields}
+    return states
+
+
+def diff(old, new):
+    """
+    old -> new 的增量：{部分: {'+': {键: 字段值}, '-': [键], '~': {键: {变化的字段: 新值}}}}，
+    只记录新值，用于从旧状态向前还原。
+    """
+    changes = {}
+    for section in set(old) | set(new):
+        before, after = old.get(section, {}), new.get(section, {})
+        entry = {}
+        added = {key: values for key, values in after.items() if key not in before}
+        removed = sorted(key for key in before if key not in after)
+        changed = {}
+        for key, values in after.items():
+            if key in before and before[key] != values:
+                changed[key] = {f: value for f, value in values.items() if before[key].get(f) != value}
+        if added:
+            entry['+'] = added
+        if removed:
+            entry['-'] = removed
+        if changed:
+            entry['~'] = changed
+        if entry:
+            changes[section] = entry
+    return changes
+
+
+def apply(state, changes):
+    """把增量应用到状态上，返回新的状态，不修改传入的状态"""
+    result = {section: dict(rows) for section, rows in state.items()}
+    for section, entry in changes.items():
+        rows = result.setdefault(section, {})
+        for key in entry.get('-', ()):
+            rows.pop(key, None)
+        rows.update(entry.get('+', {}))
+        for key, values in entry.get('~', {}).items():
+            rows[key] = dict(rows.get(key, {}), **values)
+        if not rows:
+            del result[section]
+    return result
+
+
+def compare(old, new):
+    """两个状态之间的差异：{部分: {'added': {键: 字段值}, 'removed': {键: 字段值}, 'changed': {键: {字段: [旧值, 新值]}}}}"""
+    result = {}
+    for section, entry in diff(old or {}, new or {}).items():
+        before = (old or {}).get(section, {})
+        result[section] = {
+            'added': entry.get('+', {}),
+            'removed': {key: before[key] for key in entry.get('-', ())},
+            'changed': {key: {f: [before[key].get(f), value] for f, value in values.items()}
+                        for key, values in entry.get('~', {}).items()},
+        }
+    return result
+
+
+def record(asset_ids, now=None, states=None):
+    """
+    把这些资产的当前状态与历史中的最新状态比对，有变化的写入新版本，返回写入的版本数。
+    状态没有变化（例如重复的汇报）时不写入任何数据。
+    states 为调用方已经整理好的当前状态（见 states_from_rows），给出时不再从数据库读取。
+    """
+    config = get_config()
+    now = now or timezone.now()
+    asset_ids = sorted(set(asset_ids))
+    written = 0
+    with transaction.atomic():
+        for start in range(0, len(asset_ids), ID_BATCH):
+            batch = asset_ids[start:start + ID_BATCH]
+            current = load_states(batch) if states is None else states
+            heads = {head.asset_id: head for head in
+                     models.AssetHistoryHead.objects.select_for_update().filter(asset_id__in=batch)}
+            created, updated, snapshots, deltas = [], [], [], []
+            for asset_id in batch:
+                state = current.get(asset_id, {})
+                digest = state_hash(state)
+                head = heads.get(asset_id)
+                if head is None:
+                    if not state:
+                        continue
+                    # 第一次记录：版本 1 为完整快照
+                    head = models.AssetHistoryHead(asset_id=asset_id, version=1, state=pack(state), state_hash=digest,
+                                                   snapshot_version=1, snapshot_time=now)
+                    created.append(head)
+                    snapshots.append(models.AssetSnapshot(asset_id=asset_id, version=1, taken_at=now, state=head.state))
+                    continue
+                if head.state_hash == digest:
+                    continue
+                head.version += 1
+                deltas.append(models.AssetDelta(asset_id=asset_id, version=head.version, taken_at=now,
+                                                changes=pack(diff(unpack(head.state), state))))
+                head.state, head.state_hash = pack(state), digest
+                if (head.version - head.snapshot_version >= config['SNAPSHOT_EVERY']
+                        or now - head.snapshot_time >= datetime.timedelta(days=config['SNAPSHOT_DAYS'])):
+                    snapshots.append(models.AssetSnapshot(asset_id=asset_id, version=head.version, taken_at=now,
+                                                          state=head.state))
+                    head.snapshot_version, head.snapshot_time = head.version, now
+                updated.append(head)
+            models.AssetHistoryHead.objects.bulk_create(created)
+            models.AssetHistoryHead.objects.bulk_update(
+                updated, ['version', 'state', 'state_hash', 'snapshot_version', 'snapshot_time'])
+            models.AssetSnapshot.objects.bulk_create(snapshots)
+            models.AssetDelta.objects.bulk_create(deltas)
+            written += len(created) + len(updated)
+    return written
+
+
+def schedule_record(asset_ids):
+    signals.defer_until_commit(record, asset_ids)
+
+
+def state_at(asset_id, at=None):
+    """
+    资产在 at 时刻（默认为现在）的状态，返回 (版本, 状态)；该时刻之前没有记录时返回 (0, None)。
+    两条查询：最近的快照，以及快照之后、at 之前的增量。
+    """
+    snapshots = models.AssetSnapshot.objects.filter(asset_id=asset_id)
+    if at is not None:
+        snapshots = snapshots.filter(taken_at__lte=at)
+    snapshot = snapshots.order_by('-version').only('version', 'state').first()
+    if snapshot is None:
+        return 0, None
+    version, state = snapshot.version, unpack(snapshot.state)
+    deltas = models.AssetDelta.objects.filter(asset_id=asset_id, version__gt=version)
+    if at is not None:
+        deltas = deltas.filter(taken_at__lte=at)
+    for version, changes in deltas.order_by('version').values_list('version', 'changes'):
+        state = apply(state, unpack(changes))
+    # 资产已被删除时状态为空
+    return version, state or None
+
+
+def versions(asset_id, limit=100):
+    """资产的版本列表，新的在前：[{'version', 'taken_at', 'snapshot', 'sections'}]"""
+    snapshot_versions = set(models.AssetSnapshot.objects.filter(asset_id=asset_id).values_list('version', flat=True))
+    result = [{'version': version, 'taken_at': taken_at, 'snapshot': version in snapshot_versions,
+               'sections': sorted(unpack(changes))}
+              for version, taken_at, changes in models.AssetDelta.objects.filter(asset_id=asset_id)
+              .order_by('-version').values_list('version', 'taken_at', 'changes')[:limit]]
+    if len(result) < limit:
+        # 第一个版本只有快照，没有增量
+        first = models.AssetSnapshot.objects.filter(asset_id=asset_id, version=1).values_list('taken_at', flat=True)
+        result += [{'version': 1, 'taken_at': taken_at, 'snapshot': True, 'sections': []} for taken_at in first]
+    return result
+
+
+def parse_time(value):
+    """解析查询参数中的时间，接受 ISO 格式的日期或时间，不带时区的按当前时区处理"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError('无法识别的时间：%s' % value)
+        # 只给日期时取当天结束时的状态
+        parsed = datetime.datetime.combine(day, datetime.time.max)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def stats():
+    """历史数据的行数和压缩后的字节数"""
+    result = {}
+    for name, model, field in (('heads', models.AssetHistoryHead, 'state'),
+                               ('snapshots', models.AssetSnapshot, 'state'),
+                               ('deltas', models.AssetDelta, 'changes')):
+        row = model.objects.aggregate(count=Count('pk'), bytes=Sum(Length(field)))
+        result[name] = {'count': row['count'], 'bytes': row['bytes'] or 0}
+    return result
+
+
+# ---- 增量记录 ----
+
+def _on_asset_change(sender, instance, **kwargs):
+    schedule_record([instance.pk])
+
+
+def _on_component_change(sender, instance, **kwargs):
+    schedule_record([instance.asset_id])
+
+
+def _on_assets_changed(sender, asset_ids, rows=None, **kwargs):
+    rows = signals.committed_rows(rows, record, asset_ids)
+    if rows is None:
+        schedule_record(asset_ids)
+    else:
+        record(asset_ids, states=states_from_rows(rows))
+
+
+def connect_signals():
+    post_save.connect(_on_asset_change, sender=models.Asset, dispatch_uid='history_asset_save')
+    post_delete.connect(_on_asset_change, sender=models.Asset, dispatch_uid='history_asset_delete')
+    for model in (models.Server, models.CPU) + tuple(spec.model for spec in COMPONENT_SPECS):
+        post_save.connect(_on_component_change, sender=model, dispatch_uid='history_%s_save' % model.__name__)
+        post_delete.connect(_on_component_change, sender=model, dispatch_uid='history_%s_delete' % model.__name__)
+    signals.assets_changed.connect(_on_assets_changed, dispatch_uid='history_assets_changed')
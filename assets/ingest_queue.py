@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+资产汇报的异步入库队列。
+
+汇报接口只做校验，然后把汇报追加到一个独立的 SQLite 日志文件中并立即返回 202，
+由 ingest_worker 管理命令启动的多个工作进程按批次取出、在一个事务内入库。
+队列文件与业务数据库分开，入队不会和入库争抢业务库的写锁。
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import asset_handler
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ASYNC': False,
+    'QUEUE_PATH': os.path.join(settings.BASE_DIR, 'ingest_queue.sqlite3'),
+    'WORKERS': 4,
+    'BATCH_SIZE': 200,
+    # 被领取后超过这个时间（秒）仍未确认的汇报，会被重新投递
+    'VISIBILITY_TIMEOUT': 300,
+    # 超过最大尝试次数的汇报不再投递，留待人工排查
+    'MAX_ATTEMPTS': 5,
+    'POLL_INTERVAL': 1.0,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sn TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    claimed_by TEXT,
+    claimed_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS report_queue_claim ON report_queue (claimed_at, id);
+CREATE TABLE IF NOT EXISTS batch_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    worker TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    finished_at REAL NOT NULL,
+    latency REAL NOT NULL,
+    lag REAL NOT NULL,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# 统计信息只保留最近这么多个批次
+STATS_WINDOW = 1000
+
+# 入库结果为这些状态的汇报重试也不会成功，不能当作已入库直接确认
+REJECTED = ('full_report_required', 'error')
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ASSET_INGEST', {}))
+    return config
+
+
+def is_async():
+    return get_config()['ASYNC']
+
+
+def percentile(values, p):
+    """values 已排序"""
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+class IngestQueue(object):
+    """基于 SQLite 文件的持久化队列，每个进程各自持有连接"""
+
+    def __init__(self, path=None, config=None):
+        self.config = config or get_config()
+        self.path = path or self.config['QUEUE_PATH']
+        self.worker = '%s:%s' % (socket.gethostname(), os.getpid())
+        self._conn = None
+        self._pid = None
+
+    @property
+    def conn(self):
+        # fork 出来的子进程不能复用父进程的连接
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            self._pid = os.getpid()
+            self.worker = '%s:%s' % (socket.gethostname(), self._pid)
+        return self._conn
+
+    @contextmanager
+    def transaction(self):
+        # 连接处于自动提交模式，需要显式开启事务，BEGIN IMMEDIATE 会立即拿到写锁
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def enqueue(self, reports):
+        """追加若干份已校验的汇报，返回入队数量"""
+        now = time.time()
+        rows = [(data['sn'], json.dumps(data), now) for data in reports]
+        with self.transaction() as conn:
+            conn.executemany('INSERT INTO report_queue (sn, payload, enqueued_at) VALUES (?, ?, ?)', rows)
+        return len(rows)
+
+    def claim(self, limit):
+        """
+        领取最多 limit 份汇报。
+        BEGIN IMMEDIATE 保证多个工作进程不会领到同一条记录。
+        返回 [(id, enqueued_at, data), ...]，按入队顺序排列。
+        """
+        now = time.time()
+        expired = now - self.config['VISIBILITY_TIMEOUT']
+        with self.transaction() as conn:
+            rows = conn.execute(
+                'SELECT id, enqueued_at, payload FROM report_queue '
+                'WHERE (claimed_at IS NULL OR claimed_at < ?) AND attempts < ? ORDER BY id LIMIT ?',
+                (expired, self.config['MAX_ATTEMPTS'], limit)).fetchall()
+            if rows:
+                conn.executemany(
+                    'UPDATE report_queue SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1 WHERE id = ?',
+                    [(self.worker, now, row[0]) for row in rows])
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+    def ack(self, ids):
+        """入库成功，删除记录"""
+        with self.transaction() as conn:
+            conn.executemany('DELETE FROM report_queue WHERE id = ?', [(i,) for i in ids])
+
+    def reject(self, errors):
+        """
+        入库时被拒绝的汇报（需要完整汇报、数据错误）重试也不会成功，
+        直接标记为达到最大尝试次数，连同原因留在队列中，计入 dead 留待人工排查。
+        errors 为 {id: 原因}。
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                'UPDATE report_queue SET claimed_by = NULL, claimed_at = NULL, attempts = ?, last_error = ? '
+                'WHERE id = ?',
+                [(self.config['MAX_ATTEMPTS'], error, i) for i, error in errors.items()])
+
+    def release(self, ids, error):
+        """入库失败，放回队列等待重试"""
+        with self.transaction() as conn:
+            conn.executemany(
+                'UPDATE report_queue SET claimed_by = NULL, claimed_at = NULL, last_error = ? WHERE id = ?',
+                [(error, i) for i in ids])
+
+    def record_batch(self, size, latency, lag, failed=False):
+        with self.transaction() as conn:
+            conn.execute(
+                'INSERT INTO batch_stats (worker, size, finished_at, latency, lag, failed) VALUES (?, ?, ?, ?, ?, ?)',
+                (self.worker, size, time.time(), latency, lag, int(failed)))
+            conn.execute('DELETE FROM batch_stats WHERE id <= (SELECT MAX(id) FROM batch_stats) - ?',
+                         (STATS_WINDOW,))
+
+    def stats(self):
+        """队列深度、积压时间和最近批次的耗时，用于评估工作进程数量"""
+        now = time.time()
+        conn = self.conn
+        depth, oldest = conn.execute(
+            'SELECT COUNT(*), MIN(enqueued_at) FROM report_queue WHERE attempts < ?',
+            (self.config['MAX_ATTEMPTS'],)).fetchone()
+        in_flight = conn.execute(
+            'SELECT COUNT(*) FROM report_queue WHERE claimed_at >= ?',
+            (now - self.config['VISIBILITY_TIMEOUT'],)).fetchone()[0]
+        dead = conn.execute('SELECT COUNT(*) FROM report_queue WHERE attempts >= ?',
+                            (self.config['MAX_ATTEMPTS'],)).fetchone()[0]
+        batches = conn.execute('SELECT size, latency, lag, failed, finished_at FROM batch_stats').fetchall()
+        latencies = sorted(row[1] for row in batches)
+        lags = sorted(row[2] for row in batches)
+        recent = [row for row in batches if row[4] >= now - 60]
+        return {
+            'depth': depth,
+            'in_flight': in_flight,
+            'dead': dead,
+            'lag': now - oldest if oldest else 0.0,
+            'batches': len(batches),
+            'failed_batches': sum(row[3] for row in batches),
+            'batch_latency_p50': percentile(latencies, 50),
+            'batch_latency_p95': percentile(latencies, 95),
+            'batch_latency_max': latencies[-1] if latencies else None,
+            'queue_lag_p95': percentile(lags, 95),
+            'reports_per_minute': sum(row[0] for row in recent),
+        }
+
+
+def split_rounds(claimed):
+    """
+    同一批次中同一台资产可能有多份汇报（例如完整汇报后紧跟增量汇报），
+    按入队顺序拆成若干轮，保证每一轮中每台资产只出现一次。
+    返回每一轮领取到的记录 [(id, enqueued_at, data), ...]。
+    """
+    rounds = []
+    for item in claimed:
+        sn = item[2]['sn']
+        for batch in rounds:
+            if sn not in batch:
+                batch[sn] = item
+                break
+        else:
+            rounds.append({sn: item})
+    return [list(batch.values()) for batch in rounds]
+
+
+def process_batch(queue, limit):
+    """
+    领取一批汇报并入库，返回处理的数量；队列为空时返回 0。
+    每一轮在各自的事务中入库，提交后立即确认这一轮的记录；某一轮失败时只放回尚未入库的记录，
+    已提交的轮次不会被重新投递。被拒绝的汇报不删除，记录原因后转入 dead。
+    """
+    claimed = queue.claim(limit)
+    if not claimed:
+        return 0
+    started = time.time()
+    lag = started - min(item[1] for item in claimed)
+    pending = [item[0] for item in claimed]
+    try:
+        for items in split_rounds(claimed):
+            results = asset_handler.ReportBatch([item[2] for item in items]).process()
+            ids = {item[2]['sn']: item[0] for item in items}
+            rejected = {ids[result['sn']]: '%s: %s' % (result['status'], result['message'])
+                        for result in results if result['status'] in REJECTED and result['sn'] in ids}
+            if rejected:
+                logger.warning('%s 份汇报入库时被拒绝，已转入 dead：%s', len(rejected), sorted(rejected.values()))
+                queue.reject(rejected)
+            done = {item[0] for item in items}
+            queue.ack(sorted(done - set(rejected)))
+            pending = [i for i in pending if i not in done]
+    except Exception as e:
+        logger.exception('批量入库失败，%s 份汇报将重新投递', len(pending))
+        queue.release(pending, repr(e))
+        queue.record_batch(len(claimed), time.time() - started, lag, failed=True)
+        return len(claimed)
+    queue.record_batch(len(claimed), time.time() - started, lag)
+    return len(claimed)
@@ -0,0 +1,390 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+模拟一群客户端对汇报接口施加负载。
+
+每个模拟客户端持有一份由 synthetic.make_fleet 生成的汇报，按客户端的方式发送：
+版本 2 格式（gzip 压缩的 JSON），请求头带上 sn 和数据指纹。
+测试分为三个阶段：
+  enroll   所有客户端第一次汇报，资产进入待审批区
+  approve  用 ApprovalBatch 一次审批全部资产（不经过 HTTP）
+  steady   多轮例行汇报，每轮按 change_rate 的比例随机改变部分客户端的硬件
+请求可以经 Django 测试客户端在进程内发出（client），也可以发给本机启动的多线程 WSGI 服务器（server）。
+每个请求执行的 SQL 由 connection.execute_wrapper 统计：查询数、SQL 耗时、写语句耗时；
+锁竞争用 “database is locked” / 死锁错误的次数，以及超过 slow_write_ms 的写语句（通常是在等待写锁）来衡量。
+"""
+
+import gzip
+import http.client
+import json
+import queue
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.utils import timezone
+
+from . import models
+from . import synthetic
+from . import wire
+from .approval import ApprovalBatch
+from .asset_handler import report_fingerprint
+from .ingest_queue import percentile
+
+REPORT_URL = '/assets/report/'
+PROBE_HEADER = 'X-Load-Probe'
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class Probe(object):
+    """统计一个请求中执行的 SQL，作为 connection.execute_wrapper 使用"""
+
+    def __init__(self, slow_write_ms):
+        self.slow_write_ms = slow_write_ms
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.write_ms = 0.0
+        self.slow_writes = 0
+        self.locked = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            message = str(e).lower()
+            if 'locked' in message or 'deadlock' in message:
+                self.locked += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.sql_ms += elapsed
+            if sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+                self.write_ms += elapsed
+                if elapsed >= self.slow_write_ms:
+                    self.slow_writes += 1
+
+    @contextmanager
+    def watching(self):
+        """在当前线程的所有数据库连接上统计，读写分离时读查询走的是另一个连接"""
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def header(self):
+        return '%d,%.3f,%.3f,%d,%d' % (self.queries, self.sql_ms, self.write_ms, self.slow_writes, self.locked)
+
+    @classmethod
+    def from_header(cls, value):
+        probe = cls(0)
+        if value:
+            queries, sql_ms, write_ms, slow_writes, locked = value.split(',')
+            probe.queries, probe.sql_ms, probe.write_ms = int(queries), float(sql_ms), float(write_ms)
+            probe.slow_writes, probe.locked = int(slow_writes), int(locked)
+        return probe
+
+
+def encode_report(data):
+    """按客户端的方式编码一份汇报：返回 (请求体, 请求头)"""
+    data = dict(data, report_hash=report_fingerprint(data))
+    headers = {
+        'X-Asset-SN': data['sn'],
+        'X-Report-Hash': data['report_hash'],
+        'X-Report-Format': wire.FORMAT_VERSION,
+        'Content-Type': 'application/json',
+        'Content-Encoding': 'gzip',
+    }
+    return wire.encode_body(data), headers
+
+
+class ClientTransport(object):
+    """经 Django 测试客户端在本线程内处理请求"""
+
+    def __init__(self, slow_write_ms):
+        self.client = Client(HTTP_HOST='localhost')
+        self.slow_write_ms = slow_write_ms
+
+    def post(self, body, headers):
+        extra = {'HTTP_%s' % key.upper().replace('-', '_'): value for key, value in headers.items()
+                 if key != 'Content-Type'}
+        probe = Probe(self.slow_write_ms)
+        with probe.watching():
+            response = self.client.post(REPORT_URL, body, content_type=headers['Content-Type'], **extra)
+        return response.status_code, response.content, probe
+
+    def close(self):
+        connections.close_all()
+
+
+class HTTPTransport(object):
+    """经 HTTP 发给本机的测试服务器"""
+
+    def __init__(self, address):
+        self.conn = http.client.HTTPConnection(*address, timeout=120)
+
+    def post(self, body, headers):
+        self.conn.request('POST', REPORT_URL, body=body, headers=headers)
+        response = self.conn.getresponse()
+        content = response.read()
+        return response.status, content, Probe.from_header(response.getheader(PROBE_HEADER))
+
+    def close(self):
+        self.conn.close()
+
+
+class _ThreadingServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def probed_application(slow_write_ms):
+    """在 Django 的 WSGI 应用外统计每个请求的 SQL，结果放在响应头中返回给模拟客户端"""
+    application = get_wsgi_application()
+
+    def app(environ, start_response):
+        probe = Probe(slow_write_ms)
+
+        def probed_start_response(status, headers, exc_info=None):
+            return start_response(status, headers + [(PROBE_HEADER, probe.header())], exc_info)
+        with probe.watching():
+            return application(environ, probed_start_response)
+    return app
+
+
+class LocalServer(object):
+    """在后台线程中运行的多线程 WSGI 服务器"""
+
+    def __init__(self, slow_write_ms):
+        self.httpd = make_server('127.0.0.1', 0, probed_application(slow_write_ms), server_class=_ThreadingServer,
+                                 handler_class=_QuietHandler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='loadtest-server', daemon=True)
+
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class PhaseStats(object):
+    """一个阶段中所有请求的统计"""
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.queries = []
+        self.sql_ms = 0.0
+        self.write_ms = 0.0
+        self.slow_writes = 0
+        self.locked = 0
+        self.codes = Counter()
+        self.results = Counter()
+        self.errors = Counter()
+        self.seconds = 0.0
+
+    def add(self, latency_ms, code, content, probe, error=None):
+        try:
+            statuses = [item['status'] for item in json.loads(content.decode('utf-8')).get('results', [])]
+        except ValueError:
+            statuses = ['invalid_response']
+        with self.lock:
+            if error:
+                self.errors[error] += 1
+                # 提交事务时的锁等待超时不经过 execute_wrapper，从异常中补记
+                if not probe.locked and ('locked' in error.lower() or 'deadlock' in error.lower()):
+                    self.locked += 1
+            self.latencies.append(latency_ms)
+            self.queries.append(probe.queries)
+            self.sql_ms += probe.sql_ms
+            self.write_ms += probe.write_ms
+            self.slow_writes += probe.slow_writes
+            self.locked += probe.locked
+            self.codes[str(code)] += 1
+            self.results.update(statuses)
+
+    def summary(self):
+        latencies, queries = sorted(self.latencies), sorted(self.queries)
+        count = len(latencies)
+        return {
+            'requests': count,
+            'seconds': round(self.seconds, 3),
+            'throughput_rps': round(count / self.seconds, 1) if self.seconds else None,
+            'latency_ms': {
+                'mean': round(sum(latencies) / count, 2) if count else None,
+                'p50': _round(percentile(latencies, 50)),
+                'p90': _round(percentile(latencies, 90)),
+                'p99': _round(percentile(latencies, 99)),
+                'max': _round(latencies[-1] if latencies else None),
+            },
+            'queries': {
+                'total': sum(queries),
+                'per_request_mean': round(sum(queries) / count, 2) if count else None,
+                'per_request_p99': percentile(queries, 99),
+            },
+            'sql_seconds': round(self.sql_ms / 1000, 3),
+            'locks': {
+                'locked_errors': self.locked,
+                'slow_writes': self.slow_writes,
+                'write_seconds': round(self.write_ms / 1000, 3),
+            },
+            'status_codes': dict(sorted(self.codes.items())),
+            'errors': dict(self.errors.most_common(5)),
+            'results': dict(sorted(self.results.items())),
+        }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class LoadTest(object):
+    """
+    agents: 模拟客户端数量；concurrency: 同时发出请求的线程数；
+    rounds / change_rate: 例行汇报的轮数和每轮发生变化的客户端比例；
+    mode: client（进程内）或 server（本机 HTTP 服务器）。
+    需要在已经建好表的（测试）数据库上运行，多线程访问时 SQLite 必须是文件数据库。
+    """
+
+    def __init__(self, agents=1000, concurrency=32, rounds=3, change_rate=0.05, mode='client', slow_write_ms=50,
+                 seed=0, progress=None):
+        self.agents = agents
+        self.concurrency = concurrency
+        self.rounds = rounds
+        self.change_rate = change_rate
+        self.mode = mode
+        self.slow_write_ms = slow_write_ms
+        self.rng = random.Random(seed)
+        self.progress = progress
+        self.reports = synthetic.make_fleet(agents, self.rng)
+
+    def run(self):
+        phases = {}
+        if self.mode == 'server':
+            with LocalServer(self.slow_write_ms) as server:
+                self._run_phases(phases, lambda: HTTPTransport(server.address))
+        else:
+            self._run_phases(phases, lambda: ClientTransport(self.slow_write_ms))
+        return {
+            'meta': {
+                'revision': git_revision(),
+                'time': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'db_profile': getattr(settings, 'ASSET_DB_PROFILE', None),
+                'mode': self.mode,
+                'agents': self.agents,
+                'concurrency': self.concurrency,
+                'rounds': self.rounds,
+                'change_rate': self.change_rate,
+                'avg_report_bytes': round(sum(len(gzip.decompress(encode_report(data)[0]))
+                                              for data in self.reports[:100]) / min(len(self.reports), 100)),
+            },
+            'phases': phases,
+        }
+
+    def _run_phases(self, phases, transport_factory):
+        phases['enroll'] = self._drive('enroll', [encode_report(data) for data in self.reports], transport_factory)
+        started = time.perf_counter()
+        results = ApprovalBatch(models.NewAssetApprovalZone.objects.filter(approved=False)
+                                .values_list('id', flat=True)).process()
+        elapsed = time.perf_counter() - started
+        phases['approve'] = {'assets': len(results), 'seconds': round(elapsed, 3),
+                             'assets_per_second': round(len(results) / elapsed, 1) if elapsed else None,
+                             'results': dict(Counter(result['status'] for result in results))}
+        steady = PhaseStats('steady')
+        for _ in range(self.rounds):
+            for i in range(len(self.reports)):
+                if self.rng.random() < self.change_rate:
+                    self.reports[i] = synthetic.mutate_report(self.reports[i], self.rng)
+            self._drive('steady', [encode_report(data) for data in self.reports], transport_factory, steady)
+        phases['steady'] = steady.summary()
+
+    def _drive(self, name, requests, transport_factory, stats=None):
+        """用 concurrency 个线程发出这些请求，顺序随机打乱（模拟客户端各自的随机延迟）"""
+        stats = stats or PhaseStats(name)
+        requests = list(requests)
+        self.rng.shuffle(requests)
+        jobs = queue.Queue()
+        for item in requests:
+            jobs.put(item)
+
+        def worker():
+            transport = transport_factory()
+            try:
+                while True:
+                    try:
+                        body, headers = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    started = time.perf_counter()
+                    error = None
+                    try:
+                        code, content, probe = transport.post(body, headers)
+                    except Exception as e:
+                        # 进程内模式下视图抛出的异常直接传到这里，相当于服务器返回 500
+                        code, content, probe, error = 'exception', b'{}', Probe(0), '%s: %s' % (type(e).__name__, e)
+                    stats.add((time.perf_counter() - started) * 1000, code, content, probe, error)
+                    if self.progress:
+                        self.progress(name, len(stats.latencies))
+            finally:
+                transport.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, name='agent-%d' % i) for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats.seconds += time.perf_counter() - started
+        return stats.summary()
+
+
+def compare(current, baseline):
+    """两次结果中各阶段关键指标的比值（当前 / 基线），大于 1 表示数值变大"""
+    rows = []
+    for phase in ('enroll', 'steady'):
+        now, before = current['phases'].get(phase), baseline['phases'].get(phase)
+        if not now or not before:
+            continue
+        for label, path in (('throughput_rps', ('throughput_rps',)), ('latency_p50_ms', ('latency_ms', 'p50')),
+                            ('latency_p99_ms', ('latency_ms', 'p99')),
+                            ('queries_per_request', ('queries', 'per_request_mean')),
+                            ('sql_seconds', ('sql_seconds',)), ('locked_errors', ('locks', 'locked_errors')),
+                            ('slow_writes', ('locks', 'slow_writes'))):
+            a, b = now, before
+            for key in path:
+                a, b = a.get(key), b.get(key)
+            ratio = round(a / b, 3) if a is not None and b else None
+            rows.append({'phase': phase, 'metric': label, 'current': a, 'baseline': b, 'ratio': ratio})
+    return rows
@@ -0,0 +1,43 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from assets import models
+from assets.approval import CHUNK_SIZE, ApprovalBatch
+
+
+class Command(BaseCommand):
+    help = '批量审批待审批区中的新资产，整批在一个事务中上线'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='待审批记录的 id')
+        parser.add_argument('--all', action='store_true', help='审批所有未审批的记录')
+        parser.add_argument('--user', help='审批人的用户名')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='每批写入的资产数')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出每条记录的结果')
+
+    def handle(self, *args, **options):
+        ids = options['ids']
+        if options['all']:
+            ids = list(models.NewAssetApprovalZone.objects.filter(approved=False).values_list('id', flat=True))
+        if not ids:
+            raise CommandError('请指定待审批记录的 id，或使用 --all')
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError('用户 %s 不存在' % options['user'])
+
+        def progress(done, total):
+            if not options['json']:
+                self.stdout.write('已写入 %d/%d' % (done, total))
+
+        results = ApprovalBatch(ids, user=user, progress=progress, chunk_size=options['chunk_size']).process()
+        if options['json']:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+            return
+        failed = [result for result in results if result['status'] != 'approved']
+        for result in failed:
+            self.stdout.write('%-8s %-24s %-16s %s' % (result['id'], result['sn'], result['status'], result['message']))
+        self.stdout.write('审批通过 %d 条，失败 %d 条' % (len(results) - len(failed), len(failed)))
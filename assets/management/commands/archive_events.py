@@ -0,0 +1,64 @@
+import datetime
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from assets import event_archive
+
+
+class Command(BaseCommand):
+    help = '把超过保留期的 EventLog 分批移到压缩归档文件中，并可按资产和时间范围查询归档'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='保留最近多少天的事件，默认取 settings.EVENT_ARCHIVE')
+        parser.add_argument('--before', help='归档这个时间之前的事件（ISO 格式），优先于 --days')
+        parser.add_argument('--chunk-size', type=int, help='每批移动的事件数')
+        parser.add_argument('--limit', type=int, help='本次最多移动的事件数')
+        parser.add_argument('--purge', action='store_true', help='同时删除超过保留月数的归档文件')
+        parser.add_argument('--vacuum', action='store_true', help='归档后对 SQLite 数据库执行 VACUUM 回收空间')
+        parser.add_argument('--query', action='store_true', help='查询归档而不是执行归档')
+        parser.add_argument('--asset', type=int, help='查询：资产 id')
+        parser.add_argument('--since', help='查询：开始时间（含）')
+        parser.add_argument('--until', help='查询：结束时间（不含）')
+        parser.add_argument('--stats', action='store_true', help='显示归档文件的统计信息')
+
+    @staticmethod
+    def parse_time(value):
+        if value is None:
+            return None
+        parsed = parse_datetime(value) or parse_datetime(value + 'T00:00:00')
+        if parsed is None:
+            raise CommandError('无法解析的时间：%s' % value)
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    def handle(self, *args, **options):
+        archive = event_archive.EventArchive()
+        try:
+            if options['query']:
+                for event in archive.query(options['asset'], self.parse_time(options['since']),
+                                           self.parse_time(options['until'])):
+                    self.stdout.write(json.dumps(event, ensure_ascii=False))
+                return
+            if options['stats']:
+                self.stdout.write(json.dumps(archive.stats()))
+                return
+            before = self.parse_time(options['before'])
+            if before is None:
+                days = options['days'] if options['days'] is not None else archive.config['RETENTION_DAYS']
+                before = timezone.now() - datetime.timedelta(days=days)
+            started = time.perf_counter()
+            moved = archive.archive(before, options['chunk_size'], options['limit'])
+            self.stdout.write('归档了 %d 条 %s 之前的事件，耗时 %.2fs' % (moved, before.isoformat(),
+                                                                   time.perf_counter() - started))
+            if options['purge']:
+                for name in archive.purge():
+                    self.stdout.write('删除过期归档 %s' % name)
+        finally:
+            archive.close()
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from assets import history
+from assets import models
+
+
+class Command(BaseCommand):
+    help = '资产历史：为尚未记录历史的资产建立初始快照，查看某个时刻的状态或两个时刻之间的差异'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--init', action='store_true', help='为所有资产记录当前状态（已有历史且没有变化的不会写入）')
+        parser.add_argument('--asset', type=int, help='资产 id')
+        parser.add_argument('--at', help='查看资产在该时刻的状态（ISO 格式的日期或时间）')
+        parser.add_argument('--since', help='与 --asset 一起使用，查看从该时刻到 --until（默认为现在）之间的差异')
+        parser.add_argument('--until', help='差异的结束时刻')
+        parser.add_argument('--stats', action='store_true', help='输出历史数据的行数和大小')
+
+    def handle(self, *args, **options):
+        try:
+            if options['init']:
+                self.init()
+            if options['asset'] is not None:
+                self.show(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['stats']:
+            self.stdout.write(json.dumps(history.stats(), indent=2))
+
+    def init(self):
+        asset_ids = list(models.Asset.objects.order_by('id').values_list('id', flat=True))
+        written = 0
+        for start in range(0, len(asset_ids), history.ID_BATCH):
+            written += history.record(asset_ids[start:start + history.ID_BATCH])
+        self.stdout.write('检查了 %d 台资产，写入 %d 个版本' % (len(asset_ids), written))
+
+    def show(self, options):
+        asset_id = options['asset']
+        if options['since']:
+            _, old = history.state_at(asset_id, history.parse_time(options['since']))
+            _, new = history.state_at(asset_id, history.parse_time(options['until']) if options['until'] else None)
+            result = history.compare(old, new)
+        elif options['at']:
+            version, state = history.state_at(asset_id, history.parse_time(options['at']))
+            result = {'version': version, 'state': state}
+        else:
+            result = history.versions(asset_id)
+        self.stdout.write(json.dumps(result, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2))
@@ -0,0 +1,129 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from assets import asset_cache
+from assets import models
+from assets import synthetic
+from assets.approval import ApprovalBatch
+from assets.asset_handler import ReportBatch
+from assets.ingest_queue import percentile
+from assets.loadtest import Probe
+
+
+class Command(BaseCommand):
+    help = '在临时数据库中比较资产详情接口在缓存为空（冷）和已缓存（热）时的延迟，并在修改资产后核对缓存内容'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=2000, help='资产数量')
+        parser.add_argument('--requests', type=int, default=2000, help='混合读写阶段的请求数')
+        parser.add_argument('--write-rate', type=float, default=0.05, help='混合阶段中修改资产的比例')
+        parser.add_argument('--events', type=int, default=20, help='详情中附带的最近事件条数')
+        parser.add_argument('--max-entries', type=int, default=10000, help='缓存最多保存的条目数')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        caches = dict(settings.CACHES, assets={'BACKEND': 'assets.cache_backends.LRUCache', 'LOCATION': 'bench-cache',
+                                               'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': options['max_entries']}})
+        with synthetic.scratch_database(), override_settings(CACHES=caches, ASSET_CACHE={'ALIAS': 'assets'},
+                                                             ALLOWED_HOSTS=['testserver']):
+            result = self.run(options)
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write('%d 台资产，%s' % (result['assets'], result['cache']['backend']))
+        self.stdout.write('%-6s %8s %10s %10s %10s %10s' % ('pass', 'requests', 'p50(ms)', 'p99(ms)', 'mean(ms)',
+                                                          'queries/r'))
+        for row in result['passes']:
+            self.stdout.write('%-6s %8d %10.3f %10.3f %10.3f %10.2f' % (
+                row['pass'], row['requests'], row['p50_ms'], row['p99_ms'], row['mean_ms'], row['queries_per_request']))
+        cache = result['cache']
+        self.stdout.write('命中 %d，未命中 %d，命中率 %s，淘汰 %s；修改 %d 次，缓存内容不一致 %d 次' % (
+            cache['hits'], cache['misses'], cache['hit_rate'], cache['evictions'], result['writes'],
+            result['mismatches']))
+
+    def seed(self, count, rng):
+        reports = [synthetic.make_report('CACHE%06d' % i, rng) for i in range(count)]
+        for start in range(0, count, 200):
+            ReportBatch(reports[start:start + 200]).process()
+        ApprovalBatch(models.NewAssetApprovalZone.objects.values_list('id', flat=True)).process()
+        tags = [models.Tag.objects.create(name=name) for name in ('prod', 'staging', 'db', 'web')]
+        through = models.Asset.tags.through
+        asset_ids = list(models.Asset.objects.values_list('id', flat=True))
+        through.objects.bulk_create([through(asset_id=asset_id, tag_id=tag.id) for asset_id in asset_ids
+                                     for tag in rng.sample(tags, 2)])
+        models.EventLog.objects.bulk_create([
+            models.EventLog(name='event', asset_id=asset_id, event_type=rng.randint(0, 6), detail='detail')
+            for asset_id in asset_ids for _ in range(rng.randint(5, 40))])
+        return reports, asset_ids
+
+    def timed_pass(self, name, client, asset_ids, events):
+        latencies, queries = [], 0
+        for asset_id in asset_ids:
+            url = reverse('assets:asset_detail', args=[asset_id])
+            probe = Probe(0)
+            with probe.watching():
+                started = time.perf_counter()
+                response = client.get(url, {'events': events})
+                latencies.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.content
+            queries += probe.queries
+        latencies.sort()
+        return {'pass': name, 'requests': len(latencies), 'p50_ms': round(percentile(latencies, 50), 3),
+                'p99_ms': round(percentile(latencies, 99), 3), 'mean_ms': round(sum(latencies) / len(latencies), 3),
+                'queries_per_request': round(queries / len(latencies), 2)}
+
+    def run(self, options):
+        rng = random.Random(0)
+        reports, asset_ids = self.seed(options['assets'], rng)
+        # 详情接口只允许管理员访问；每个请求因此多出会话和用户两次查询
+        client = Client()
+        client.force_login(User.objects.create_user('bench', is_staff=True))
+        events = options['events']
+        asset_cache.clear()
+        asset_cache.reset_stats()
+        passes = [self.timed_pass('cold', client, asset_ids, events),
+                  self.timed_pass('warm', client, asset_ids, events)]
+
+        # 混合读写：修改资产后立即读取，缓存中的内容必须与数据库一致；这一阶段直接调用 asset_detail，不经过视图
+        index = {asset_id: i for i, asset_id in enumerate(asset_ids)}
+        sn_to_id = dict(models.Asset.objects.values_list('sn', 'id'))
+        writes, mismatches, latencies, queries = 0, 0, [], 0
+        for _ in range(options['requests']):
+            asset_id = rng.choice(asset_ids)
+            if rng.random() < options['write_rate']:
+                i = index[asset_id]
+                reports[i] = synthetic.mutate_report(reports[i], rng)
+                ReportBatch([reports[i]]).process()
+                asset_id = sn_to_id[reports[i]['sn']]
+                writes += 1
+            probe = Probe(0)
+            with probe.watching():
+                started = time.perf_counter()
+                cached = asset_cache.asset_detail(asset_id, events)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries += probe.queries
+            fresh = asset_cache._load_detail(asset_id)
+            fresh['recent_events'] = asset_cache._load_events(asset_id, events)
+            if cached != fresh:
+                mismatches += 1
+        latencies.sort()
+        passes.append({'pass': 'mixed', 'requests': len(latencies), 'p50_ms': round(percentile(latencies, 50), 3),
+                       'p99_ms': round(percentile(latencies, 99), 3),
+                       'mean_ms': round(sum(latencies) / len(latencies), 3),
+                       'queries_per_request': round(queries / len(latencies), 2)})
+        return {
+            'assets': len(asset_ids),
+            'events_per_detail': events,
+            'passes': passes,
+            'writes': writes,
+            'mismatches': mismatches,
+            'cache': asset_cache.stats(),
+        }
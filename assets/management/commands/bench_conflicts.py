@@ -0,0 +1,101 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from assets import conflicts
+from assets import models
+from assets import synthetic
+
+
+class Command(BaseCommand):
+    help = '在临时数据库中生成带网卡、硬盘和虚拟机的资产，测量地址索引的重建、全量冲突扫描和增量更新的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=100000, help='资产数量')
+        parser.add_argument('--nics', type=int, default=4, help='每台资产的网卡数')
+        parser.add_argument('--disks', type=int, default=8, help='每台资产的硬盘数')
+        parser.add_argument('--vm-rate', type=float, default=0.2, help='虚拟机的比例，虚拟机的第一块网卡与宿主机共用 MAC')
+        parser.add_argument('--changes', type=int, default=1000, help='增量阶段修改网卡 IP 的资产数')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        with synthetic.scratch_database():
+            result = self.run(options)
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write('%d 台资产，地址索引 %d 行' % (result['assets'], result['entries']))
+        for row in result['runs']:
+            self.stdout.write('%-12s %8.3fs  冲突 %s，新增 %s，解除 %s' % (
+                row['run'], row['seconds'], row['conflicts'], row['new'], row['resolved']))
+        self.stdout.write('增量：%d 台资产 %.3fs（每台 %.3fms）；之后全量扫描新增 %d，解除 %d（应均为 0）' % (
+            result['changes'], result['refresh_seconds'], result['refresh_seconds'] * 1000 / max(result['changes'], 1),
+            result['drift']['new'], result['drift']['resolved']))
+
+    def seed(self, options, rng):
+        count = options['assets']
+        for start in range(0, count, 50000):
+            models.Asset.objects.bulk_create([
+                models.Asset(name='conflict-%07d' % i, sn='CONFLICT%07d' % i,
+                             manage_ip='172.%d.%d.%d' % (16 + (i >> 16), (i >> 8) & 255, i & 255))
+                for i in range(start, min(start + 50000, count))
+            ])
+        asset_ids = list(models.Asset.objects.values_list('id', flat=True))
+        hosts = asset_ids[:int(len(asset_ids) * (1 - options['vm_rate']))]
+        for start in range(0, len(hosts), 50000):
+            models.Server.objects.bulk_create([models.Server(asset_id=asset_id)
+                                               for asset_id in hosts[start:start + 50000]])
+        servers = dict(models.Server.objects.values_list('asset_id', 'id'))
+        vms = {asset_id: rng.choice(hosts) for asset_id in asset_ids[len(hosts):]}
+        models.Server.objects.bulk_create([models.Server(asset_id=asset_id, hosted_on_id=servers[host])
+                                           for asset_id, host in vms.items()])
+        macs = {}
+        nics, disks = [], []
+        for asset_id in asset_ids:
+            for n in range(options['nics']):
+                mac = synthetic._mac(rng)
+                if n == 0:
+                    # 虚拟机的第一块网卡与宿主机的 vnet 网卡 MAC 相同，不算冲突
+                    mac = macs[vms[asset_id]] if asset_id in vms else mac
+                    macs[asset_id] = mac
+                nics.append(models.NIC(asset_id=asset_id, name='eth%d' % n, model='virtio', mac=mac,
+                                       ip_address='10.%d.%d.%d' % (rng.randint(0, 255), rng.randint(0, 255),
+                                                                   rng.randint(1, 254))))
+            for n in range(options['disks']):
+                disks.append(models.Disk(asset_id=asset_id, slot=str(n), sn='SN%s' % synthetic._hex(rng, 12),
+                                         model='ST4000NM0025'))
+            if len(nics) >= 50000:
+                models.NIC.objects.bulk_create(nics)
+                models.Disk.objects.bulk_create(disks)
+                nics, disks = [], []
+        models.NIC.objects.bulk_create(nics)
+        models.Disk.objects.bulk_create(disks)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return asset_ids
+
+    @staticmethod
+    def timed(name, func):
+        started = time.perf_counter()
+        result = func()
+        return dict(result, run=name, seconds=round(time.perf_counter() - started, 3))
+
+    def run(self, options):
+        rng = random.Random(0)
+        asset_ids = self.seed(options, rng)
+        runs = [self.timed('rebuild', conflicts.rebuild), self.timed('scan', conflicts.scan)]
+
+        # 增量：网卡换 IP 后按资产刷新，之后的全量扫描不应再发现差异
+        changed = rng.sample(asset_ids, min(options['changes'], len(asset_ids)))
+        for asset_id in changed:
+            models.NIC.objects.filter(asset_id=asset_id, name='eth1').update(
+                ip_address='10.%d.%d.%d' % (rng.randint(0, 255), rng.randint(0, 255), rng.randint(1, 254)))
+        started = time.perf_counter()
+        conflicts.refresh(changed)
+        refresh_seconds = time.perf_counter() - started
+        drift = conflicts.scan()
+        return {'assets': len(asset_ids), 'entries': models.AddressEntry.objects.count(), 'runs': runs,
+                'changes': len(changed), 'refresh_seconds': round(refresh_seconds, 3), 'drift': drift}
@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+PROFILES = ('sqlite', 'sqlite-wal', 'server')
+
+
+class Command(BaseCommand):
+    help = ('用相同的汇报负载（load_test）依次测试各个数据库配置（ASSET_DB_PROFILE），比较吞吐量、延迟和锁竞争；'
+            'server 配置需要先通过 ASSET_DB_* 环境变量指向可用的数据库')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=['sqlite', 'sqlite-wal'])
+        parser.add_argument('--agents', type=int, default=1000, help='模拟客户端数量')
+        parser.add_argument('--concurrency', type=int, default=16, help='同时发出请求的线程数')
+        parser.add_argument('--rounds', type=int, default=2, help='例行汇报的轮数')
+        parser.add_argument('--change-rate', type=float, default=0.1, help='每轮发生硬件变化的客户端比例')
+        parser.add_argument('--mode', choices=('client', 'server'), default='client')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        results = {}
+        for profile in options['profiles']:
+            # 数据库配置在启动时由 settings 决定，每个配置在单独的进程中运行
+            command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'load_test', '--json',
+                       '--agents', str(options['agents']), '--concurrency', str(options['concurrency']),
+                       '--rounds', str(options['rounds']), '--change-rate', str(options['change_rate']),
+                       '--mode', options['mode'], '--seed', str(options['seed'])]
+            env = dict(os.environ, ASSET_DB_PROFILE=profile)
+            process = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if process.returncode:
+                lines = process.stderr.decode('utf-8', 'replace').strip().splitlines()
+                results[profile] = {'error': lines[-1] if lines else 'exit code %d' % process.returncode}
+            else:
+                results[profile] = json.loads(process.stdout.decode('utf-8'))
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write('%-11s %-7s %8s %9s %8s %8s %9s %8s %7s %7s %7s' % (
+            'profile', 'phase', 'requests', 'req/s', 'p50(ms)', 'p99(ms)', 'queries/r', 'sql(s)', 'locked', 'slow_w',
+            'errors'))
+        for profile, result in results.items():
+            if 'error' in result:
+                self.stdout.write('%-11s 运行失败：%s' % (profile, result['error']))
+                continue
+            for name in ('enroll', 'steady'):
+                phase = result['phases'][name]
+                errors = sum(count for code, count in phase['status_codes'].items() if code != '200')
+                self.stdout.write('%-11s %-7s %8d %9.1f %8.1f %8.1f %9.1f %8.2f %7d %7d %7d' % (
+                    profile, name, phase['requests'], phase['throughput_rps'], phase['latency_ms']['p50'],
+                    phase['latency_ms']['p99'], phase['queries']['per_request_mean'], phase['sql_seconds'],
+                    phase['locks']['locked_errors'], phase['locks']['slow_writes'], errors))
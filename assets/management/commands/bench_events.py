@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from assets import events
+from assets import models
+from assets import synthetic
+
+
+class Command(BaseCommand):
+    help = '比较逐条保存、EventRecorder 批量写入和后台写入三种方式记录 EventLog 的速度'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=5000, help='每种方式记录的事件数')
+        parser.add_argument('--per-report', type=int, default=50, help='每次汇报产生的事件数（批量写入的批次大小）')
+        parser.add_argument('--duplicates', type=float, default=0.1, help='重复事件所占的比例')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp()
+        # 使用文件数据库，逐条保存时每次提交都有真实的 fsync 开销
+        with synthetic.scratch_database(os.path.join(workdir, 'bench.sqlite3')):
+            results = self.run(options, workdir)
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write('%-12s %10s %10s %12s' % ('method', 'events', 'seconds', 'events/s'))
+        for row in results:
+            self.stdout.write('%-12s %10d %10.3f %12.0f' % (row['method'], row['events'], row['seconds'],
+                                                          row['events_per_second']))
+
+    def make_events(self, asset, count, duplicates):
+        unique = max(int(count * (1 - duplicates)), 1)
+        return [('%s: hardware_alternation' % asset.name, '内存 DIMM_%d 容量由 16384 变更为 32768' % (i % unique))
+                for i in range(count)]
+
+    def run(self, options, workdir):
+        asset = models.Asset.objects.create(name='bench', sn='BENCH')
+        specs = self.make_events(asset, options['events'], options['duplicates'])
+        per_report = options['per_report']
+        results = []
+
+        def timed(method, func):
+            models.EventLog.objects.all().delete()
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            results.append({'method': method, 'events': len(specs), 'seconds': round(elapsed, 3),
+                            'events_per_second': round(len(specs) / elapsed),
+                            'rows': models.EventLog.objects.count()})
+
+        def per_row():
+            for name, detail in specs:
+                models.EventLog.objects.create(name=name, asset=asset, event_type=1, detail=detail)
+
+        def recorder():
+            for start in range(0, len(specs), per_report):
+                with events.recording() as recorder:
+                    for name, detail in specs[start:start + per_report]:
+                        recorder.record(name, detail, asset=asset, event_type=1)
+
+        def background():
+            writer = events.BackgroundWriter(events.EventJournal(os.path.join(workdir, 'journal.sqlite3')),
+                                             interval=0.2)
+            for start in range(0, len(specs), per_report):
+                recorder = events.EventRecorder()
+                for name, detail in specs[start:start + per_report]:
+                    recorder.record(name, detail, asset=asset, event_type=1)
+                writer.submit(recorder.events())
+            # 计入把日志全部写入 EventLog 的时间
+            writer.stop()
+
+        timed('per_row', per_row)
+        timed('recorder', recorder)
+        timed('background', background)
+        return results
@@ -0,0 +1,124 @@
+import datetime
+import json
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from assets import expiry
+from assets import models
+from assets import synthetic
+from assets.ingest_queue import percentile
+from assets.loadtest import Probe
+
+
+class Command(BaseCommand):
+    help = '在临时数据库中生成资产、合同和软件授权，测量到期日历的重建、增量运行和“即将到期”接口的延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=500000, help='资产数量（每台资产一台服务器）')
+        parser.add_argument('--contracts', type=int, default=2000, help='合同数量')
+        parser.add_argument('--software', type=int, default=20, help='软件（系统版本）种类')
+        parser.add_argument('--changes', type=int, default=200, help='两次运行之间逐台修改 expire_day 的资产数')
+        parser.add_argument('--requests', type=int, default=200, help='每种接口查询的请求数')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        with synthetic.scratch_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+            result = self.run(options)
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write('%d 台资产，%d 个合同，日历共 %d 行' % (options['assets'], options['contracts'],
+                                                         result['entries']))
+        for row in result['runs']:
+            self.stdout.write('%-12s %8.3fs  变化 %d 行，提醒 %s' % (row['run'], row['seconds'], row['changed'],
+                                                           row['notified']))
+        self.stdout.write('%-22s %8s %10s %10s %10s' % ('query', 'rows', 'p50(ms)', 'p99(ms)', 'queries/r'))
+        for row in result['queries']:
+            self.stdout.write('%-22s %8d %10.3f %10.3f %10.2f' % (
+                row['query'], row['rows'], row['p50_ms'], row['p99_ms'], row['queries_per_request']))
+
+    def seed(self, options, rng, today):
+        versions = ['CentOS release 7.%d' % i for i in range(options['software'])]
+        models.Software.objects.bulk_create([models.Software(version=version, license_num=rng.randint(1000, 50000))
+                                             for version in versions])
+        models.Contract.objects.bulk_create([
+            models.Contract(sn='CONTRACT%05d' % i, name='contract-%05d' % i, price=1000,
+                            end_day=today + datetime.timedelta(days=rng.randint(-30, 1800)),
+                            license_num=rng.randint(10, 500) if i % 2 else None)
+            for i in range(options['contracts'])
+        ])
+        contract_ids = list(models.Contract.objects.values_list('id', flat=True))
+        for start in range(0, options['assets'], 50000):
+            models.Asset.objects.bulk_create([
+                models.Asset(name='expiry-%07d' % i, sn='EXP%07d' % i, contract_id=rng.choice(contract_ids),
+                             expire_day=today + datetime.timedelta(days=rng.randint(-30, 1800))
+                             if rng.random() < 0.9 else None)
+                for i in range(start, min(start + 50000, options['assets']))
+            ])
+        asset_ids = list(models.Asset.objects.values_list('id', flat=True))
+        for start in range(0, len(asset_ids), 50000):
+            models.Server.objects.bulk_create([models.Server(asset_id=asset_id, os_release=rng.choice(versions))
+                                               for asset_id in asset_ids[start:start + 50000]])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return asset_ids
+
+    @staticmethod
+    def timed_run(name, refresh):
+        started = time.perf_counter()
+        changed = refresh()
+        counts = expiry.notify()
+        return {'run': name, 'seconds': round(time.perf_counter() - started, 3), 'changed': changed,
+                'notified': counts}
+
+    def timed_queries(self, name, client, params, count):
+        url = reverse('assets:expiring')
+        latencies, queries, rows = [], 0, 0
+        for _ in range(count):
+            probe = Probe(0)
+            with probe.watching():
+                started = time.perf_counter()
+                response = client.get(url, params)
+                latencies.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.content
+            queries += probe.queries
+            rows = sum(response.json()['counts'].values())
+        latencies.sort()
+        return {'query': name, 'rows': rows, 'p50_ms': round(percentile(latencies, 50), 3),
+                'p99_ms': round(percentile(latencies, 99), 3), 'queries_per_request': round(queries / count, 2)}
+
+    def run(self, options):
+        rng = random.Random(0)
+        today = timezone.localdate()
+        asset_ids = self.seed(options, rng, today)
+        runs = [self.timed_run('rebuild', expiry.rebuild),
+                self.timed_run('idle', expiry.refresh_licenses)]
+        # 逐台保存，日历在每次提交后由信号刷新；之后的运行只需统计授权并提醒新进入窗口的行
+        for asset in models.Asset.objects.filter(id__in=rng.sample(asset_ids, options['changes'])):
+            asset.expire_day = today + datetime.timedelta(days=rng.randint(0, 30))
+            asset.save()
+        runs.append(self.timed_run('incremental', expiry.refresh_licenses))
+
+        # 到期接口只允许管理员访问；每个请求因此多出会话和用户两次查询
+        client = Client()
+        client.force_login(User.objects.create_user('bench', is_staff=True))
+        first_page = client.get(reverse('assets:expiring'), {'days': 365}).json()
+        queries = [
+            self.timed_queries('7 days', client, {'days': 7}, options['requests']),
+            self.timed_queries('30 days', client, {'days': 30}, options['requests']),
+            self.timed_queries('365 days', client, {'days': 365}, options['requests']),
+            self.timed_queries('365 days, page 2', client, {'days': 365, 'cursor': first_page['next_cursor']},
+                               options['requests']),
+            self.timed_queries('90 days, license', client, {'days': 90, 'kind': 'license'}, options['requests']),
+            self.timed_queries('30 days + overdue', client, {'days': 30, 'overdue': 1}, options['requests']),
+        ]
+        return {'assets': len(asset_ids), 'entries': models.ExpiryEntry.objects.count(), 'runs': runs,
+                'queries': queries}
@@ -0,0 +1,93 @@
+import json
+import random
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+
+from assets import export
+from assets import models
+from assets import synthetic
+
+SEED_BATCH = 20000
+
+
+def current_rss_mb():
+    """当前进程的常驻内存（MB），读不到 /proc 时退回进程的历史峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 1024.0 / 1024.0
+    except (IOError, OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class Command(BaseCommand):
+    help = '在临时数据库中生成不同规模的资产，记录导出的速度（行/秒）和导出期间的内存峰值'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='资产数量，逗号分隔，依次递增')
+        parser.add_argument('--format', choices=export.FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        with synthetic.scratch_database():
+            results = self.run(sizes, options)
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write('%10s %10s %12s %12s %14s' % ('assets', 'seconds', 'rows/s', 'MB out', 'peak RSS +MB'))
+        for row in results:
+            self.stdout.write('%10d %10.2f %12.0f %12.1f %14.1f' % (
+                row['assets'], row['seconds'], row['rows_per_second'], row['output_mb'], row['peak_rss_delta_mb']))
+
+    def seed(self, start, stop, rng):
+        idc = models.IDC.objects.get_or_create(name='bench-idc')[0]
+        unit = models.BusinessUnit.objects.get_or_create(name='bench-bu')[0]
+        manufacturer = models.Manufacturer.objects.get_or_create(name=synthetic.MANUFACTURERS[0])[0]
+        for offset in range(start, stop, SEED_BATCH):
+            end = min(offset + SEED_BATCH, stop)
+            models.Asset.objects.bulk_create([
+                models.Asset(name='asset-%07d' % i, sn='SN%07d' % i, idc=idc, business_unit=unit,
+                             manufacturer=manufacturer, manage_ip='10.%d.%d.%d' % (i >> 16, (i >> 8) & 255, i & 255))
+                for i in range(offset, end)
+            ])
+            asset_ids = list(models.Asset.objects.filter(sn__gte='SN%07d' % offset, sn__lt='SN%07d' % end)
+                             .values_list('id', flat=True))
+            models.CPU.objects.bulk_create([
+                models.CPU(asset_id=asset_id, cpu_model=rng.choice(synthetic.CPU_MODELS)) for asset_id in asset_ids
+            ])
+            models.RAM.objects.bulk_create([
+                models.RAM(asset_id=asset_id, slot='DIMM%d' % n, capacity=32768)
+                for asset_id in asset_ids for n in range(4)
+            ])
+            models.Disk.objects.bulk_create([
+                models.Disk(asset_id=asset_id, sn='D%d-%d' % (asset_id, n), capacity=894.0)
+                for asset_id in asset_ids for n in range(2)
+            ])
+
+    def run(self, sizes, options):
+        rng = random.Random(0)
+        results, seeded = [], 0
+        for size in sizes:
+            self.seed(seeded, size, rng)
+            seeded = size
+            baseline = peak = current_rss_mb()
+            output = 0
+            started = time.perf_counter()
+            for chunk in export.stream(options['format'], options['gzip'], chunk_size=options['chunk_size']):
+                output += len(chunk)
+                peak = max(peak, current_rss_mb())
+            elapsed = time.perf_counter() - started
+            results.append({
+                'assets': size,
+                'format': options['format'],
+                'gzip': options['gzip'],
+                'seconds': round(elapsed, 3),
+                'rows_per_second': round(size / elapsed),
+                'output_mb': round(output / 1024.0 / 1024.0, 2),
+                'peak_rss_delta_mb': round(peak - baseline, 2),
+            })
+        return results
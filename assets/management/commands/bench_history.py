@@ -0,0 +1,103 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from assets import history
+from assets import models
+from assets import synthetic
+from assets.approval import ApprovalBatch
+from assets.asset_handler import ReportBatch
+from assets.ingest_queue import percentile
+
+
+class Command(BaseCommand):
+    help = '模拟多轮汇报，测量资产历史每轮增加的数据量、还原历史状态和比较差异的耗时，并核对还原结果'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=500, help='资产数量')
+        parser.add_argument('--rounds', type=int, default=60, help='汇报轮数')
+        parser.add_argument('--change-rate', type=float, default=0.05, help='每轮发生硬件变化的资产比例')
+        parser.add_argument('--queries', type=int, default=1000, help='还原历史状态的查询次数')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        with synthetic.scratch_database():
+            result = self.run(options)
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        for key, value in result.items():
+            self.stdout.write('%-28s %s' % (key, value))
+
+    def run(self, options):
+        rng = random.Random(0)
+        reports = [synthetic.make_report('HIST%06d' % i, rng) for i in range(options['assets'])]
+        ReportBatch(reports).process()
+        ApprovalBatch(models.NewAssetApprovalZone.objects.values_list('id', flat=True)).process()
+        asset_ids = dict(models.Asset.objects.values_list('sn', 'id'))
+
+        # 每轮结束时记下时间和抽样资产的真实状态，用来核对还原结果
+        sample = rng.sample(range(len(reports)), min(50, len(reports)))
+        checkpoints = [(timezone.now(), history.load_states([asset_ids[reports[i]['sn']] for i in sample]))]
+        unchanged_growth, changed_growth, changed_reports = 0, 0, 0
+        for _ in range(options['rounds']):
+            before = history.stats()
+            changed = 0
+            for i in range(len(reports)):
+                if rng.random() < options['change_rate']:
+                    reports[i] = synthetic.mutate_report(reports[i], rng)
+                    changed += 1
+            for start in range(0, len(reports), 200):
+                ReportBatch(reports[start:start + 200]).process()
+            after = history.stats()
+            growth = sum(after[name]['bytes'] - before[name]['bytes'] for name in ('snapshots', 'deltas'))
+            if changed:
+                changed_growth += growth
+                changed_reports += changed
+            else:
+                unchanged_growth += growth
+            checkpoints.append((timezone.now(), history.load_states([asset_ids[reports[i]['sn']] for i in sample])))
+
+        # 一轮没有任何变化的汇报，历史数据不应增长
+        before = history.stats()
+        for start in range(0, len(reports), 200):
+            ReportBatch(reports[start:start + 200]).process()
+        after = history.stats()
+        unchanged_growth += sum(after[name]['count'] - before[name]['count'] for name in ('snapshots', 'deltas'))
+
+        latencies, diff_latencies, mismatches = [], [], 0
+        for _ in range(options['queries']):
+            index = rng.choice(sample)
+            asset_id = asset_ids[reports[index]['sn']]
+            at, states = rng.choice(checkpoints)
+            started = time.perf_counter()
+            _, state = history.state_at(asset_id, at)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if state != states.get(asset_id):
+                mismatches += 1
+            other, _ = rng.choice(checkpoints)
+            started = time.perf_counter()
+            history.compare(history.state_at(asset_id, min(at, other))[1], history.state_at(asset_id, max(at, other))[1])
+            diff_latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        diff_latencies.sort()
+        stats = history.stats()
+        return {
+            'assets': len(reports),
+            'rounds': options['rounds'],
+            'changed_reports': changed_reports,
+            'snapshots': stats['snapshots']['count'],
+            'snapshot_bytes': stats['snapshots']['bytes'],
+            'deltas': stats['deltas']['count'],
+            'delta_bytes': stats['deltas']['bytes'],
+            'bytes_per_change': round(changed_growth / changed_reports) if changed_reports else None,
+            'unchanged_growth': unchanged_growth,
+            'state_at_p50_ms': round(percentile(latencies, 50), 3),
+            'state_at_p99_ms': round(percentile(latencies, 99), 3),
+            'diff_p50_ms': round(percentile(diff_latencies, 50), 3),
+            'diff_p99_ms': round(percentile(diff_latencies, 99), 3),
+            'mismatches': mismatches,
+        }
@@ -0,0 +1,97 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from assets import metrics
+from assets import models
+from assets import synthetic
+from assets.approval import ApprovalBatch
+from assets.asset_handler import ReportBatch
+
+MIDDLEWARE = 'assets.metrics.MetricsMiddleware'
+
+
+class Command(BaseCommand):
+    help = '在临时数据库中测量 MetricsMiddleware 在不同抽样比例下给资产接口带来的额外耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=500, help='资产数量')
+        parser.add_argument('--requests', type=int, default=500, help='每种配置的请求数')
+        parser.add_argument('--rounds', type=int, default=5, help='各配置交替运行的轮数，减少机器负载波动的影响')
+        parser.add_argument('--sample-rates', default='1,0.1,0.01', help='逗号分隔的抽样比例')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        rates = [float(rate) for rate in options['sample_rates'].split(',')]
+        with synthetic.scratch_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+            result = self.run(options, rates)
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write('%d 个请求 x %d 轮，请求为资产列表和详情（缓存命中）交替' % (options['requests'], options['rounds']))
+        self.stdout.write('%-14s %12s %12s %10s' % ('config', 'mean(us)', 'best(us)', 'overhead'))
+        for row in result['configs']:
+            self.stdout.write('%-14s %12.1f %12.1f %9.2f%%' % (row['config'], row['mean_us'], row['best_us'],
+                                                              row['overhead_percent']))
+
+    def seed(self, count):
+        rng = random.Random(0)
+        ReportBatch([synthetic.make_report('METRICS%06d' % i, rng) for i in range(count)]).process()
+        ApprovalBatch(models.NewAssetApprovalZone.objects.values_list('id', flat=True)).process()
+        return list(models.Asset.objects.values_list('id', flat=True))
+
+    def run(self, options, rates):
+        asset_ids = self.seed(options['assets'])
+        rng = random.Random(1)
+        urls = []
+        for i in range(options['requests']):
+            if i % 2:
+                urls.append((reverse('assets:asset_list'), {'limit': 5}))
+            else:
+                urls.append((reverse('assets:asset_detail', args=[rng.choice(asset_ids)]), {}))
+
+        base = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+        configs = [('off', base, {})]
+        configs += [('sample=%g' % rate, [MIDDLEWARE] + base, {'SAMPLE_RATE': rate}) for rate in rates]
+        # 资产接口只允许管理员访问
+        user = User.objects.create_user('bench', is_staff=True)
+        clients = []
+        for name, middleware, config in configs:
+            # 中间件在第一次请求时按当时的配置创建，之后一直沿用
+            with override_settings(MIDDLEWARE=middleware, ASSET_METRICS=config):
+                client = Client()
+                client.force_login(user)
+                client.get(*urls[0])
+            clients.append((name, client))
+        # 先完整请求一遍，填满详情缓存
+        for url, params in urls:
+            clients[0][1].get(url, params)
+
+        # 每个请求依次用各个配置发出，机器负载的波动对各配置的影响相同
+        totals = {name: [] for name, _ in clients}
+        for _ in range(options['rounds']):
+            metrics.registry.reset()
+            elapsed = {name: 0.0 for name, _ in clients}
+            for i, (url, params) in enumerate(urls):
+                # 轮换各配置的先后顺序，抵消同一请求连续执行时先后位置带来的差异
+                for name, client in clients[i % len(clients):] + clients[:i % len(clients)]:
+                    started = time.perf_counter()
+                    response = client.get(url, params)
+                    elapsed[name] += time.perf_counter() - started
+                    assert response.status_code == 200, response.content
+            for name in elapsed:
+                totals[name].append(elapsed[name] / len(urls) * 1000000)
+        baseline = sum(totals['off'])
+        rows = []
+        for name, _ in clients:
+            rows.append({'config': name, 'mean_us': round(sum(totals[name]) / len(totals[name]), 1),
+                         'best_us': round(min(totals[name]), 1),
+                         'overhead_percent': round((sum(totals[name]) / baseline - 1) * 100, 2)})
+        return {'requests': options['requests'], 'rounds': options['rounds'], 'configs': rows}
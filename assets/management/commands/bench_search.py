@@ -0,0 +1,106 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from assets import models
+from assets import search
+from assets import synthetic
+from assets.ingest_queue import percentile
+
+
+class Command(BaseCommand):
+    help = '在临时数据库中生成资产数据，比较内存索引、FTS5 和 ORM 三种搜索方式的延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=200000, help='资产数量')
+        parser.add_argument('--queries', type=int, default=1000, help='索引 / FTS5 的查询次数')
+        parser.add_argument('--orm-queries', type=int, default=50, help='ORM 查询很慢，单独设置次数')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        # 切换到临时的测试数据库，不影响正式数据
+        with synthetic.scratch_database():
+            results = self.run(options)
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write('%d 台资产，索引构建 %.2fs' % (options['assets'], results['build_seconds']))
+        self.stdout.write('%-6s %8s %10s %10s %10s' % ('source', 'queries', 'p50(ms)', 'p99(ms)', 'max(ms)'))
+        for row in results['sources']:
+            self.stdout.write('%-6s %8d %10.3f %10.3f %10.3f' % (
+                row['source'], row['queries'], row['p50_ms'], row['p99_ms'], row['max_ms']))
+
+    def seed(self, count, rng):
+        tag_names = ['prod', 'staging', 'db', 'web', 'cache', 'hadoop', 'k8s-node', 'backup']
+        models.Tag.objects.bulk_create([models.Tag(name=name) for name in tag_names])
+        tag_ids = list(models.Tag.objects.values_list('id', flat=True))
+        models.Asset.objects.bulk_create([
+            models.Asset(name='%s-%s-%05d' % (rng.choice(('web', 'db', 'cache', 'app')), rng.choice(('bj', 'sh', 'gz')), i),
+                         sn='SN%08d' % i, manage_ip='10.%d.%d.%d' % (i >> 16, (i >> 8) & 255, i & 255))
+            for i in range(count)
+        ])
+        asset_ids = list(models.Asset.objects.values_list('id', flat=True))
+        models.NIC.objects.bulk_create([
+            models.NIC(asset_id=asset_id, name='eth%d' % n, model=rng.choice(synthetic.NIC_MODELS),
+                       mac=synthetic._mac(rng), ip_address='172.%d.%d.%d' % (16 + n, asset_id >> 8 & 255, asset_id & 255))
+            for asset_id in asset_ids for n in range(2)
+        ])
+        models.CPU.objects.bulk_create([
+            models.CPU(asset_id=asset_id, cpu_model=rng.choice(synthetic.CPU_MODELS)) for asset_id in asset_ids
+        ])
+        through = models.Asset.tags.through
+        through.objects.bulk_create([
+            through(asset_id=asset_id, tag_id=rng.choice(tag_ids)) for asset_id in asset_ids
+        ])
+        return asset_ids
+
+    def make_queries(self, count, rng):
+        queries = []
+        macs = list(models.NIC.objects.values_list('mac', flat=True)[:10000])
+        for _ in range(count):
+            i = rng.randrange(self.assets)
+            queries.append(rng.choice((
+                'SN%08d' % i,
+                'SN%06d' % (i // 100),
+                '10.%d.%d' % (i >> 16, (i >> 8) & 255),
+                rng.choice(macs)[:8],
+                '%s %s' % (rng.choice(('web', 'db')), rng.choice(('bj', 'sh'))),
+                'xeon gold prod',
+            )))
+        return queries
+
+    @staticmethod
+    def measure(func, queries, limit):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            func(query, limit)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {
+            'queries': len(timings),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'max_ms': round(timings[-1], 3),
+        }
+
+    def run(self, options):
+        rng = random.Random(0)
+        self.assets = options['assets']
+        self.seed(self.assets, rng)
+        queries = self.make_queries(options['queries'], rng)
+
+        started = time.perf_counter()
+        index = search.SearchIndex()
+        index.build()
+        results = {'build_seconds': round(time.perf_counter() - started, 3), 'sources': []}
+        results['sources'].append(dict(source='index', **self.measure(index.search, queries, options['limit'])))
+        if search.fts_available():
+            search.fts_rebuild()
+            results['sources'].append(dict(source='fts', **self.measure(search.fts_search, queries, options['limit'])))
+        results['sources'].append(dict(source='orm', **self.measure(
+            search.orm_search, queries[:options['orm_queries']], options['limit'])))
+        return results
@@ -0,0 +1,79 @@
+import json
+import random
+import time
+import urllib.parse
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+
+from assets import synthetic
+from assets import wire
+
+
+def legacy_encode(data):
+    return urllib.parse.urlencode({'asset_data': json.dumps(data)}).encode()
+
+
+def legacy_decode(body):
+    return json.loads(QueryDict(body.decode('utf-8')).get('asset_data'))
+
+
+class Command(BaseCommand):
+    help = '比较各种汇报格式的数据大小和服务器端解码耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reports', type=int, default=200, help='模拟汇报的数量')
+        parser.add_argument('--rams', type=int, default=16)
+        parser.add_argument('--disks', type=int, default=24)
+        parser.add_argument('--nics', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=3, help='解码重复次数，取最快的一次')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        reports = [synthetic.make_report('SN%06d' % i, rng, options['rams'], options['disks'], options['nics'])
+                   for i in range(options['reports'])]
+        formats = [('v1 form', legacy_encode, legacy_decode)]
+        content_types = ['application/json']
+        if wire.msgpack is not None:
+            content_types.append('application/msgpack')
+        for content_type in content_types:
+            for encoding in ('identity', 'deflate', 'gzip'):
+                formats.append((
+                    'v2 %s %s' % (content_type.split('/')[1], encoding),
+                    lambda data, ct=content_type, ce=encoding: wire.encode_body(data, ct, ce),
+                    lambda body, ct=content_type, ce=encoding: wire.decode_body(body, ct, ce),
+                ))
+
+        results = []
+        baseline = None
+        for name, encode, decode in formats:
+            bodies = [encode(data) for data in reports]
+            size = sum(len(body) for body in bodies) / len(bodies)
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                for body in bodies:
+                    decode(body)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            decode_us = best / len(bodies) * 1e6
+            if baseline is None:
+                baseline = (size, decode_us)
+            results.append({
+                'format': name,
+                'avg_bytes': round(size),
+                'size_ratio': round(size / baseline[0], 3),
+                'decode_us': round(decode_us, 1),
+                'decode_ratio': round(decode_us / baseline[1], 3),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write('%d 份汇报，每份 %d 条内存 / %d 块硬盘 / %d 块网卡' % (
+            len(reports), options['rams'], options['disks'], options['nics']))
+        self.stdout.write('%-26s %10s %8s %12s %8s' % ('format', 'bytes', 'size', 'decode(us)', 'decode'))
+        for row in results:
+            self.stdout.write('%-26s %10d %7.1f%% %12.1f %7.1f%%' % (
+                row['format'], row['avg_bytes'], row['size_ratio'] * 100, row['decode_us'], row['decode_ratio'] * 100))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assets import expiry
+
+
+class Command(BaseCommand):
+    help = '刷新到期日历中的软件授权，并为进入提醒窗口的保修、合同和授权成批记录提醒事件；可由 cron 定期运行'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='先按资产和合同表整体比对日历（批量修改 expire_day / end_day 之后使用）')
+        parser.add_argument('--days', type=int, help='提醒窗口的天数，默认取 settings.ASSET_EXPIRY')
+        parser.add_argument('--no-notify', action='store_true', help='只刷新日历，不记录提醒事件')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['rebuild']:
+            changed = expiry.rebuild()
+        else:
+            changed = expiry.refresh_licenses()
+        self.stdout.write('到期日历更新了 %d 行，耗时 %.2fs' % (changed, time.perf_counter() - started))
+        if options['no_notify']:
+            return
+        started = time.perf_counter()
+        counts = expiry.notify(days=options['days'])
+        self.stdout.write('记录提醒：保修 %(warranty)d 条，合同 %(contract)d 条，授权 %(license)d 条' % counts
+                          + '，耗时 %.2fs' % (time.perf_counter() - started))
@@ -0,0 +1,26 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from assets import export
+
+
+class Command(BaseCommand):
+    help = '流式导出全量资产清单（CSV / JSONL），可选 gzip 压缩'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=export.FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true', help='边导出边 gzip 压缩')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE, help='每批从数据库读取的行数')
+        parser.add_argument('-o', '--output', help='输出文件，默认写到标准输出')
+
+    def handle(self, *args, **options):
+        chunks = export.stream(options['format'], options['gzip'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
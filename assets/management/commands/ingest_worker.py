@@ -0,0 +1,52 @@
+import json
+import multiprocessing
+import time
+
+from django import db
+from django.core.management.base import BaseCommand
+
+from assets import ingest_queue
+
+
+def run_worker(batch_size, poll_interval, once):
+    queue = ingest_queue.IngestQueue()
+    while True:
+        processed = ingest_queue.process_batch(queue, batch_size)
+        if processed:
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+class Command(BaseCommand):
+    help = '启动工作进程池，从异步队列中按批次取出资产汇报并入库'
+
+    def add_arguments(self, parser):
+        config = ingest_queue.get_config()
+        parser.add_argument('--workers', type=int, default=config['WORKERS'], help='工作进程数量')
+        parser.add_argument('--batch-size', type=int, default=config['BATCH_SIZE'], help='每个事务处理的汇报数量')
+        parser.add_argument('--once', action='store_true', help='队列清空后退出')
+        parser.add_argument('--stats', action='store_true', help='只打印队列统计信息')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(ingest_queue.IngestQueue().stats(), indent=2))
+            return
+        poll_interval = ingest_queue.get_config()['POLL_INTERVAL']
+        worker_args = (options['batch_size'], poll_interval, options['once'])
+        if options['workers'] <= 1:
+            run_worker(*worker_args)
+            return
+        # 子进程各自建立数据库连接
+        db.connections.close_all()
+        processes = [multiprocessing.Process(target=run_worker, args=worker_args) for _ in range(options['workers'])]
+        for process in processes:
+            process.start()
+        self.stdout.write('已启动 %s 个工作进程' % len(processes))
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
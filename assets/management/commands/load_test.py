@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from assets import loadtest
+from assets import synthetic
+
+
+class Command(BaseCommand):
+    help = '模拟大量客户端并发汇报，测量汇报接口的吞吐量、延迟分位数、SQL 查询数和锁竞争，结果可保存为 JSON 以便跨版本比较'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=2000, help='模拟客户端数量')
+        parser.add_argument('--concurrency', type=int, default=32, help='同时发出请求的线程数')
+        parser.add_argument('--rounds', type=int, default=3, help='例行汇报的轮数')
+        parser.add_argument('--change-rate', type=float, default=0.05, help='每轮发生硬件变化的客户端比例')
+        parser.add_argument('--mode', choices=('client', 'server'), default='client',
+                            help='client：经 Django 测试客户端在进程内处理；server：发给本机启动的 HTTP 服务器')
+        parser.add_argument('--slow-write-ms', type=float, default=50, help='超过该耗时的写语句计为一次锁等待')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='把结果保存为 JSON 文件')
+        parser.add_argument('--compare', help='与之前保存的结果比较')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError('无法读取基线结果：%s' % e)
+
+        workdir = tempfile.mkdtemp()
+        # 多个线程各自持有连接，SQLite 测试库必须是文件数据库
+        with synthetic.scratch_database(os.path.join(workdir, 'loadtest.sqlite3')):
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost', '127.0.0.1']):
+                result = loadtest.LoadTest(
+                    agents=options['agents'], concurrency=options['concurrency'], rounds=options['rounds'],
+                    change_rate=options['change_rate'], mode=options['mode'],
+                    slow_write_ms=options['slow_write_ms'], seed=options['seed']).run()
+
+        if baseline is not None:
+            result['comparison'] = loadtest.compare(result, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.print_summary(result)
+
+    def print_summary(self, result):
+        meta = result['meta']
+        self.stdout.write('%s 模式，%d 个客户端，%d 个并发线程，%d 轮例行汇报，变化比例 %.0f%%（%s / %s，版本 %s）' % (
+            meta['mode'], meta['agents'], meta['concurrency'], meta['rounds'], meta['change_rate'] * 100,
+            meta['database'], meta['db_profile'], meta['revision']))
+        self.stdout.write('%-8s %8s %9s %8s %8s %8s %9s %8s %7s %7s %s' % (
+            'phase', 'requests', 'req/s', 'p50(ms)', 'p90(ms)', 'p99(ms)', 'queries/r', 'sql(s)', 'locked',
+            'slow_w', 'codes'))
+        for name in ('enroll', 'steady'):
+            phase = result['phases'][name]
+            self.stdout.write('%-8s %8d %9.1f %8.1f %8.1f %8.1f %9.1f %8.2f %7d %7d %s' % (
+                name, phase['requests'], phase['throughput_rps'], phase['latency_ms']['p50'],
+                phase['latency_ms']['p90'], phase['latency_ms']['p99'], phase['queries']['per_request_mean'],
+                phase['sql_seconds'], phase['locks']['locked_errors'], phase['locks']['slow_writes'],
+                phase['status_codes']))
+        approve = result['phases']['approve']
+        self.stdout.write('approve  %d 台资产，%.2fs，%.1f 台/s' % (approve['assets'], approve['seconds'],
+                                                              approve['assets_per_second'] or 0))
+        for row in result.get('comparison', ()):
+            self.stdout.write('%-8s %-20s %12s %12s %8s' % (row['phase'], row['metric'], row['current'],
+                                                            row['baseline'], row['ratio']))
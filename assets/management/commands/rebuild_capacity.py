@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assets import capacity
+
+
+class Command(BaseCommand):
+    help = '在数据库中整体重算每台资产的容量贡献和按机房 / 业务线 / 全局的容量汇总'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rollups-only', action='store_true', help='只由现有的资产贡献重算汇总表')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['rollups_only']:
+            capacity.rebuild_rollups()
+        else:
+            capacity.rebuild()
+        self.stdout.write('容量汇总重算完成，耗时 %.2fs' % (time.perf_counter() - started))
@@ -0,0 +1,30 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from assets import conflicts
+
+
+class Command(BaseCommand):
+    help = '在地址索引上全量检测重复的 IP、MAC 和序列号，并同步冲突表；--rebuild 先从资产和组件表重建地址索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='先整体重建地址索引（初始化或修改 IGNORE 之后）')
+        parser.add_argument('--show', type=int, default=0, help='列出涉及资产最多的前 N 条冲突')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = conflicts.rebuild() if options['rebuild'] else conflicts.scan()
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        if options['show']:
+            result['top'] = conflicts.conflicts(limit=options['show'])[1]
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+            return
+        self.stdout.write('冲突：IP %(ip)d 个，MAC %(mac)d 个，序列号 %(sn)d 个' % result['conflicts']
+                          + '；新增 %d，解除 %d，耗时 %.2fs' % (result['new'], result['resolved'], result['seconds']))
+        for row in result.get('top', []):
+            self.stdout.write('%-4s %-40s %s' % (row['kind'], row['value'], ', '.join(
+                '%s(%s)' % (asset['name'], '/'.join(asset['sources'])) for asset in row['assets'])))
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+请求和 SQL 的进程内统计，以 Prometheus 文本格式从 /metrics 输出。
+
+MetricsMiddleware 记录每个视图的请求数（按方法和状态码），并对抽样的请求额外记录：
+耗时直方图、执行的 SQL 条数和 SQL 总耗时（在所有数据库连接上安装 execute_wrapper 统计）。
+超过 SLOW_QUERY_MS 的语句记下调用位置（项目代码中最近的一帧），只保留最慢的 SLOW_QUERIES 条。
+统计只保存在本进程的内存中，进程重启后清零；多进程部署时 Prometheus 需要分别抓取每个进程。
+
+SAMPLE_RATE 为抽样比例：未抽中的请求只累加一次请求数，生产环境调低抽样比例可以把开销控制在 2% 以内
+（`manage.py bench_metrics` 测量不同抽样比例下的开销）。
+"""
+
+import random
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+DEFAULTS = {
+    'ENABLED': True,
+    # 详细统计（耗时直方图、SQL）的抽样比例，0 ~ 1
+    'SAMPLE_RATE': 1.0,
+    # 超过该耗时（毫秒）的语句记录调用位置
+    'SLOW_QUERY_MS': 100,
+    # 保留最慢的多少条语句
+    'SLOW_QUERIES': 20,
+}
+
+# 请求耗时直方图的分桶上限（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_MAX_LENGTH = 300
+
+_django_dir = sys.modules['django'].__path__[0]
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ASSET_METRICS', {}))
+    return config
+
+
+def call_site():
+    """调用栈中最近的一帧项目代码（不含 Django 和本模块），返回 '文件:行号 函数名'"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(settings.BASE_DIR) and not filename.startswith(_django_dir)
+                and filename != __file__ and 'site-packages' not in filename):
+            return '%s:%d %s' % (filename[len(settings.BASE_DIR):].lstrip('/'), frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+class Registry(object):
+    """进程内的统计数据，所有修改都在锁内完成，每个请求结束时合并一次"""
+
+    def __init__(self, slow_queries=DEFAULTS['SLOW_QUERIES']):
+        self.slow_queries = slow_queries
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # (视图, 方法, 状态码) -> 请求数
+            self.requests = {}
+            # (视图, 方法) -> [各分桶的计数..., 总数, 耗时总和]
+            self.latency = {}
+            # 视图 -> [SQL 条数, SQL 耗时]
+            self.sql = {}
+            # (语句, 调用位置) -> {'max', 'count', 'view'}
+            self.slow = {}
+            # 最慢语句表已满时，新语句至少要超过这个耗时才会被记录
+            self.slow_floor = 0.0
+
+    def count_request(self, view, method, status):
+        key = (view, method, status)
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def observe(self, view, method, status, seconds, recorder):
+        with self.lock:
+            key = (view, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            row = self.latency.get((view, method))
+            if row is None:
+                row = self.latency[(view, method)] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += 1
+            row[-1] += seconds
+            sql = self.sql.get(view)
+            if sql is None:
+                sql = self.sql[view] = [0, 0.0]
+            sql[0] += recorder.queries
+            sql[1] += recorder.seconds
+            for duration, statement, site in recorder.slow:
+                self._add_slow(duration, statement, site, view)
+
+    def _add_slow(self, seconds, statement, site, view):
+        key = (statement, site)
+        entry = self.slow.get(key)
+        if entry is None:
+            if len(self.slow) >= self.slow_queries and seconds <= self.slow_floor:
+                return
+            entry = self.slow[key] = {'max': 0.0, 'count': 0, 'view': view}
+        entry['count'] += 1
+        if seconds > entry['max']:
+            entry['max'], entry['view'] = seconds, view
+        if len(self.slow) > self.slow_queries:
+            slowest = sorted(self.slow.items(), key=lambda item: item[1]['max'], reverse=True)[:self.slow_queries]
+            self.slow = dict(slowest)
+        if len(self.slow) >= self.slow_queries:
+            self.slow_floor = min(entry['max'] for entry in self.slow.values())
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'latency': {key: list(row) for key, row in self.latency.items()},
+                'sql': {key: list(row) for key, row in self.sql.items()},
+                'slow': sorted(({'sql': statement, 'site': site, 'max_seconds': entry['max'], 'count': entry['count'],
+                                 'view': entry['view']} for (statement, site), entry in self.slow.items()),
+                               key=lambda item: item['max_seconds'], reverse=True),
+            }
+
+
+registry = Registry()
+
+
+class QueryRecorder(object):
+    """一个请求中执行的 SQL，作为 execute_wrapper 安装在所有连接上"""
+
+    def __init__(self, slow_seconds, floor):
+        self.slow_seconds = slow_seconds
+        self.floor = floor
+        self.queries = 0
+        self.seconds = 0.0
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.seconds += elapsed
+            # 只有慢语句才查找调用位置，普通语句只多两次计时
+            if elapsed >= self.slow_seconds and elapsed > self.floor:
+                self.slow.append((elapsed, sql[:SQL_MAX_LENGTH], call_site()))
+
+
+class MetricsMiddleware(object):
+    """放在 MIDDLEWARE 的最前面，统计的耗时包含其余中间件"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = get_config()
+        self.enabled = config['ENABLED']
+        self.sample_rate = config['SAMPLE_RATE']
+        self.slow_seconds = config['SLOW_QUERY_MS'] / 1000
+        registry.slow_queries = config['SLOW_QUERIES']
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            response = self.get_response(request)
+            registry.count_request(view_name(request), request.method, response.status_code)
+            return response
+        recorder = QueryRecorder(self.slow_seconds, registry.slow_floor)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            started = time.perf_counter()
+            response = self.get_response(request)
+            elapsed = time.perf_counter() - started
+        # 流式响应（例如导出）只统计到开始返回数据为止
+        registry.observe(view_name(request), request.method, response.status_code, elapsed, recorder)
+        return response
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # 没有匹配到路由的请求（404）合并为一项，避免按 URL 产生大量标签
+        return '<unresolved>'
+    return match.view_name
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (key, _label(value)) for key, value in labels.items())
+
+
+def render(snapshot=None):
+    """Prometheus 文本格式"""
+    snapshot = snapshot or registry.snapshot()
+    lines = [
+        '# HELP asset_http_requests_total Requests by view, method and status (all requests).',
+        '# TYPE asset_http_requests_total counter',
+    ]
+    for (view, method, status), count in sorted(snapshot['requests'].items()):
+        lines.append('asset_http_requests_total%s %d' % (_labels(view=view, method=method, status=status), count))
+
+    lines += ['# HELP asset_http_request_duration_seconds Latency of sampled requests.',
+              '# TYPE asset_http_request_duration_seconds histogram']
+    for (view, method), row in sorted(snapshot['latency'].items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, row):
+            cumulative += count
+            lines.append('asset_http_request_duration_seconds_bucket%s %d' % (
+                _labels(view=view, method=method, le=repr(bound)), cumulative))
+        lines.append('asset_http_request_duration_seconds_bucket%s %d' % (
+            _labels(view=view, method=method, le='+Inf'), row[-2]))
+        lines.append('asset_http_request_duration_seconds_sum%s %.6f' % (_labels(view=view, method=method), row[-1]))
+        lines.append('asset_http_request_duration_seconds_count%s %d' % (_labels(view=view, method=method), row[-2]))
+
+    lines += ['# HELP asset_db_queries_total SQL statements executed by sampled requests.',
+              '# TYPE asset_db_queries_total counter']
+    for view, (queries, _) in sorted(snapshot['sql'].items()):
+        lines.append('asset_db_queries_total%s %d' % (_labels(view=view), queries))
+    lines += ['# HELP asset_db_query_duration_seconds_total SQL time of sampled requests.',
+              '# TYPE asset_db_query_duration_seconds_total counter']
+    for view, (_, seconds) in sorted(snapshot['sql'].items()):
+        lines.append('asset_db_query_duration_seconds_total%s %.6f' % (_labels(view=view), seconds))
+
+    lines += ['# HELP asset_db_slow_query_seconds Slowest statements with their call sites.',
+              '# TYPE asset_db_slow_query_seconds gauge']
+    for item in snapshot['slow']:
+        lines.append('asset_db_slow_query_seconds%s %.6f' % (
+            _labels(view=item['view'], site=item['site'] or '', sql=item['sql']), item['max_seconds']))
+
+    lines += ['# HELP asset_metrics_sample_rate Fraction of requests with detailed metrics.',
+              '# TYPE asset_metrics_sample_rate gauge',
+              'asset_metrics_sample_rate %s' % get_config()['SAMPLE_RATE']]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,322 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Asset',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset_type', models.CharField(choices=[('server', 'server_device'), ('networkdevice', 'network_device'), ('storagedevice', 'stroage_device'), ('securitydevice', 'security_device'), ('software', 'software_device')], default='server', max_length=64, verbose_name='asset_type')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='asset_name')),
+                ('sn', models.CharField(max_length=128, unique=True, verbose_name='asset_serial_number')),
+                ('status', models.SmallIntegerField(choices=[(0, 'online'), (1, 'offline'), (2, 'unknown'), (3, 'fault'), (4, 'backup')], default=0, verbose_name='device_condition')),
+                ('manage_ip', models.GenericIPAddressField(blank=True, null=True, verbose_name='manage_ip')),
+                ('purchase_day', models.DateField(blank=True, null=True, verbose_name='purchase_day')),
+                ('expire_day', models.DateField(blank=True, null=True, verbose_name='expire_day')),
+                ('price', models.FloatField(blank=True, null=True, verbose_name='price')),
+                ('memo', models.TextField(blank=True, null=True, verbose_name='comment')),
+                ('c_time', models.DateTimeField(auto_now_add=True, verbose_name='create_date')),
+                ('m_time', models.DateTimeField(auto_now=True, verbose_name='update_time')),
+                ('admin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='admin', to=settings.AUTH_USER_MODEL, verbose_name='asset_admin')),
+                ('approved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='approved_by', to=settings.AUTH_USER_MODEL, verbose_name='approver')),
+            ],
+            options={
+                'verbose_name': 'asset_table',
+                'verbose_name_plural': 'asset_table',
+                'ordering': ['-c_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Contract',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sn', models.CharField(max_length=128, unique=True, verbose_name='contract_serial_number')),
+                ('name', models.CharField(max_length=64, verbose_name='contract_name')),
+                ('memo', models.TextField(blank=True, null=True, verbose_name='comment')),
+                ('price', models.IntegerField(verbose_name='contract_price')),
+                ('detail', models.TextField(blank=True, null=True, verbose_name='contract_detail')),
+                ('start_day', models.DateField(blank=True, null=True, verbose_name='contract_start_day')),
+                ('end_day', models.DateField(blank=True, null=True, verbose_name='contract_end_day')),
+                ('license_num', models.IntegerField(blank=True, null=True, verbose_name='license_number')),
+                ('c_day', models.DateField(auto_now_add=True, verbose_name='create_time')),
+                ('m_day', models.DateField(auto_now=True, verbose_name='update_time')),
+            ],
+            options={
+                'verbose_name': 'contract',
+                'verbose_name_plural': 'contract',
+            },
+        ),
+        migrations.CreateModel(
+            name='IDC',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='idc_name')),
+                ('memo', models.CharField(blank=True, max_length=128, null=True, verbose_name='comment')),
+            ],
+            options={
+                'verbose_name': 'idc',
+                'verbose_name_plural': 'idc',
+            },
+        ),
+        migrations.CreateModel(
+            name='Manufacturer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='manufacturer_name')),
+                ('telephone', models.CharField(blank=True, max_length=30, null=True, verbose_name='support_telephone')),
+                ('memo', models.CharField(blank=True, max_length=128, null=True, verbose_name='comment')),
+            ],
+            options={
+                'verbose_name': 'manufacturer',
+                'verbose_name_plural': 'manufacturer',
+            },
+        ),
+        migrations.CreateModel(
+            name='NewAssetApprovalZone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sn', models.CharField(max_length=128, unique=True, verbose_name='asset_serial_number')),
+                ('asset_type', models.CharField(blank=True, choices=[('server', 'server'), ('networkdevice', 'networkdevice'), ('storagedevice', 'storagedevice'), ('securitydevice', 'securitydevice'), ('IDC', 'IDC'), ('software', 'software')], default='server', max_length=64, null=True, verbose_name='asset_type')),
+                ('manufacturer', models.CharField(blank=True, max_length=64, null=True, verbose_name='manufacturer')),
+                ('model', models.CharField(blank=True, max_length=128, null=True, verbose_name='model')),
+                ('ram_size', models.PositiveIntegerField(blank=True, null=True, verbose_name='ram_size')),
+                ('cpu_model', models.CharField(blank=True, max_length=128, null=True, verbose_name='cpu_model')),
+                ('cpu_count', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('cpu_core_count', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('os_distribution', models.CharField(blank=True, max_length=64, null=True)),
+                ('os_type', models.CharField(blank=True, max_length=64, null=True)),
+                ('os_release', models.CharField(blank=True, max_length=64, null=True)),
+                ('data', models.TextField(verbose_name='asset_data')),
+                ('c_time', models.DateTimeField(auto_now_add=True, verbose_name='create_time')),
+                ('m_time', models.DateTimeField(auto_now=True, verbose_name='update_time')),
+                ('approved', models.BooleanField(default=False, verbose_name='approve')),
+            ],
+            options={
+                'verbose_name': 'new_asset_approval',
+                'verbose_name_plural': 'new_asset_approval',
+                'ordering': ['-c_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Software',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sub_asset_type', models.SmallIntegerField(choices=[(0, 'operation_system'), (1, 'office\\development_software'), (2, 'business_software')], default=0, verbose_name='software_type')),
+                ('license_num', models.IntegerField(default=1, verbose_name='license_number')),
+                ('version', models.CharField(help_text='example: CentOS release 6.7 (Final)', max_length=64, unique=True, verbose_name='software/system_version')),
+            ],
+            options={
+                'verbose_name': 'software/system',
+                'verbose_name_plural': 'software/system',
+            },
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True, verbose_name='tag_name')),
+                ('c_day', models.DateField(auto_now_add=True, verbose_name='create_day')),
+            ],
+            options={
+                'verbose_name': 'tag',
+                'verbose_name_plural': 'tag',
+            },
+        ),
+        migrations.CreateModel(
+            name='StorageDevice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sub_asset_type', models.SmallIntegerField(choices=[(0, 'disk_array'), (1, 'network_storage'), (2, 'tape_library'), (4, 'tape_machine')], default=0, verbose_name='storage_device_type')),
+                ('asset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='assets.Asset')),
+            ],
+            options={
+                'verbose_name': 'storage_device',
+                'verbose_name_plural': 'storage_device',
+            },
+        ),
+        migrations.CreateModel(
+            name='Server',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sub_asset_type', models.SmallIntegerField(choices=[(0, 'pc_server'), (1, 'blade_computer'), (2, 'mini+computer')], default=0, verbose_name='server_type')),
+                ('created_by', models.CharField(choices=[('auto', 'auto_record'), ('manual', 'manual_record')], default='auto', max_length=32, verbose_name='create_type')),
+                ('model', models.CharField(blank=True, max_length=128, null=True, verbose_name='server_model')),
+                ('raid_type', models.CharField(blank=True, max_length=512, null=True, verbose_name='raid_type')),
+                ('os_type', models.CharField(blank=True, max_length=64, null=True, verbose_name='os_type')),
+                ('os_distribution', models.CharField(blank=True, max_length=64, null=True, verbose_name='os_distribution_version')),
+                ('os_release', models.CharField(blank=True, max_length=64, null=True, verbose_name='os_release_version')),
+                ('asset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='assets.Asset')),
+                ('hosted_on', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='hosted_on_server', to='assets.Server', verbose_name='host_machine')),
+            ],
+            options={
+                'verbose_name': 'server',
+                'verbose_name_plural': 'server',
+            },
+        ),
+        migrations.CreateModel(
+            name='SecurityDevice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sub_asset_type', models.SmallIntegerField(choices=[(0, 'firewall'), (1, 'intrusion_detect_system'), (2, 'internet_gateway'), (4, 'maintance_system')], default=0, verbose_name='security_device_type')),
+                ('asset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='assets.Asset')),
+            ],
+            options={
+                'verbose_name': 'security_device',
+                'verbose_name_plural': 'security_device',
+            },
+        ),
+        migrations.CreateModel(
+            name='NetworkDevice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sub_asset_type', models.SmallIntegerField(choices=[(0, 'router'), (1, 'interchanger'), (2, 'load_balancing'), (4, 'vpn_device')], default=0, verbose_name='network_device_type')),
+                ('vlan_ip', models.GenericIPAddressField(blank=True, null=True, verbose_name='vlan_ip')),
+                ('intranet_ip', models.GenericIPAddressField(blank=True, null=True, verbose_name='intranet_ip')),
+                ('model', models.CharField(blank=True, max_length=128, null=True, verbose_name='network_device_model')),
+                ('firmware', models.CharField(blank=True, max_length=128, null=True, verbose_name='device_firmware_version')),
+                ('port_num', models.SmallIntegerField(blank=True, null=True, verbose_name='port_num')),
+                ('device_detail', models.TextField(blank=True, null=True, verbose_name='device_detail')),
+                ('asset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='assets.Asset')),
+            ],
+            options={
+                'verbose_name': 'network_device',
+                'verbose_name_plural': 'network_device',
+            },
+        ),
+        migrations.CreateModel(
+            name='EventLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, verbose_name='event_name')),
+                ('event_type', models.SmallIntegerField(choices=[(0, 'other'), (1, 'hardware_alternation'), (2, 'increased_asset'), (3, 'asset_offline'), (4, 'asset_online'), (5, 'maintance_routine'), (6, 'business_online_update_alternation')], default=4, verbose_name='event_type')),
+                ('component', models.CharField(blank=True, max_length=256, null=True, verbose_name='event_component')),
+                ('detail', models.TextField(verbose_name='event_detail')),
+                ('date', models.DateTimeField(auto_now_add=True, verbose_name='event_time')),
+                ('memo', models.TextField(blank=True, null=True, verbose_name='comment')),
+                ('asset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='assets.Asset')),
+                ('new_asset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='assets.NewAssetApprovalZone')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='event_executor')),
+            ],
+            options={
+                'verbose_name': 'eventlog',
+                'verbose_name_plural': 'eventlog',
+            },
+        ),
+        migrations.CreateModel(
+            name='CPU',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cpu_model', models.CharField(blank=True, max_length=128, null=True, verbose_name='cpu_model')),
+                ('cpu_count', models.PositiveSmallIntegerField(default=1, verbose_name='cpu_count')),
+                ('cpu_core_count', models.PositiveSmallIntegerField(default=1, verbose_name='cpu_core_count')),
+                ('asset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='assets.Asset')),
+            ],
+            options={
+                'verbose_name': 'cpu',
+                'verbose_name_plural': 'cpu',
+            },
+        ),
+        migrations.CreateModel(
+            name='BusinessUnit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='business_name')),
+                ('memo', models.CharField(blank=True, max_length=64, null=True, verbose_name='comment')),
+                ('parent_unit', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='parent_level', to='assets.BusinessUnit')),
+            ],
+            options={
+                'verbose_name': 'business_unit',
+                'verbose_name_plural': 'business_unit',
+            },
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='business_unit',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='assets.BusinessUnit', verbose_name='belonging_business_unit'),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='contract',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='assets.Contract', verbose_name='contract'),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='idc',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='assets.IDC', verbose_name='idc'),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='manufacturer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='assets.Manufacturer', verbose_name='manufacturer'),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='tags',
+            field=models.ManyToManyField(blank=True, to='assets.Tag', verbose_name='tags'),
+        ),
+        migrations.CreateModel(
+            name='RAM',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sn', models.CharField(blank=True, max_length=128, null=True, verbose_name='ram_serial_number')),
+                ('model', models.CharField(blank=True, max_length=128, null=True, verbose_name='ram_model')),
+                ('manufacturer', models.CharField(blank=True, max_length=128, null=True, verbose_name='ram_manufacturer')),
+                ('slot', models.CharField(max_length=64, verbose_name='slot')),
+                ('capacity', models.IntegerField(blank=True, null=True, verbose_name='ram_capacity')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='assets.Asset')),
+            ],
+            options={
+                'verbose_name': 'ram',
+                'verbose_name_plural': 'ram',
+                'unique_together': {('asset', 'slot')},
+            },
+        ),
+        migrations.CreateModel(
+            name='NIC',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=64, null=True, verbose_name='nic_name')),
+                ('model', models.CharField(max_length=128, verbose_name='nic_model')),
+                ('mac', models.CharField(max_length=64, verbose_name='mac_address')),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True, verbose_name='ip_address')),
+                ('net_mask', models.CharField(blank=True, max_length=64, null=True, verbose_name='mask')),
+                ('bonding', models.CharField(blank=True, max_length=64, null=True, verbose_name='bonding_address')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='assets.Asset')),
+            ],
+            options={
+                'verbose_name': 'nic',
+                'verbose_name_plural': 'nic',
+                'unique_together': {('asset', 'model', 'mac')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Disk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sn', models.CharField(max_length=128, verbose_name='disk_serial_number')),
+                ('slot', models.CharField(blank=True, max_length=64, null=True, verbose_name='slot_position')),
+                ('model', models.CharField(blank=True, max_length=128, null=True, verbose_name='disk_model')),
+                ('manufacturer', models.CharField(blank=True, max_length=128, null=True, verbose_name='disk_manufacturer')),
+                ('capacity', models.FloatField(blank=True, null=True, verbose_name='disk_capacity')),
+                ('interface_type', models.CharField(choices=[('SATA', 'SATA'), ('SAS', 'SAS'), ('SCSI', 'SCSI'), ('SSD', 'SSD'), ('unknown', 'unknown')], default='unknown', max_length=16, verbose_name='interface_type')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='assets.Asset')),
+            ],
+            options={
+                'verbose_name': 'disk',
+                'verbose_name_plural': 'disk',
+                'unique_together': {('asset', 'sn')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='report_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='report_hash'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0002_asset_report_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['c_time', 'id'], name='asset_ctime_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['asset_type', 'status', 'c_time'], name='asset_type_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['status', 'c_time'], name='asset_status_ctime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['manage_ip'], name='asset_manage_ip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['asset', 'date'], name='eventlog_asset_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['event_type', 'date'], name='eventlog_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['date'], name='eventlog_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newassetapprovalzone',
+            index=models.Index(fields=['approved', 'c_time'], name='approval_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nic',
+            index=models.Index(fields=['mac'], name='nic_mac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nic',
+            index=models.Index(fields=['ip_address'], name='nic_ip_address_idx'),
+        ),
+    ]
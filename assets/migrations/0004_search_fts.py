@@ -0,0 +1,44 @@
+from django.db import OperationalError, migrations
+
+FTS_TABLE = 'assets_search_fts'
+
+# 与 search.load_documents 的内容一致：资产名称、sn、管理 IP、网卡 mac / ip、CPU 型号、标签
+POPULATE_SQL = """
+INSERT INTO assets_search_fts (rowid, body)
+SELECT a.id, trim(
+    COALESCE(a.name, '') || ' ' || COALESCE(a.sn, '') || ' ' || COALESCE(a.manage_ip, '') || ' ' ||
+    COALESCE((SELECT group_concat(n.mac || ' ' || COALESCE(n.ip_address, ''), ' ')
+              FROM assets_nic n WHERE n.asset_id = a.id), '') || ' ' ||
+    COALESCE((SELECT c.cpu_model FROM assets_cpu c WHERE c.asset_id = a.id), '') || ' ' ||
+    COALESCE((SELECT group_concat(t.name, ' ') FROM assets_asset_tags at
+              JOIN assets_tag t ON t.id = at.tag_id WHERE at.asset_id = a.id), ''))
+FROM assets_asset a
+"""
+
+
+def create_fts_table(apps, schema_editor):
+    """只在 SQLite 并且编译了 FTS5 时建立全文索引表，作为搜索索引冷启动时的后备"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute('CREATE VIRTUAL TABLE %s USING fts5(body)' % FTS_TABLE)
+    except OperationalError:
+        # 没有 FTS5 时搜索直接退回 ORM 查询
+        return
+    schema_editor.execute(POPULATE_SQL)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS %s' % FTS_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0003_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
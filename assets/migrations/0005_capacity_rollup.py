@@ -0,0 +1,48 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0004_search_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetCapacity',
+            fields=[
+                ('asset_id', models.IntegerField(primary_key=True, serialize=False, verbose_name='asset_id')),
+                ('idc_id', models.IntegerField(blank=True, null=True, verbose_name='idc_id')),
+                ('business_unit_id', models.IntegerField(blank=True, null=True, verbose_name='business_unit_id')),
+                ('status', models.SmallIntegerField(default=0, verbose_name='device_condition')),
+                ('cpu_cores', models.IntegerField(default=0, verbose_name='cpu_cores')),
+                ('ram_mb', models.BigIntegerField(default=0, verbose_name='ram_mb')),
+                ('disk_gb', models.FloatField(default=0, verbose_name='disk_gb')),
+            ],
+            options={
+                'verbose_name': 'asset_capacity',
+                'verbose_name_plural': 'asset_capacity',
+            },
+        ),
+        migrations.CreateModel(
+            name='CapacityRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('idc', 'idc'), ('business_unit', 'business_unit'), ('all', 'all')], max_length=16, verbose_name='scope')),
+                ('scope_id', models.IntegerField(default=0, verbose_name='scope_id')),
+                ('status', models.SmallIntegerField(choices=[(0, 'online'), (1, 'offline'), (2, 'unknown'), (3, 'fault'), (4, 'backup')], default=0, verbose_name='device_condition')),
+                ('asset_count', models.IntegerField(default=0, verbose_name='asset_count')),
+                ('cpu_cores', models.BigIntegerField(default=0, verbose_name='cpu_cores')),
+                ('ram_mb', models.BigIntegerField(default=0, verbose_name='ram_mb')),
+                ('disk_gb', models.FloatField(default=0, verbose_name='disk_gb')),
+                ('m_time', models.DateTimeField(auto_now=True, verbose_name='update_time')),
+            ],
+            options={
+                'verbose_name': 'capacity_rollup',
+                'verbose_name_plural': 'capacity_rollup',
+                'unique_together': {('scope', 'scope_id', 'status')},
+            },
+        ),
+    ]
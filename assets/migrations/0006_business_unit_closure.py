@@ -0,0 +1,52 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_closure(apps, schema_editor):
+    """按现有的 parent_unit 关系生成闭包表"""
+    BusinessUnit = apps.get_model('assets', 'BusinessUnit')
+    BusinessUnitClosure = apps.get_model('assets', 'BusinessUnitClosure')
+    parents = dict(BusinessUnit.objects.values_list('id', 'parent_unit_id'))
+    rows = []
+    for unit_id in parents:
+        chain, current = [], unit_id
+        while current is not None and current not in chain:
+            chain.append(current)
+            current = parents.get(current)
+        rows += [BusinessUnitClosure(ancestor_id=ancestor_id, descendant_id=unit_id, depth=depth)
+                 for depth, ancestor_id in enumerate(chain)]
+    BusinessUnitClosure.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0005_capacity_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusinessUnitClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(default=0, verbose_name='depth')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='assets.BusinessUnit')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='assets.BusinessUnit')),
+            ],
+            options={
+                'verbose_name': 'business_unit_closure',
+                'verbose_name_plural': 'business_unit_closure',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='businessunitclosure',
+            index=models.Index(fields=['descendant', 'depth'], name='bu_closure_descendant_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='businessunitclosure',
+            unique_together={('ancestor', 'descendant')},
+        ),
+        migrations.RunPython(populate_closure, migrations.RunPython.noop),
+    ]
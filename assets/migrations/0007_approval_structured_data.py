@@ -0,0 +1,167 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:34
+
+import ipaddress
+import json
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# 汇报中的组件列表 -> (组件类型, 字段 -> 汇报中的键)
+COMPONENTS = (
+    ('ram', 'ram', {'slot': ('slot',), 'sn': ('sn',), 'model': ('model',), 'manufacturer': ('manufacturer',),
+                    'capacity': ('capacity',)}),
+    ('physical_disk_driver', 'disk', {'slot': ('slot',), 'sn': ('sn',), 'model': ('model',),
+                                      'manufacturer': ('manufacturer',), 'capacity': ('capacity', 'size')}),
+    ('nic', 'nic', {'name': ('name',), 'model': ('model',), 'mac': ('mac',), 'ip_address': ('ip_address',)}),
+)
+
+
+def _component_row(entry, component, keys):
+    row = {'component': component}
+    for field, names in keys.items():
+        value = next((entry[name] for name in names if entry.get(name) not in (None, '')), None)
+        if value is not None and field == 'capacity':
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                value = None
+        elif value is not None and field == 'ip_address':
+            try:
+                value = str(ipaddress.ip_address(str(value)))
+            except ValueError:
+                value = None
+        elif value is not None:
+            value = str(value)
+        row[field] = value
+    return row
+
+
+def split_approval_data(apps, schema_editor):
+    """把已有记录的汇报数据压缩保存，并拆出汇总字段和组件行"""
+    NewAssetApprovalZone = apps.get_model('assets', 'NewAssetApprovalZone')
+    NewAssetComponent = apps.get_model('assets', 'NewAssetComponent')
+    for zone in NewAssetApprovalZone.objects.iterator(chunk_size=500):
+        zone.raw_data = zlib.compress(zone.data.encode('utf-8'))
+        try:
+            data = json.loads(zone.data)
+        except ValueError:
+            data = None
+        rows = []
+        if isinstance(data, dict):
+            zone.raid_type = data.get('raid_type') or None
+            for report_key, component, keys in COMPONENTS:
+                entries = data.get(report_key)
+                if isinstance(entries, list):
+                    rows += [_component_row(entry, component, keys) for entry in entries if isinstance(entry, dict)]
+        disks = [row for row in rows if row['component'] == 'disk']
+        zone.disk_count = len(disks)
+        zone.disk_size = sum(row['capacity'] or 0 for row in disks)
+        zone.nic_count = sum(row['component'] == 'nic' for row in rows)
+        zone.save(update_fields=['raw_data', 'raid_type', 'disk_count', 'disk_size', 'nic_count'])
+        NewAssetComponent.objects.bulk_create([NewAssetComponent(approval_id=zone.id, **row) for row in rows])
+
+
+def join_approval_data(apps, schema_editor):
+    NewAssetApprovalZone = apps.get_model('assets', 'NewAssetApprovalZone')
+    for zone in NewAssetApprovalZone.objects.iterator(chunk_size=500):
+        zone.data = zlib.decompress(bytes(zone.raw_data)).decode('utf-8') if zone.raw_data else ''
+        zone.save(update_fields=['data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0006_business_unit_closure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewAssetComponent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('component', models.CharField(choices=[('ram', 'ram'), ('disk', 'disk'), ('nic', 'nic')], max_length=16, verbose_name='component')),
+                ('slot', models.CharField(blank=True, max_length=64, null=True, verbose_name='slot')),
+                ('name', models.CharField(blank=True, max_length=64, null=True, verbose_name='name')),
+                ('sn', models.CharField(blank=True, max_length=128, null=True, verbose_name='serial_number')),
+                ('model', models.CharField(blank=True, max_length=128, null=True, verbose_name='model')),
+                ('manufacturer', models.CharField(blank=True, max_length=128, null=True, verbose_name='manufacturer')),
+                ('capacity', models.FloatField(blank=True, null=True, verbose_name='capacity')),
+                ('mac', models.CharField(blank=True, max_length=64, null=True, verbose_name='mac_address')),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True, verbose_name='ip_address')),
+            ],
+            options={
+                'verbose_name': 'new_asset_component',
+                'verbose_name_plural': 'new_asset_component',
+            },
+        ),
+        migrations.AddField(
+            model_name='newassetapprovalzone',
+            name='disk_count',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='disk_count'),
+        ),
+        migrations.AddField(
+            model_name='newassetapprovalzone',
+            name='disk_size',
+            field=models.FloatField(default=0, verbose_name='disk_size'),
+        ),
+        migrations.AddField(
+            model_name='newassetapprovalzone',
+            name='nic_count',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='nic_count'),
+        ),
+        migrations.AddField(
+            model_name='newassetapprovalzone',
+            name='raid_type',
+            field=models.CharField(blank=True, max_length=512, null=True, verbose_name='raid_type'),
+        ),
+        migrations.AddField(
+            model_name='newassetapprovalzone',
+            name='raw_data',
+            field=models.BinaryField(default=b'', verbose_name='asset_data'),
+        ),
+        migrations.AddIndex(
+            model_name='newassetapprovalzone',
+            index=models.Index(fields=['manufacturer', 'model'], name='approval_manufacturer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newassetapprovalzone',
+            index=models.Index(fields=['cpu_model'], name='approval_cpu_model_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newassetapprovalzone',
+            index=models.Index(fields=['os_release'], name='approval_os_release_idx'),
+        ),
+        migrations.AddField(
+            model_name='newassetcomponent',
+            name='approval',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='components', to='assets.NewAssetApprovalZone'),
+        ),
+        migrations.AddIndex(
+            model_name='newassetcomponent',
+            index=models.Index(fields=['component', 'model'], name='approval_component_model_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newassetcomponent',
+            index=models.Index(fields=['sn'], name='approval_component_sn_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newassetcomponent',
+            index=models.Index(fields=['mac'], name='approval_component_mac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newassetcomponent',
+            index=models.Index(fields=['ip_address'], name='approval_component_ip_idx'),
+        ),
+            migrations.RunPython(split_approval_data, join_approval_data),
+        # 回滚时重新加回 data 列需要默认值
+        migrations.AlterField(
+            model_name='newassetapprovalzone',
+            name='data',
+            field=models.TextField(default='', verbose_name='asset_data'),
+        ),
+        migrations.RemoveField(
+            model_name='newassetapprovalzone',
+            name='data',
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0007_approval_structured_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetDelta',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset_id', models.IntegerField(verbose_name='asset_id')),
+                ('version', models.IntegerField(verbose_name='version')),
+                ('taken_at', models.DateTimeField(verbose_name='taken_at')),
+                ('changes', models.BinaryField(verbose_name='changes')),
+            ],
+            options={
+                'verbose_name': 'asset_delta',
+                'verbose_name_plural': 'asset_delta',
+            },
+        ),
+        migrations.CreateModel(
+            name='AssetHistoryHead',
+            fields=[
+                ('asset_id', models.IntegerField(primary_key=True, serialize=False, verbose_name='asset_id')),
+                ('version', models.IntegerField(default=0, verbose_name='version')),
+                ('state', models.BinaryField(verbose_name='state')),
+                ('state_hash', models.CharField(max_length=64, verbose_name='state_hash')),
+                ('snapshot_version', models.IntegerField(default=0, verbose_name='snapshot_version')),
+                ('snapshot_time', models.DateTimeField(verbose_name='snapshot_time')),
+            ],
+            options={
+                'verbose_name': 'asset_history_head',
+                'verbose_name_plural': 'asset_history_head',
+            },
+        ),
+        migrations.CreateModel(
+            name='AssetSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset_id', models.IntegerField(verbose_name='asset_id')),
+                ('version', models.IntegerField(verbose_name='version')),
+                ('taken_at', models.DateTimeField(verbose_name='taken_at')),
+                ('state', models.BinaryField(verbose_name='state')),
+            ],
+            options={
+                'verbose_name': 'asset_snapshot',
+                'verbose_name_plural': 'asset_snapshot',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='assetsnapshot',
+            index=models.Index(fields=['asset_id', 'taken_at'], name='asset_snapshot_time_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='assetsnapshot',
+            unique_together={('asset_id', 'version')},
+        ),
+        migrations.AddIndex(
+            model_name='assetdelta',
+            index=models.Index(fields=['asset_id', 'taken_at'], name='asset_delta_time_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='assetdelta',
+            unique_together={('asset_id', 'version')},
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.28 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0008_asset_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpiryEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('warranty', 'warranty'), ('contract', 'contract'), ('license', 'license')], max_length=16, verbose_name='kind')),
+                ('object_id', models.IntegerField(verbose_name='object_id')),
+                ('software_id', models.IntegerField(default=0, verbose_name='software_id')),
+                ('asset_id', models.IntegerField(blank=True, null=True, verbose_name='asset_id')),
+                ('day', models.DateField(verbose_name='expire_day')),
+                ('name', models.CharField(max_length=256, verbose_name='name')),
+                ('licensed', models.IntegerField(blank=True, null=True, verbose_name='licensed')),
+                ('expiring', models.IntegerField(blank=True, null=True, verbose_name='expiring')),
+                ('in_use', models.IntegerField(blank=True, null=True, verbose_name='in_use')),
+                ('notified', models.BooleanField(default=False, verbose_name='notified')),
+            ],
+            options={
+                'verbose_name': 'expiry_entry',
+                'verbose_name_plural': 'expiry_entry',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='expiryentry',
+            index=models.Index(fields=['day', 'kind'], name='expiry_day_kind_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expiryentry',
+            index=models.Index(fields=['kind', 'day'], name='expiry_kind_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expiryentry',
+            index=models.Index(fields=['notified', 'day'], name='expiry_pending_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='expiryentry',
+            unique_together={('kind', 'object_id', 'software_id')},
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.28 on 2026-10-18 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0009_expiry_calendar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressConflict',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ip', 'ip'), ('mac', 'mac'), ('sn', 'sn')], max_length=8, verbose_name='kind')),
+                ('value', models.CharField(max_length=128, verbose_name='value')),
+                ('group_count', models.IntegerField(verbose_name='group_count')),
+                ('asset_count', models.IntegerField(verbose_name='asset_count')),
+                ('first_seen', models.DateTimeField(verbose_name='first_seen')),
+                ('m_time', models.DateTimeField(auto_now=True, verbose_name='update_time')),
+            ],
+            options={
+                'verbose_name': 'address_conflict',
+                'verbose_name_plural': 'address_conflict',
+            },
+        ),
+        migrations.CreateModel(
+            name='AddressEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ip', 'ip'), ('mac', 'mac'), ('sn', 'sn')], max_length=8, verbose_name='kind')),
+                ('value', models.CharField(max_length=128, verbose_name='value')),
+                ('asset_id', models.IntegerField(verbose_name='asset_id')),
+                ('group_id', models.IntegerField(verbose_name='group_id')),
+                ('source', models.CharField(max_length=32, verbose_name='source')),
+            ],
+            options={
+                'verbose_name': 'address_entry',
+                'verbose_name_plural': 'address_entry',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='addressentry',
+            index=models.Index(fields=['kind', 'value', 'group_id', 'asset_id'], name='address_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='addressentry',
+            index=models.Index(fields=['asset_id'], name='address_asset_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='addressconflict',
+            unique_together={('kind', 'value')},
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0010_address_conflicts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset_id', models.IntegerField(verbose_name='asset_id')),
+            ],
+            options={
+                'verbose_name': 'search_change',
+                'verbose_name_plural': 'search_change',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 20:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0011_search_changes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='server',
+            name='hosted_on',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='hosted_on_server', to='assets.Server', verbose_name='host_machine'),
+        ),
+    ]
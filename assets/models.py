@@ -1,3 +1,6 @@
+import zlib
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 # Create your models here.
@@ -22,23 +25,24 @@ class Asset(models.Model):
     asset_type = models.CharField(choices=asset_type_choice, max_length=64, default='server', verbose_name="asset_type")
     name = models.CharField(max_length=64, unique=True, verbose_name="asset_name")     # 不可重复
     sn = models.CharField(max_length=128, unique=True, verbose_name="asset_serial_number")  # 不可重复
-    business_unit = models.ForeignKey('BusinessUnit', null=True, blank=True, verbose_name='belonging_business_unit')
+    business_unit = models.ForeignKey('BusinessUnit', null=True, blank=True, on_delete=models.SET_NULL, verbose_name='belonging_business_unit')
     status = models.SmallIntegerField(choices=asset_status, default=0, verbose_name='device_condition')
 
-    manufacturer = models.ForeignKey('Manufacturer', null=True, blank=True, verbose_name='manufacturer')
+    manufacturer = models.ForeignKey('Manufacturer', null=True, blank=True, on_delete=models.SET_NULL, verbose_name='manufacturer')
     manage_ip = models.GenericIPAddressField(null=True, blank=True, verbose_name='manage_ip')
     tags = models.ManyToManyField('Tag', blank=True, verbose_name='tags')
-    admin = models.ForeignKey(User, null=True, blank=True, verbose_name='asset_admin', related_name='admin')
-    idc = models.ForeignKey('IDC', null=True, blank=True, verbose_name='idc')
-    contract = models.ForeignKey('Contract', null=True, blank=True, verbose_name='contract')
+    admin = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, verbose_name='asset_admin', related_name='admin')
+    idc = models.ForeignKey('IDC', null=True, blank=True, on_delete=models.SET_NULL, verbose_name='idc')
+    contract = models.ForeignKey('Contract', null=True, blank=True, on_delete=models.SET_NULL, verbose_name='contract')
 
     purchase_day = models.DateField(null=True, blank=True, verbose_name="purchase_day")
     expire_day = models.DateField(null=True, blank=True, verbose_name="expire_day")
     price = models.FloatField(null=True, blank=True, verbose_name="price")
 
-    approved_by = models.ForeignKey(User, null=True, blank=True, verbose_name='approver', related_name='approved_by')
+    approved_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, verbose_name='approver', related_name='approved_by')
 
     memo = models.TextField(null=True, blank=True, verbose_name='comment')
+    report_hash = models.CharField(max_length=64, null=True, blank=True, verbose_name='report_hash')  # 最近一次汇报数据的指纹
     c_time = models.DateTimeField(auto_now_add=True, verbose_name='create_date')
     m_time = models.DateTimeField(auto_now=True, verbose_name='update_time')
 
@@ -49,6 +53,14 @@ class Asset(models.Model):
         verbose_name = 'asset_table'
         verbose_name_plural = "asset_table"
         ordering = ['-c_time']
+        indexes = [
+            # 默认排序和按 (c_time, id) 翻页都走这个索引，不再需要临时排序
+            models.Index(fields=['c_time', 'id'], name='asset_ctime_id_idx'),
+            # 按类型、状态筛选资产列表，并保持默认排序
+            models.Index(fields=['asset_type', 'status', 'c_time'], name='asset_type_status_idx'),
+            models.Index(fields=['status', 'c_time'], name='asset_status_ctime_idx'),
+            models.Index(fields=['manage_ip'], name='asset_manage_ip_idx'),
+        ]
 
 
 class Server(models.Model):
@@ -64,10 +76,10 @@ class Server(models.Model):
         ('manual', 'manual_record'),
     )
 
-    asset = models.OneToOneField('Asset')  # 非常关键的一对一关联！
+    asset = models.OneToOneField('Asset', on_delete=models.CASCADE)  # 非常关键的一对一关联！
     sub_asset_type = models.SmallIntegerField(choices=sub_asset_type_choice, default=0, verbose_name="server_type")
     created_by = models.CharField(choices=created_by_choice, max_length=32, default='auto', verbose_name="create_type")
-    hosted_on = models.ForeignKey('self', related_name='hosted_on_server',
+    hosted_on = models.ForeignKey('self', related_name='hosted_on_server', on_delete=models.SET_NULL,
                                   blank=True, null=True, verbose_name="host_machine")  # 虚拟机专用字段
     model = models.CharField(max_length=128, null=True, blank=True, verbose_name='server_model')
     raid_type = models.CharField(max_length=512, blank=True, null=True, verbose_name='raid_type')
@@ -93,7 +105,7 @@ class SecurityDevice(models.Model):
         (4, 'maintance_system'),
     )
 
-    asset = models.OneToOneField('Asset')
+    asset = models.OneToOneField('Asset', on_delete=models.CASCADE)
     sub_asset_type = models.SmallIntegerField(choices=sub_asset_type_choice, default=0, verbose_name="security_device_type")
 
     def __str__(self):
@@ -113,7 +125,7 @@ class StorageDevice(models.Model):
         (4, 'tape_machine'),
     )
 
-    asset = models.OneToOneField('Asset')
+    asset = models.OneToOneField('Asset', on_delete=models.CASCADE)
     sub_asset_type = models.SmallIntegerField(choices=sub_asset_type_choice, default=0, verbose_name="storage_device_type")
 
     def __str__(self):
@@ -133,7 +145,7 @@ class NetworkDevice(models.Model):
         (4, 'vpn_device'),
     )
 
-    asset = models.OneToOneField('Asset')
+    asset = models.OneToOneField('Asset', on_delete=models.CASCADE)
     sub_asset_type = models.SmallIntegerField(choices=sub_asset_type_choice, default=0, verbose_name="network_device_type")
 
     vlan_ip = models.GenericIPAddressField(blank=True, null=True, verbose_name="vlan_ip")
@@ -206,18 +218,65 @@ class Manufacturer(models.Model):
 class BusinessUnit(models.Model):
     """业务线"""
 
-    parent_unit = models.ForeignKey('self', blank=True, null=True, related_name='parent_level')
+    parent_unit = models.ForeignKey('self', blank=True, null=True, on_delete=models.SET_NULL, related_name='parent_level')
     name = models.CharField('business_name', max_length=64, unique=True)
     memo = models.CharField('comment', max_length=64, blank=True, null=True)
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        """上级不能是自己或自己的下级，否则层级出现环；经闭包表一次查询判断"""
+        if self.pk and self.parent_unit_id and BusinessUnitClosure.objects.filter(
+                ancestor_id=self.pk, descendant_id=self.parent_unit_id).exists():
+            raise ValidationError({'parent_unit': '不能把业务线 %s 移动到它自己或它的下级之下！' % self})
+
+    def descendants(self, include_self=True):
+        """本业务线及所有下级业务线，通过闭包表一次查询得到，不用逐层递归"""
+        units = BusinessUnit.objects.filter(ancestor_links__ancestor=self)
+        if not include_self:
+            units = units.exclude(pk=self.pk)
+        return units
+
+    def ancestors(self, include_self=True):
+        """所有上级业务线，由近到远"""
+        units = BusinessUnit.objects.filter(descendant_links__descendant=self).order_by('descendant_links__depth')
+        if not include_self:
+            units = units.exclude(pk=self.pk)
+        return units
+
+    def assets(self):
+        """本业务线及所有下级业务线的资产，一条 SQL"""
+        return Asset.objects.filter(business_unit__ancestor_links__ancestor=self)
+
     class Meta:
         verbose_name = 'business_unit'
         verbose_name_plural = "business_unit"
 
 
+class BusinessUnitClosure(models.Model):
+    """
+    业务线层级的闭包表：每一对（上级, 下级）一行，包括每个业务线到自身（depth=0）。
+    由 bu_tree 模块在业务线新建、移动、删除时维护。
+    """
+
+    ancestor = models.ForeignKey('BusinessUnit', on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey('BusinessUnit', on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveSmallIntegerField('depth', default=0)
+
+    def __str__(self):
+        return '%s -> %s (%s)' % (self.ancestor_id, self.descendant_id, self.depth)
+
+    class Meta:
+        verbose_name = 'business_unit_closure'
+        verbose_name_plural = "business_unit_closure"
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            # 由下级查所有上级
+            models.Index(fields=['descendant', 'depth'], name='bu_closure_descendant_idx'),
+        ]
+
+
 class Contract(models.Model):
     """合同"""
 
@@ -256,7 +315,7 @@ class Tag(models.Model):
 class CPU(models.Model):
     """CPU组件"""
 
-    asset = models.OneToOneField('Asset')  # 设备上的cpu肯定都是一样的，所以不需要建立多个cpu数据，一条就可以，因此使用一对一。
+    asset = models.OneToOneField('Asset', on_delete=models.CASCADE)  # 设备上的cpu肯定都是一样的，所以不需要建立多个cpu数据，一条就可以，因此使用一对一。
     cpu_model = models.CharField('cpu_model', max_length=128, blank=True, null=True)
     cpu_count = models.PositiveSmallIntegerField('cpu_count', default=1)
     cpu_core_count = models.PositiveSmallIntegerField('cpu_core_count', default=1)
@@ -271,7 +330,7 @@ class CPU(models.Model):
 class RAM(models.Model):
     """内存组件"""
 
-    asset = models.ForeignKey('Asset')  # 只能通过外键关联Asset。否则不能同时关联服务器、网络设备等等。
+    asset = models.ForeignKey('Asset', on_delete=models.CASCADE)  # 只能通过外键关联Asset。否则不能同时关联服务器、网络设备等等。
     sn = models.CharField('ram_serial_number', max_length=128, blank=True, null=True)
     model = models.CharField('ram_model', max_length=128, blank=True, null=True)
     manufacturer = models.CharField('ram_manufacturer', max_length=128, blank=True, null=True)
@@ -298,7 +357,7 @@ class Disk(models.Model):
         ('unknown', 'unknown'),
     )
 
-    asset = models.ForeignKey('Asset')
+    asset = models.ForeignKey('Asset', on_delete=models.CASCADE)
     sn = models.CharField('disk_serial_number', max_length=128)
     slot = models.CharField('slot_position', max_length=64, blank=True, null=True)
     model = models.CharField('disk_model', max_length=128, blank=True, null=True)
@@ -317,7 +376,7 @@ class Disk(models.Model):
 class NIC(models.Model):
     """network card"""
 
-    asset = models.ForeignKey('Asset')  # 注意要用外键
+    asset = models.ForeignKey('Asset', on_delete=models.CASCADE)  # 注意要用外键
     name = models.CharField('nic_name', max_length=64, blank=True, null=True)
     model = models.CharField('nic_model', max_length=128)
     mac = models.CharField('mac_address', max_length=64)  # 虚拟机有可能会出现同样的mac地址
@@ -332,6 +391,11 @@ class NIC(models.Model):
         verbose_name = 'nic'
         verbose_name_plural = "nic"
         unique_together = ('asset', 'model', 'mac')  # 资产、型号和mac必须联合唯一。防止虚拟机中的特殊情况发生错误。
+        indexes = [
+            # 按 mac / ip 反查资产
+            models.Index(fields=['mac'], name='nic_mac_idx'),
+            models.Index(fields=['ip_address'], name='nic_ip_address_idx'),
+        ]
 
 class EventLog(models.Model):
     """
@@ -365,9 +429,27 @@ class EventLog(models.Model):
     class Meta:
         verbose_name = 'eventlog'
         verbose_name_plural = "eventlog"
+        indexes = [
+            # 某台资产的事件按时间倒序查看
+            models.Index(fields=['asset', 'date'], name='eventlog_asset_date_idx'),
+            # 按事件类型和时间范围筛选
+            models.Index(fields=['event_type', 'date'], name='eventlog_type_date_idx'),
+            models.Index(fields=['date'], name='eventlog_date_idx'),
+        ]
+
+class NewAssetApprovalZoneManager(models.Manager):
+    """默认不读取原始汇报数据，列出或筛选待审批队列时只取结构化字段；需要原始数据时用 defer(None)"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('raw_data')
+
 
 class NewAssetApprovalZone(models.Model):
-    """新资产待审批区"""
+    """
+    新资产待审批区。
+    入库时把汇报数据拆成下面的结构化字段和 NewAssetComponent 组件行，筛选时不需要解析原始数据；
+    原始汇报压缩后保存在 raw_data 中，通过 data 属性读写 JSON 文本。
+    """
 
     sn = models.CharField('asset_serial_number', max_length=128, unique=True)  # 此字段必填
     asset_type_choice = (
@@ -390,17 +472,287 @@ class NewAssetApprovalZone(models.Model):
     os_distribution = models.CharField(max_length=64, blank=True, null=True)
     os_type = models.CharField(max_length=64, blank=True, null=True)
     os_release = models.CharField(max_length=64, blank=True, null=True)
+    raid_type = models.CharField(max_length=512, blank=True, null=True, verbose_name='raid_type')
+    disk_count = models.PositiveSmallIntegerField('disk_count', default=0)
+    disk_size = models.FloatField('disk_size', default=0)  # 所有硬盘的容量合计（GB）
+    nic_count = models.PositiveSmallIntegerField('nic_count', default=0)
 
-    data = models.TextField('asset_data')  # 此字段必填
+    raw_data = models.BinaryField('asset_data', default=b'')  # zlib 压缩的汇报数据（JSON）
 
     c_time = models.DateTimeField('create_time', auto_now_add=True)
     m_time = models.DateTimeField('update_time', auto_now=True)
     approved = models.BooleanField('approve', default=False)
 
+    objects = NewAssetApprovalZoneManager()
+
     def __str__(self):
         return self.sn
 
+    @property
+    def data(self):
+        """原始汇报数据的 JSON 文本"""
+        return zlib.decompress(bytes(self.raw_data)).decode('utf-8') if self.raw_data else ''
+
+    @data.setter
+    def data(self, value):
+        self.raw_data = zlib.compress(value.encode('utf-8'))
+
     class Meta:
         verbose_name = 'new_asset_approval'
         verbose_name_plural = "new_asset_approval"
-        ordering = ['-c_time']
\ No newline at end of file
+        ordering = ['-c_time']
+        indexes = [
+            # 待审批队列：approved=False 并按创建时间倒序
+            models.Index(fields=['approved', 'c_time'], name='approval_pending_idx'),
+            models.Index(fields=['manufacturer', 'model'], name='approval_manufacturer_idx'),
+            models.Index(fields=['cpu_model'], name='approval_cpu_model_idx'),
+            models.Index(fields=['os_release'], name='approval_os_release_idx'),
+        ]
+
+
+class NewAssetComponent(models.Model):
+    """待审批资产的内存、硬盘、网卡，入待审批区时从汇报数据中拆出，用于按型号、sn、MAC、IP 筛选"""
+    component_choice = (
+        ('ram', 'ram'),
+        ('disk', 'disk'),
+        ('nic', 'nic'),
+    )
+
+    approval = models.ForeignKey('NewAssetApprovalZone', on_delete=models.CASCADE, related_name='components')
+    component = models.CharField('component', choices=component_choice, max_length=16)
+    slot = models.CharField('slot', max_length=64, blank=True, null=True)
+    name = models.CharField('name', max_length=64, blank=True, null=True)
+    sn = models.CharField('serial_number', max_length=128, blank=True, null=True)
+    model = models.CharField('model', max_length=128, blank=True, null=True)
+    manufacturer = models.CharField('manufacturer', max_length=128, blank=True, null=True)
+    capacity = models.FloatField('capacity', blank=True, null=True)
+    mac = models.CharField('mac_address', max_length=64, blank=True, null=True)
+    ip_address = models.GenericIPAddressField('ip_address', blank=True, null=True)
+
+    def __str__(self):
+        return '%s: %s %s' % (self.approval_id, self.component, self.model)
+
+    class Meta:
+        verbose_name = 'new_asset_component'
+        verbose_name_plural = "new_asset_component"
+        indexes = [
+            models.Index(fields=['component', 'model'], name='approval_component_model_idx'),
+            models.Index(fields=['sn'], name='approval_component_sn_idx'),
+            models.Index(fields=['mac'], name='approval_component_mac_idx'),
+            models.Index(fields=['ip_address'], name='approval_component_ip_idx'),
+        ]
+
+class AssetCapacity(models.Model):
+    """
+    每台资产对容量汇总的贡献（CPU 核数、内存、硬盘合计），是 CapacityRollup 的增量计算依据。
+    不使用外键：资产删除后还要靠这条记录把它原来的贡献从汇总中扣掉。
+    """
+
+    asset_id = models.IntegerField('asset_id', primary_key=True)
+    idc_id = models.IntegerField('idc_id', blank=True, null=True)
+    business_unit_id = models.IntegerField('business_unit_id', blank=True, null=True)
+    status = models.SmallIntegerField('device_condition', default=0)
+    cpu_cores = models.IntegerField('cpu_cores', default=0)
+    ram_mb = models.BigIntegerField('ram_mb', default=0)
+    disk_gb = models.FloatField('disk_gb', default=0)
+
+    def __str__(self):
+        return '%s: %s cores %sMB %sGB' % (self.asset_id, self.cpu_cores, self.ram_mb, self.disk_gb)
+
+    class Meta:
+        verbose_name = 'asset_capacity'
+        verbose_name_plural = "asset_capacity"
+
+
+class CapacityRollup(models.Model):
+    """
+    按机房、业务线（包含下级业务线）和全局汇总的容量，每个范围按资产状态各一行。
+    scope_id 为机房或业务线的 id，未分配机房 / 业务线的资产记在 0 下，全局汇总的 scope_id 也是 0。
+    """
+    scope_choice = (
+        ('idc', 'idc'),
+        ('business_unit', 'business_unit'),
+        ('all', 'all'),
+    )
+
+    scope = models.CharField('scope', choices=scope_choice, max_length=16)
+    scope_id = models.IntegerField('scope_id', default=0)
+    status = models.SmallIntegerField('device_condition', choices=Asset.asset_status, default=0)
+    asset_count = models.IntegerField('asset_count', default=0)
+    cpu_cores = models.BigIntegerField('cpu_cores', default=0)
+    ram_mb = models.BigIntegerField('ram_mb', default=0)
+    disk_gb = models.FloatField('disk_gb', default=0)
+    m_time = models.DateTimeField('update_time', auto_now=True)
+
+    def __str__(self):
+        return '%s:%s <%s> %s' % (self.scope, self.scope_id, self.get_status_display(), self.asset_count)
+
+    class Meta:
+        verbose_name = 'capacity_rollup'
+        verbose_name_plural = "capacity_rollup"
+        unique_together = ('scope', 'scope_id', 'status')
+
+
+class AssetHistoryHead(models.Model):
+    """
+    每台资产历史的最新状态，用来与新数据比对生成增量。
+    不使用外键：资产删除后仍然保留它的历史。
+    """
+
+    asset_id = models.IntegerField('asset_id', primary_key=True)
+    version = models.IntegerField('version', default=0)
+    state = models.BinaryField('state')  # zlib 压缩的 JSON
+    state_hash = models.CharField('state_hash', max_length=64)
+    snapshot_version = models.IntegerField('snapshot_version', default=0)
+    snapshot_time = models.DateTimeField('snapshot_time')
+
+    def __str__(self):
+        return '%s: v%s' % (self.asset_id, self.version)
+
+    class Meta:
+        verbose_name = 'asset_history_head'
+        verbose_name_plural = "asset_history_head"
+
+
+class AssetSnapshot(models.Model):
+    """资产在某个版本的完整状态，定期保存，还原历史状态时从最近的一份开始"""
+
+    asset_id = models.IntegerField('asset_id')
+    version = models.IntegerField('version')
+    taken_at = models.DateTimeField('taken_at')
+    state = models.BinaryField('state')  # zlib 压缩的 JSON
+
+    def __str__(self):
+        return '%s: v%s snapshot' % (self.asset_id, self.version)
+
+    class Meta:
+        verbose_name = 'asset_snapshot'
+        verbose_name_plural = "asset_snapshot"
+        unique_together = ('asset_id', 'version')
+        indexes = [
+            models.Index(fields=['asset_id', 'taken_at'], name='asset_snapshot_time_idx'),
+        ]
+
+
+class AssetDelta(models.Model):
+    """资产相对上一个版本的变化，只记录发生变化的组件和字段"""
+
+    asset_id = models.IntegerField('asset_id')
+    version = models.IntegerField('version')
+    taken_at = models.DateTimeField('taken_at')
+    changes = models.BinaryField('changes')  # zlib 压缩的 JSON
+
+    def __str__(self):
+        return '%s: v%s delta' % (self.asset_id, self.version)
+
+    class Meta:
+        verbose_name = 'asset_delta'
+        verbose_name_plural = "asset_delta"
+        unique_together = ('asset_id', 'version')
+        indexes = [
+            models.Index(fields=['asset_id', 'taken_at'], name='asset_delta_time_idx'),
+        ]
+
+
+class ExpiryEntry(models.Model):
+    """
+    到期日历：资产保修（Asset.expire_day）、合同（Contract.end_day）和合同下的软件授权各一行，按到期日建索引。
+    由 expiry 模块维护；不使用外键，资产或合同删除时由信号删除对应的行。
+    """
+    kind_choice = (
+        ('warranty', 'warranty'),
+        ('contract', 'contract'),
+        ('license', 'license'),
+    )
+
+    kind = models.CharField('kind', choices=kind_choice, max_length=16)
+    object_id = models.IntegerField('object_id')  # 保修为资产 id，合同和授权为合同 id
+    software_id = models.IntegerField('software_id', default=0)  # 授权对应的软件，其余为 0
+    asset_id = models.IntegerField('asset_id', blank=True, null=True)
+    day = models.DateField('expire_day')
+    name = models.CharField('name', max_length=256)
+    licensed = models.IntegerField('licensed', blank=True, null=True)  # Software.license_num
+    expiring = models.IntegerField('expiring', blank=True, null=True)  # 随合同到期的授权数 Contract.license_num
+    in_use = models.IntegerField('in_use', blank=True, null=True)  # 正在使用该软件的服务器数
+    notified = models.BooleanField('notified', default=False)  # 是否已记录到期提醒，到期日变化后重置
+
+    def __str__(self):
+        return '%s:%s %s' % (self.kind, self.object_id, self.day)
+
+    class Meta:
+        verbose_name = 'expiry_entry'
+        verbose_name_plural = "expiry_entry"
+        unique_together = ('kind', 'object_id', 'software_id')
+        indexes = [
+            # 按到期日范围查询并按 (day, kind, id) 翻页，同时覆盖按类型计数
+            models.Index(fields=['day', 'kind'], name='expiry_day_kind_idx'),
+            models.Index(fields=['kind', 'day'], name='expiry_kind_day_idx'),
+            # 尚未提醒、已进入提醒窗口的条目
+            models.Index(fields=['notified', 'day'], name='expiry_pending_idx'),
+        ]
+
+
+class AddressEntry(models.Model):
+    """
+    地址索引：资产的每个 IP、MAC 和序列号一行，值已规范化（小写、去掉 MAC 分隔符）。
+    group_id 为虚拟机的宿主机资产 id，其余资产为自身的 id；同一个值只出现在一组中时不算冲突。
+    由 conflicts 模块维护，不使用外键。
+    """
+    kind_choice = (
+        ('ip', 'ip'),
+        ('mac', 'mac'),
+        ('sn', 'sn'),
+    )
+
+    kind = models.CharField('kind', choices=kind_choice, max_length=8)
+    value = models.CharField('value', max_length=128)
+    asset_id = models.IntegerField('asset_id')
+    group_id = models.IntegerField('group_id')
+    source = models.CharField('source', max_length=32)  # 来源字段，例如 nic.ip_address
+
+    def __str__(self):
+        return '%s %s: %s' % (self.kind, self.value, self.asset_id)
+
+    class Meta:
+        verbose_name = 'address_entry'
+        verbose_name_plural = "address_entry"
+        indexes = [
+            # 按值查找和分组统计都只读这个索引
+            models.Index(fields=['kind', 'value', 'group_id', 'asset_id'], name='address_value_idx'),
+            models.Index(fields=['asset_id'], name='address_asset_idx'),
+        ]
+
+
+class AddressConflict(models.Model):
+    """出现在不止一组资产中的 IP、MAC 或序列号，随地址索引增量更新"""
+
+    kind = models.CharField('kind', choices=AddressEntry.kind_choice, max_length=8)
+    value = models.CharField('value', max_length=128)
+    group_count = models.IntegerField('group_count')
+    asset_count = models.IntegerField('asset_count')
+    first_seen = models.DateTimeField('first_seen')
+    m_time = models.DateTimeField('update_time', auto_now=True)
+
+    def __str__(self):
+        return '%s %s: %s groups' % (self.kind, self.value, self.group_count)
+
+    class Meta:
+        verbose_name = 'address_conflict'
+        verbose_name_plural = "address_conflict"
+        unique_together = ('kind', 'value')
+
+
+class SearchChange(models.Model):
+    """
+    搜索文档的变更日志：某台资产的可搜索字段变化后追加一行，id 递增，相当于搜索索引的共享版本号。
+    各进程的内存索引记下已经应用到的 id，查询前读出之后的行重新加载这些资产；只保留最近的一部分。
+    """
+
+    asset_id = models.IntegerField('asset_id')
+
+    def __str__(self):
+        return '%s: %s' % (self.id, self.asset_id)
+
+    class Meta:
+        verbose_name = 'search_change'
+        verbose_name_plural = "search_change"
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+读写分离的数据库路由，配置在 settings.ASSET_DB_READ 中：
+  ALIAS   读连接的别名（SQLite 为同一文件上的只读连接，服务器数据库为只读副本）
+  MODELS  发往读连接的模型（app_label.ModelName），None 表示所有模型
+
+写入和迁移只走 default。default 连接在事务中时，读也留在 default 上：
+事务中未提交的修改在别的连接上看不到，读写必须在同一个连接里。
+只读副本有复制延迟，刚提交的数据可能还读不到，只适合统计类的查询。
+"""
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+DEFAULTS = {
+    'ALIAS': 'read',
+    'MODELS': None,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ASSET_DB_READ', {}))
+    return config
+
+
+class ReadRouter(object):
+
+    def __init__(self):
+        config = get_config()
+        self.alias = config['ALIAS']
+        self.models = set(config['MODELS']) if config['MODELS'] is not None else None
+
+    def db_for_read(self, model, **hints):
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if self.models is not None and model._meta.label not in self.models:
+            return DEFAULT_DB_ALIAS
+        return self.alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 读连接和 default 是同一份数据
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+资产搜索。
+
+按名称、sn、管理 IP、网卡 MAC / IP、CPU 型号、标签的部分内容查找资产。
+进程内维护一份倒排索引（词 -> 资产 id），词表有序，前缀查询用二分查找定位；索引在第一次查询时于后台线程中构建。
+索引还没有构建好（冷启动）时，退回到 SQLite 的 FTS5 全文索引表，再不行才用 ORM 的 icontains 查询。
+
+可搜索字段变化的事务提交后（模型信号和 assets_changed 信号），更新 FTS5 表并把这些资产追加到 SearchChange 变更日志。
+变更日志的 id 是各进程共享的版本号：每个进程的内存索引记下已经应用到的 id，每次查询前读出之后的变更并重新加载这些资产，
+所以 ingest_worker 或其他 Web 进程写入的数据在下一次查询时就能搜到。
+落后超过 SYNC_LIMIT 条，或者需要的日志已经被清理（只保留最近 JOURNAL_KEEP 条）时，改用 FTS5 查询并在后台重建索引。
+"""
+
+import bisect
+import logging
+import re
+import threading
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from . import models
+from . import signals
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # 变更日志保留的行数
+    'JOURNAL_KEEP': 100000,
+    # 一次同步最多应用的变更数，落后更多时在后台重建索引
+    'SYNC_LIMIT': 5000,
+}
+
+FTS_TABLE = 'assets_search_fts'
+# 并发提交时变更日志的 id 不一定按顺序可见，同步时多读这么多条已经应用过的日志，补上之前没看到的
+SYNC_OVERLAP = 100
+
+# 名称、序列号等字段除了整体之外，还按分隔符拆成小段，方便按其中一段查找
+WORD_SPLIT = re.compile(r'[^0-9a-z]+')
+MAC_SEPARATORS = re.compile(r'[:\-.]')
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ASSET_SEARCH', {}))
+    return config
+
+
+def _terms(value, split=True):
+    value = (value or '').strip().lower()
+    if not value:
+        return set()
+    terms = {value}
+    if split:
+        terms.update(part for part in WORD_SPLIT.split(value) if len(part) >= 2)
+    return terms
+
+
+def load_documents(asset_ids=None, rows=None):
+    """
+    读取资产及其网卡、CPU、标签的可搜索字段，共 4 次查询；
+    给出 assets_changed 信号带来的 rows 时，资产、网卡、CPU 直接取自其中，只查询标签。
+    返回 {asset_id: {'asset': 展示用字段, 'terms': 词集合, 'text': FTS 文本}}
+    """
+    assets = models.Asset.objects.order_by().values_list('id', 'name', 'sn', 'asset_type', 'manage_ip')
+    nics = models.NIC.objects.order_by().values_list('asset_id', 'mac', 'ip_address')
+    cpus = models.CPU.objects.order_by().values_list('asset_id', 'cpu_model')
+    tags = models.Asset.tags.through.objects.order_by()
+    if asset_ids is not None:
+        assets = assets.filter(id__in=asset_ids)
+        nics = nics.filter(asset_id__in=asset_ids)
+        cpus = cpus.filter(asset_id__in=asset_ids)
+        tags = tags.filter(asset_id__in=asset_ids)
+    if rows is not None:
+        entries = rows.values()
+        assets = [(entry['asset'].id, entry['asset'].name, entry['asset'].sn, entry['asset'].asset_type,
+                   entry['asset'].manage_ip) for entry in entries]
+        nics = [(nic.asset_id, nic.mac, nic.ip_address) for entry in entries for nic in entry.get('nic', ())]
+        cpus = [(entry['cpu'].asset_id, entry['cpu'].cpu_model) for entry in entries if entry.get('cpu') is not None]
+    documents = {}
+    for asset_id, name, sn, asset_type, manage_ip in assets:
+        documents[asset_id] = {
+            'asset': {'id': asset_id, 'name': name, 'sn': sn, 'asset_type': asset_type, 'manage_ip': manage_ip},
+            'values': [name, sn, manage_ip],
+            'terms': _terms(name) | _terms(sn) | _terms(manage_ip, split=False),
+        }
+    for asset_id, mac, ip_address in nics:
+        document = documents.get(asset_id)
+        if document is not None:
+            document['values'] += [mac, ip_address]
+            document['terms'] |= _terms(mac, split=False) | _terms(MAC_SEPARATORS.sub('', mac or ''), split=False)
+            document['terms'] |= _terms(ip_address, split=False)
+    for asset_id, cpu_model in cpus:
+        document = documents.get(asset_id)
+        if document is not None:
+            document['values'].append(cpu_model)
+            document['terms'] |= _terms(cpu_model)
+    for asset_id, tag_name in tags.values_list('asset_id', 'tag__name'):
+        document = documents.get(asset_id)
+        if document is not None:
+            document['values'].append(tag_name)
+            document['terms'] |= _terms(tag_name)
+    for document in documents.values():
+        document['text'] = ' '.join(value for value in document.pop('values') if value)
+    return documents
+
+
+class SearchIndex(object):
+    """进程内的倒排 + 前缀索引"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._postings = {}
+        self._sorted_terms = []
+        self._assets = {}
+        self._asset_terms = {}
+        # 已经应用到的变更日志 id，以及其中最近 SYNC_OVERLAP 条以内的 id
+        self.seen = 0
+        self._recent = set()
+        self.ready = False
+        self._building = False
+
+    def build(self):
+        # 先记下日志的位置再读取数据，读取期间的变化会在之后的同步中再应用一次
+        recent = list(models.SearchChange.objects.order_by('-id').values_list('id', flat=True)[:SYNC_OVERLAP])
+        documents = load_documents()
+        postings = {}
+        for asset_id, document in documents.items():
+            for term in document['terms']:
+                postings.setdefault(term, set()).add(asset_id)
+        with self._lock:
+            self._postings = postings
+            self._sorted_terms = sorted(postings)
+            self._assets = {asset_id: document['asset'] for asset_id, document in documents.items()}
+            self._asset_terms = {asset_id: document['terms'] for asset_id, document in documents.items()}
+            self.seen = max(recent, default=0)
+            self._recent = set(recent)
+            self.ready = True
+            self._building = False
+
+    def sync(self):
+        """
+        应用变更日志中还没有应用的变化，一条查询，没有变化时不再查询。
+        落后太多时把索引标记为未就绪并返回 False，由调用方改用 FTS5 并在后台重建。
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            # 另一个线程正在同步，这次查询使用当前的索引
+            return True
+        try:
+            limit = get_config()['SYNC_LIMIT']
+            rows = list(models.SearchChange.objects.filter(id__gt=self.seen - SYNC_OVERLAP).order_by('id')
+                        .values_list('id', 'asset_id')[:limit + SYNC_OVERLAP])
+            changes = [(change_id, asset_id) for change_id, asset_id in rows if change_id not in self._recent]
+            if not changes:
+                return True
+            if len(changes) >= limit or (rows[0][0] > self.seen + 1 and self._trimmed()):
+                with self._lock:
+                    self.ready = False
+                return False
+            asset_ids = {asset_id for _, asset_id in changes}
+            documents = load_documents(asset_ids)
+            self.update(documents, asset_ids - set(documents))
+            with self._lock:
+                self.seen = max(self.seen, changes[-1][0])
+                self._recent = {change_id for change_id in self._recent.union(change_id for change_id, _ in changes)
+                                if change_id > self.seen - SYNC_OVERLAP}
+            return True
+        finally:
+            self._sync_lock.release()
+
+    def _trimmed(self):
+        """索引之后的变更日志是否已经被清理"""
+        return not models.SearchChange.objects.filter(id__lte=max(self.seen, 1)).exists()
+
+    def build_in_background(self):
+        with self._lock:
+            if self.ready or self._building:
+                return
+            self._building = True
+        thread = threading.Thread(target=self._build_safely, name='asset-search-index', daemon=True)
+        thread.start()
+
+    def _build_safely(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception('资产搜索索引构建失败')
+            self._building = False
+        finally:
+            connection.close()
+
+    def update(self, documents, removed=()):
+        """用最新的文档替换对应资产的索引项；removed 中的资产从索引中删除"""
+        with self._lock:
+            for asset_id in list(removed) + list(documents):
+                for term in self._asset_terms.pop(asset_id, ()):
+                    posting = self._postings.get(term)
+                    if posting is None:
+                        continue
+                    posting.discard(asset_id)
+                    if not posting:
+                        del self._postings[term]
+                        position = bisect.bisect_left(self._sorted_terms, term)
+                        if position < len(self._sorted_terms) and self._sorted_terms[position] == term:
+                            del self._sorted_terms[position]
+                self._assets.pop(asset_id, None)
+            for asset_id, document in documents.items():
+                for term in document['terms']:
+                    posting = self._postings.get(term)
+                    if posting is None:
+                        self._postings[term] = posting = set()
+                        bisect.insort(self._sorted_terms, term)
+                    posting.add(asset_id)
+                self._asset_terms[asset_id] = document['terms']
+                self._assets[asset_id] = document['asset']
+
+    def _term_range(self, prefix):
+        lo = bisect.bisect_left(self._sorted_terms, prefix)
+        hi = bisect.bisect_left(self._sorted_terms, prefix + '\uffff', lo)
+        return lo, hi
+
+    def search(self, query, limit=20):
+        """
+        查询中的每个词都要匹配资产某个词的前缀（多个词之间是“与”的关系）。
+        先用匹配词数最少的查询词取候选集合，再逐个检查候选资产的词集合，凑够 limit 个即返回。
+        """
+        words = [word for word in query.lower().split() if word]
+        if not words:
+            return []
+        with self._lock:
+            ranges = sorted(((self._term_range(word), word) for word in words), key=lambda item: item[0][1] - item[0][0])
+            (lo, hi), _ = ranges[0]
+            others = [word for _, word in ranges[1:]]
+            found, seen = [], set()
+            for position in range(lo, hi):
+                for asset_id in self._postings[self._sorted_terms[position]]:
+                    if asset_id in seen:
+                        continue
+                    seen.add(asset_id)
+                    terms = self._asset_terms[asset_id]
+                    if all(any(t.startswith(word) for t in terms) for word in others):
+                        found.append(self._assets[asset_id])
+                        if len(found) >= limit:
+                            return found
+            return found
+
+
+index = SearchIndex()
+
+
+_fts_tables = {}
+
+
+def fts_available():
+    """FTS5 表是否存在；表只在迁移中建立，结果按数据库缓存，不必每次刷新都读一遍表名"""
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[name]
+
+
+def fts_rebuild():
+    """按当前数据全量重建 FTS5 表"""
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s' % FTS_TABLE)
+        cursor.executemany('INSERT INTO %s (rowid, body) VALUES (%%s, %%s)' % FTS_TABLE,
+                           [(asset_id, document['text']) for asset_id, document in load_documents().items()])
+
+
+def fts_update(documents, removed=()):
+    with connection.cursor() as cursor:
+        ids = list(removed) + list(documents)
+        if ids:
+            cursor.execute('DELETE FROM %s WHERE rowid IN (%s)' % (FTS_TABLE, ','.join(['%s'] * len(ids))), ids)
+        if documents:
+            cursor.executemany('INSERT INTO %s (rowid, body) VALUES (%%s, %%s)' % FTS_TABLE,
+                               [(asset_id, document['text']) for asset_id, document in documents.items()])
+
+
+def fts_search(query, limit=20):
+    # 每个查询词作为一个短语前缀查询，词之间为“与”
+    match = ' AND '.join('"%s"*' % word.replace('"', '""') for word in query.split())
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT rowid FROM %s WHERE %s MATCH %%s LIMIT %%s' % (FTS_TABLE, FTS_TABLE), [match, limit])
+        ids = [row[0] for row in cursor.fetchall()]
+    return _load_results(models.Asset.objects.filter(id__in=ids))
+
+
+def orm_search(query, limit=20):
+    """没有任何索引可用时的兜底查询，会扫描多张表"""
+    queryset = models.Asset.objects.all()
+    for word in query.split():
+        queryset = queryset.filter(
+            Q(name__icontains=word) | Q(sn__icontains=word) | Q(manage_ip__icontains=word) |
+            Q(nic__mac__icontains=word) | Q(nic__ip_address__icontains=word) |
+            Q(cpu__cpu_model__icontains=word) | Q(tags__name__icontains=word))
+    return _load_results(queryset.distinct()[:limit])
+
+
+def _load_results(queryset):
+    return list(queryset.values('id', 'name', 'sn', 'asset_type', 'manage_ip'))
+
+
+def search(query, limit=20):
+    """返回 (数据来源, 结果列表)，数据来源为 index、fts 或 orm"""
+    query = query.strip()
+    if not query:
+        return 'index', []
+    if index.ready and index.sync():
+        return 'index', index.search(query, limit)
+    index.build_in_background()
+    if fts_available():
+        try:
+            return 'fts', fts_search(query, limit)
+        except OperationalError:
+            logger.exception('FTS5 查询失败，改用 ORM 查询')
+    return 'orm', orm_search(query, limit)
+
+
+# ---- 增量更新 ----
+
+def refresh(ids, rows=None):
+    """更新这些资产的 FTS5 文档并写入变更日志，各进程的内存索引（包括本进程的）在下一次查询前同步"""
+    ids = set(ids)
+    documents = load_documents(ids, rows) if fts_available() else None
+    with transaction.atomic():
+        if documents is not None:
+            fts_update(documents, ids - set(documents))
+        log_changes(ids)
+
+
+def log_changes(ids):
+    """追加变更日志，并清理最近 JOURNAL_KEEP 条之前的日志"""
+    models.SearchChange.objects.bulk_create([models.SearchChange(asset_id=asset_id) for asset_id in sorted(ids)])
+    table = models.SearchChange._meta.db_table
+    with connection.cursor() as cursor:
+        # MySQL 不允许在 DELETE 的子查询中直接读同一张表，包一层派生表
+        cursor.execute('DELETE FROM {0} WHERE id <= (SELECT latest FROM (SELECT MAX(id) - %s AS latest FROM {0}) AS t)'
+                       .format(table), [get_config()['JOURNAL_KEEP']])
+
+
+def schedule_refresh(asset_ids):
+    """在当前事务提交后一次性刷新这些资产"""
+    signals.defer_until_commit(refresh, asset_ids)
+
+
+def _on_asset_change(sender, instance, **kwargs):
+    schedule_refresh([instance.pk])
+
+
+def _on_component_change(sender, instance, **kwargs):
+    schedule_refresh([instance.asset_id])
+
+
+def _on_tag_change(sender, instance, **kwargs):
+    schedule_refresh(models.Asset.tags.through.objects.filter(tag_id=instance.pk).values_list('asset_id', flat=True))
+
+
+def _on_tags_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        schedule_refresh([instance.pk])
+    elif action == 'pre_clear':
+        # 从标签一侧清空时，post_clear 中已经拿不到关联的资产
+        schedule_refresh(instance.asset_set.values_list('id', flat=True))
+    elif pk_set:
+        schedule_refresh(pk_set)
+
+
+def _on_assets_changed(sender, asset_ids, rows=None, **kwargs):
+    rows = signals.committed_rows(rows, refresh, asset_ids)
+    if rows is None:
+        schedule_refresh(asset_ids)
+    else:
+        refresh(asset_ids, rows)
+
+
+def connect_signals():
+    post_save.connect(_on_asset_change, sender=models.Asset, dispatch_uid='search_asset_save')
+    post_delete.connect(_on_asset_change, sender=models.Asset, dispatch_uid='search_asset_delete')
+    for model in (models.NIC, models.CPU):
+        post_save.connect(_on_component_change, sender=model, dispatch_uid='search_%s_save' % model.__name__)
+        post_delete.connect(_on_component_change, sender=model, dispatch_uid='search_%s_delete' % model.__name__)
+    post_save.connect(_on_tag_change, sender=models.Tag, dispatch_uid='search_tag_save')
+    m2m_changed.connect(_on_tags_m2m, sender=models.Asset.tags.through, dispatch_uid='search_tags_m2m')
+    signals.assets_changed.connect(_on_assets_changed, dispatch_uid='search_assets_changed')
@@ -0,0 +1,83 @@
+import threading
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import Signal
+
+from . import models
+
+# bulk_create / bulk_update 和 queryset.update() 不会触发模型的 post_save / post_delete，
+# 批量写入资产数据后，在事务提交时用这个信号通知哪些资产发生了变化。
+# rows 可选，为发送方写入后的数据 {asset_id: {'asset': Asset, 'server': Server, 'cpu': CPU, 'ram' / 'disk' / 'nic': [...]}}，
+# 没有对应行时 server / cpu 为 None；接收方可以直接使用，不必再查询同样的行（见 committed_rows）。
+assets_changed = Signal(providing_args=['asset_ids', 'rows'])
+# 批量写入或删除 EventLog 后发送，asset_ids 为涉及的资产（不在事务中等待提交，由接收方自行决定）
+events_changed = Signal(providing_args=['asset_ids'])
+
+# 每个线程（连接）各自登记：callback -> 当前事务中等待提交的 _Flusher
+_pending = threading.local()
+
+
+class _Flusher(object):
+    """一个事务中为 callback 登记的资产 id，提交后调用一次 callback(ids)"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.ids = set()
+
+    def __call__(self):
+        if self.ids:
+            self.callback(self.ids)
+
+
+def _flushers():
+    if not hasattr(_pending, 'flushers'):
+        _pending.flushers = {}
+    return _pending.flushers
+
+
+def defer_until_commit(callback, asset_ids):
+    """
+    登记需要刷新的资产 id，同一事务内多次登记的合并起来，事务提交后调用一次 callback(ids)。
+    事务回滚时回调被丢弃，下次登记时重新开始；不在事务中（包括在其他提交回调中）时立即调用。
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        callback(set(asset_ids))
+        return
+    flushers = _flushers()
+    flusher = flushers.get(callback)
+    if flusher is None or not any(func is flusher for _, func in connection.run_on_commit):
+        flusher = flushers[callback] = _Flusher(callback)
+        transaction.on_commit(flusher)
+    flusher.ids.update(asset_ids)
+
+
+def committed_rows(rows, callback, asset_ids):
+    """
+    assets_changed 带来的 rows 在事务提交之后才能直接使用；
+    在事务中收到信号时返回 None，接收方照常按 id 登记，提交后再从数据库读取。
+    可以直接使用时，同一事务中由模型信号（例如批量删除组件时的 post_delete）为 callback 登记的这些资产
+    已经包含在 rows 中，不再重复刷新；发送方需要在写入之前登记发送信号的提交回调，才能排在这些登记之前。
+    """
+    if rows is None or transaction.get_connection().in_atomic_block:
+        return None
+    flusher = _flushers().get(callback)
+    if flusher is not None:
+        flusher.ids.difference_update(asset_ids)
+    return rows
+
+
+def _on_host_delete(sender, instance, **kwargs):
+    """
+    宿主机删除时，虚拟机 Server 行上的 hosted_on 由 SET_NULL 用 queryset.update() 置空，不会触发模型信号；
+    删除之前找到这些虚拟机，提交后通过 assets_changed 通知（它们的历史、详情缓存和地址分组都随之变化）。
+    """
+    hosted = list(models.Server.objects.filter(hosted_on=instance).values_list('asset_id', flat=True))
+    if hosted:
+        transaction.on_commit(partial(assets_changed.send, sender=sender, asset_ids=hosted))
+
+
+def connect_signals():
+    pre_delete.connect(_on_host_delete, sender=models.Server, dispatch_uid='signals_host_delete')
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+在 Django 自带的 SQLite 后端上增加两个 OPTIONS：
+  pragmas    建立连接时执行的 PRAGMA，例如 journal_mode=WAL、synchronous=NORMAL、mmap_size
+  immediate  为 True 时事务以 BEGIN IMMEDIATE 开始
+
+默认的 BEGIN 是延迟事务，先读后写的事务在升级为写事务时如果别的连接正在写，
+SQLite 会立即返回 “database is locked”，不会按 busy_timeout 等待（等待可能造成死锁）。
+写连接用 BEGIN IMMEDIATE 在事务开始时就取得写锁，并发的写事务改为排队等待 busy_timeout。
+"""
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.begin = 'BEGIN IMMEDIATE' if params.pop('immediate', False) else 'BEGIN'
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute('PRAGMA %s = %s' % (name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(self.begin)
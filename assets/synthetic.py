@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+生成结构与客户端 InfoCollection.collect() 一致的模拟汇报数据，供性能测试使用。
+"""
+
+import copy
+import random
+import uuid
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+MANUFACTURERS = ('Dell Inc.', 'HP', 'Inspur', 'Huawei', 'Lenovo')
+SERVER_MODELS = ('PowerEdge R730', 'PowerEdge R740xd', 'ProLiant DL380 Gen10', 'NF5280M5', 'RH2288H V3')
+CPU_MODELS = ('Intel(R) Xeon(R) CPU E5-2680 v4 @ 2.40GHz', 'Intel(R) Xeon(R) Gold 6148 CPU @ 2.40GHz',
+              'Intel(R) Xeon(R) Silver 4114 CPU @ 2.20GHz')
+DISK_MODELS = (('SEAGATE', 'ST4000NM0025', 3726.0, 'SAS'), ('INTEL', 'SSDSC2KB960G8', 894.0, 'SSD'),
+               ('HGST', 'HUS726040ALA610', 3726.0, 'SATA'))
+NIC_MODELS = ('Intel Corporation Ethernet Controller X710 for 10GbE SFP+',
+              'Intel Corporation I350 Gigabit Network Connection',
+              'Broadcom Limited NetXtreme BCM5720 Gigabit Ethernet PCIe')
+
+
+def _hex(rng, length):
+    return ''.join(rng.choice('0123456789ABCDEF') for _ in range(length))
+
+
+def _mac(rng):
+    return ':'.join('%02x' % rng.randint(0, 255) for _ in range(6))
+
+
+def make_report(sn, rng=None, rams=16, disks=8, nics=4):
+    """生成一台服务器的完整汇报"""
+    rng = rng or random.Random(sn)
+    ram = [{
+        'slot': 'DIMM_%s%d' % ('ABCD'[i % 4], i // 4),
+        'capacity': 32768,
+        'model': 'DDR4 2666 MHz',
+        'manufacturer': 'Samsung',
+        'sn': _hex(rng, 8),
+    } for i in range(rams)]
+    disk = []
+    for i in range(disks):
+        manufacturer, model, capacity, iface_type = rng.choice(DISK_MODELS)
+        disk.append({
+            'slot': str(i),
+            'sn': '%s%s' % (model[:4], _hex(rng, 12)),
+            'model': model,
+            'manufacturer': manufacturer,
+            'capacity': capacity,
+            'iface_type': iface_type,
+        })
+    nic = [{
+        'name': 'eth%d' % i,
+        'mac': _mac(rng),
+        'model': rng.choice(NIC_MODELS),
+        'ip_address': '10.%d.%d.%d' % (rng.randint(0, 255), rng.randint(0, 255), rng.randint(1, 254)),
+        'net_mask': '255.255.255.0',
+        'bonding': 0,
+    } for i in range(nics)]
+    return {
+        'asset_type': 'server',
+        'sn': sn,
+        'manufacturer': rng.choice(MANUFACTURERS),
+        'model': rng.choice(SERVER_MODELS),
+        'uuid': str(uuid.UUID(int=rng.getrandbits(128))),
+        'wake_up_type': 'Power Switch',
+        'os_type': 'Linux',
+        'os_distribution': 'CentOS',
+        'os_release': 'CentOS Linux release 7.4.1708 (Core)',
+        'cpu_count': 2,
+        'cpu_core_count': rng.choice((20, 28, 40)),
+        'cpu_model': rng.choice(CPU_MODELS),
+        'ram': ram,
+        'ram_size': sum(item['capacity'] for item in ram),
+        'nic': nic,
+        'physical_disk_driver': disk,
+    }
+
+
+def mutate_report(report, rng):
+    """模拟一次硬件变化：换一块硬盘，或者网卡换了 IP，或者拔掉一条内存"""
+    report = copy.deepcopy(report)
+    choice = rng.randint(0, 2)
+    if choice == 0 and report['physical_disk_driver']:
+        disk = rng.choice(report['physical_disk_driver'])
+        disk['sn'] = '%s%s' % (disk['model'][:4], _hex(rng, 12))
+    elif choice == 1 and report['nic']:
+        nic = rng.choice(report['nic'])
+        nic['ip_address'] = '10.%d.%d.%d' % (rng.randint(0, 255), rng.randint(0, 255), rng.randint(1, 254))
+    elif report['ram']:
+        report['ram'].pop(rng.randrange(len(report['ram'])))
+        report['ram_size'] = sum(item['capacity'] for item in report['ram'])
+    return report
+
+
+def make_fleet(count, rng=None, prefix='AGENT'):
+    """生成 count 台服务器的完整汇报，每台的内存、硬盘、网卡数量各不相同"""
+    rng = rng or random.Random(0)
+    return [make_report('%s%06d' % (prefix, i), rng, rams=rng.choice((4, 8, 12, 16, 24, 32)),
+                        disks=rng.randint(1, 24), nics=rng.randint(1, 8))
+            for i in range(count)]
+
+
+@contextmanager
+def scratch_database(path=None):
+    """
+    切换到临时的测试数据库，结束后删除，不影响正式数据。
+    path 为 SQLite 测试库的文件路径（多线程访问或需要真实的磁盘开销时），不传时为内存数据库。
+    读写分离时，读连接（TEST MIRROR 为 default）也指向临时数据库。
+    """
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if path and connection.vendor == 'sqlite':
+        test_settings['NAME'] = path
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    mirrors = {}
+    for alias in connections:
+        if connections[alias].settings_dict.get('TEST', {}).get('MIRROR') == DEFAULT_DB_ALIAS:
+            mirrors[alias] = connections[alias].settings_dict['NAME']
+            connections[alias].close()
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield
+    finally:
+        for alias, name in mirrors.items():
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = name
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
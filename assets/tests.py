@@ -1,3 +1,938 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+from contextlib import ExitStack
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection, connections
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import asset_cache
+from . import bu_tree
+from . import capacity
+from . import conflicts
+from . import events
+from . import expiry
+from . import history
+from . import ingest_queue
+from . import metrics
+from . import models
+from . import search
+from . import views
+from . import wire
+from .approval import ApprovalBatch
+from .asset_handler import ReportBatch, report_fingerprint
+from .cache_backends import FileCache
+from .event_archive import EventArchive
+from .events import EventJournal, EventRecorder, drain, recording
+
+# 查询计划测试的数据规模，可以通过环境变量调小以加快本地测试
+PLAN_TEST_ASSETS = int(os.environ.get('ASSET_PLAN_TEST_SIZE', 100000))
+
+
+def server_report(sn, nics=2, **fields):
+    """一份完整的服务器汇报"""
+    report = {
+        'sn': sn, 'asset_type': 'server', 'manufacturer': 'Dell Inc.', 'model': 'R740',
+        'os_type': 'Linux', 'os_distribution': 'CentOS', 'os_release': 'CentOS 7',
+        'cpu_model': 'Xeon', 'cpu_count': 2, 'cpu_core_count': 32,
+        'ram': [{'slot': 'DIMM0', 'capacity': 32768}],
+        'physical_disk_driver': [{'sn': '%s-D0' % sn, 'slot': '0', 'capacity': 894.0}],
+        'nic': [{'name': 'eth%d' % n, 'model': 'X710', 'mac': '%s:%02d' % (sn, n)} for n in range(nics)],
+    }
+    report.update(fields)
+    return report
+
+
+def approve_report(report):
+    """汇报一台新资产并审批上线，返回资产 id"""
+    ReportBatch([report]).process()
+    zone = models.NewAssetApprovalZone.objects.get(sn=report['sn'])
+    return ApprovalBatch([zone.id]).process()[0]['asset_id']
+
+
+def delta_report(sn, base_hash, changed=None, components=None):
+    """相对 base_hash 的增量汇报"""
+    return {'report_type': 'delta', 'sn': sn, 'asset_type': 'server', 'base_hash': base_hash,
+            'report_hash': 'next-%s' % base_hash, 'changed': changed or {}, 'components': components or {}}
+
+
+def staff_get(view, *args, **params):
+    """以管理员身份直接调用视图，不经过会话和中间件，查询次数只包含视图本身"""
+    request = RequestFactory().get('/', params)
+    request.user = User(username='admin', is_staff=True)
+    return view(request, *args)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', '查询计划断言基于 SQLite 的 EXPLAIN QUERY PLAN')
+class QueryPlanTest(TestCase):
+    """在 10 万台资产的数据上检查高频查询是否命中索引、是否需要临时排序"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        now = timezone.now()
+        asset_types = [choice[0] for choice in models.Asset.asset_type_choice]
+        models.Asset.objects.bulk_create([
+            models.Asset(name='asset-%06d' % i, sn='SN%06d' % i, asset_type=rng.choice(asset_types),
+                         status=rng.randint(0, 4), manage_ip='10.%d.%d.%d' % (i >> 16, (i >> 8) & 255, i & 255))
+            for i in range(PLAN_TEST_ASSETS)
+        ])
+        asset_ids = list(models.Asset.objects.values_list('id', flat=True))
+        models.NIC.objects.bulk_create([
+            models.NIC(asset_id=asset_id, name='eth0', model='X710', mac='%012x' % asset_id,
+                       ip_address='172.16.%d.%d' % (asset_id >> 8 & 255, asset_id & 255))
+            for asset_id in asset_ids
+        ])
+        models.EventLog.objects.bulk_create([
+            models.EventLog(name='event', asset_id=rng.choice(asset_ids), event_type=rng.randint(0, 6), detail='')
+            for _ in range(PLAN_TEST_ASSETS)
+        ])
+        models.NewAssetApprovalZone.objects.bulk_create([
+            models.NewAssetApprovalZone(sn='NEW%06d' % i, data='{}', approved=i % 10 != 0)
+            for i in range(PLAN_TEST_ASSETS // 10)
+        ])
+        cls.since = now - datetime.timedelta(days=1)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertPlan(self, queryset, index, allow_sort=False):
+        """allow_sort: 点查询只返回几行，允许对结果做临时排序"""
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        if not allow_sort:
+            self.assertNotIn('USE TEMP B-TREE', plan, plan)
+
+    def test_asset_default_ordering(self):
+        self.assertPlan(models.Asset.objects.all()[:50], 'asset_ctime_id_idx')
+
+    def test_asset_keyset_page(self):
+        page = models.Asset.objects.filter(c_time__lte=timezone.now()).order_by('-c_time', '-id')[:50]
+        self.assertPlan(page, 'asset_ctime_id_idx')
+
+    def test_api_cursor_page(self):
+        now = timezone.now()
+        page = models.Asset.objects.order_by('-c_time', '-id').filter(c_time__lte=now).exclude(c_time=now, id__gte=10)
+        self.assertPlan(page[:51], 'asset_ctime_id_idx')
+
+    def test_asset_by_status(self):
+        self.assertPlan(models.Asset.objects.filter(status=3)[:50], 'asset_status_ctime_idx')
+
+    def test_asset_by_type_and_status(self):
+        self.assertPlan(models.Asset.objects.filter(asset_type='server', status=0)[:50], 'asset_type_status_idx')
+
+    def test_asset_by_manage_ip(self):
+        self.assertPlan(models.Asset.objects.filter(manage_ip='10.0.1.2'), 'asset_manage_ip_idx', allow_sort=True)
+
+    def test_nic_by_mac(self):
+        self.assertPlan(models.NIC.objects.filter(mac='00000000abcd'), 'nic_mac_idx')
+
+    def test_nic_by_ip(self):
+        self.assertPlan(models.NIC.objects.filter(ip_address='172.16.1.2'), 'nic_ip_address_idx')
+
+    def test_asset_events(self):
+        events = models.EventLog.objects.filter(asset_id=1).order_by('-date')[:20]
+        self.assertPlan(events, 'eventlog_asset_date_idx')
+
+    def test_events_by_type(self):
+        events = models.EventLog.objects.filter(event_type=1, date__gte=self.since).order_by('-date')
+        self.assertPlan(events, 'eventlog_type_date_idx')
+
+    def test_pending_approvals(self):
+        self.assertPlan(models.NewAssetApprovalZone.objects.filter(approved=False)[:50], 'approval_pending_idx')
+
+    def test_pending_by_component_mac(self):
+        components = models.NewAssetComponent.objects.filter(component='nic', mac='00:00:00:00:00:01')
+        pending = models.NewAssetApprovalZone.objects.filter(approved=False, id__in=components.values('approval_id'))
+        self.assertPlan(pending[:50], 'approval_component_mac_idx', allow_sort=True)
+
+
+class AssetApiTest(TestCase):
+    """资产列表 / 详情接口的查询次数不随每页条数增长，游标翻页不重不漏"""
+
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = models.Manufacturer.objects.create(name='Dell Inc.')
+        tags = [models.Tag.objects.create(name=name) for name in ('prod', 'db')]
+        host = None
+        for i in range(40):
+            asset = models.Asset.objects.create(name='asset-%02d' % i, sn='SN%02d' % i, manufacturer=manufacturer)
+            asset.tags.set(tags)
+            server = models.Server.objects.create(asset=asset, model='R740', hosted_on=host)
+            host = host or server
+            models.CPU.objects.create(asset=asset, cpu_model='Xeon')
+            for n in range(2):
+                models.RAM.objects.create(asset=asset, slot='DIMM%d' % n, capacity=32768)
+                models.Disk.objects.create(asset=asset, sn='D%02d%d' % (i, n), capacity=894.0)
+                models.NIC.objects.create(asset=asset, name='eth%d' % n, model='X710', mac='%02d:%d' % (i, n))
+        network = models.Asset.objects.create(name='switch-01', sn='SW01', asset_type='networkdevice')
+        models.NetworkDevice.objects.create(asset=network, model='S5720')
+
+    def get_page(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = staff_get(views.asset_list, **params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), len(queries)
+
+    def test_query_count_flat(self):
+        counts = {limit: self.get_page(limit=limit)[1] for limit in (1, 10, 41)}
+        self.assertEqual(len(set(counts.values())), 1, counts)
+        self.assertLessEqual(counts[1], 5)
+
+    def test_cursor_walk(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 7}
+            if cursor:
+                params['cursor'] = cursor
+            data, _ = self.get_page(**params)
+            seen += [item['id'] for item in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        expected = list(models.Asset.objects.order_by('-c_time', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_detail(self):
+        asset = models.Asset.objects.get(sn='SN05')
+        with CaptureQueriesContext(connection) as queries:
+            response = staff_get(views.asset_detail, asset.id)
+        data = json.loads(response.content)['result']
+        self.assertLessEqual(len(queries), 5)
+        self.assertEqual(data['sub_type']['type'], 'server')
+        self.assertEqual(data['sub_type']['hosted_on']['sn'], 'SN00')
+        self.assertEqual(len(data['nic']), 2)
+        self.assertEqual(data['tags'], ['db', 'prod'])
+
+    def test_bad_cursor(self):
+        response = staff_get(views.asset_list, cursor='not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_staff_only(self):
+        urls = [reverse('assets:asset_list'), reverse('assets:asset_detail', args=[1]), reverse('assets:export'),
+                reverse('assets:queue_stats'), reverse('assets:cache_stats'), reverse('metrics'),
+                reverse('assets:asset_history', args=[1]), reverse('assets:asset_history_diff', args=[1]),
+                reverse('assets:search'), reverse('assets:address_conflicts'), reverse('assets:approval_queue'),
+                reverse('assets:expiring')]
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+        self.client.force_login(User.objects.create_user('ops', is_staff=False))
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(reverse('assets:asset_list')).status_code, 200)
+
+
+class ReportEndpointTest(TestCase):
+
+    def post_reports(self, data, **headers):
+        return self.client.post(reverse('assets:report'), {'asset_data': json.dumps(data)}, **headers)
+
+    def test_invalid_types(self):
+        for data in ({'sn': ['a'], 'asset_type': 'server'}, {'sn': 'A1', 'asset_type': {'x': 1}},
+                     {'sn': 'A1', 'asset_type': 'server', 'report_type': 'delta', 'base_hash': ['h'],
+                      'report_hash': 'h'}):
+            response = self.post_reports(data)
+            self.assertEqual(response.status_code, 400, data)
+            self.assertEqual(response.json()['results'][0]['status'], 'error')
+        response = self.post_reports([{'sn': 7, 'asset_type': 'server'}, server_report('VALID01')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['sn'] for row in response.json()['results']], ['#0', 'VALID01'])
+
+    def post_body(self, body, **headers):
+        return self.client.post(reverse('assets:report'), body, content_type='application/json', **headers)
+
+    def test_wire_format(self):
+        body = wire.encode_body(server_report('WIRE01'))
+        response = self.post_body(body, HTTP_X_REPORT_FORMAT='2', HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.json()['results'][0]['status'], 'new_asset_zone')
+        # 不认识的格式版本返回 415，并告知服务器支持的版本，客户端据此退回表单格式
+        response = self.post_body(body, HTTP_X_REPORT_FORMAT='9', HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(response['X-Report-Format'], '1,2')
+        response = self.post_body(body, HTTP_X_REPORT_FORMAT='2', HTTP_CONTENT_ENCODING='br')
+        self.assertEqual(response.status_code, 415)
+
+    def test_gzip_size_cap(self):
+        # 解压后刚好超过上限的合法 JSON，压缩后只有几十 KB
+        body = gzip.compress(b'[' + b' ' * (wire.MAX_DECODED_SIZE - 1) + b']')
+        response = self.post_body(body, HTTP_X_REPORT_FORMAT='2', HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(wire.MAX_DECODED_SIZE), response.json()['message'])
+
+    def test_long_event_name(self):
+        # 资产名称为 'server: <sn>'，不超过 64 个字符
+        sn = 'S' * 56
+        approve_report(server_report(sn))
+        result, = ReportBatch([server_report(sn, os_release='CentOS 8')]).process()
+        self.assertEqual(result['status'], 'updated')
+        # SQLite 不检查长度，这里直接检查名称没有超过字段长度
+        names = models.EventLog.objects.filter(event_type=1).values_list('name', flat=True)
+        self.assertTrue(names)
+        self.assertTrue(all(len(name) <= 128 and name.endswith(': hardware_alternation') for name in names), names)
+
+    def test_unchanged_hash_skips_write(self):
+        asset = models.Asset.objects.get(id=approve_report(server_report('HASH01')))
+        events = models.EventLog.objects.count()
+        # 指纹与库中一致：不解析请求体，只有一条刷新 m_time 的 UPDATE
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('assets:report'), {'asset_data': 'not json'},
+                                        HTTP_X_ASSET_SN='HASH01', HTTP_X_REPORT_HASH=asset.report_hash)
+        self.assertEqual(response.json()['results'][0]['status'], 'unchanged')
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['UPDATE'])
+        self.assertGreater(models.Asset.objects.get(id=asset.id).m_time, asset.m_time)
+        # 不带请求头时，批次中指纹相同的汇报同样不写组件和事件
+        result, = ReportBatch([server_report('HASH01')]).process()
+        self.assertEqual(result['status'], 'unchanged')
+        self.assertEqual(models.EventLog.objects.count(), events)
+
+
+def count_queries(func):
+    """func() 在所有数据库连接上执行的查询数"""
+    captures = [CaptureQueriesContext(connections[alias]) for alias in connections]
+    with ExitStack() as stack:
+        for capture in captures:
+            stack.enter_context(capture)
+        func()
+    return sum(len(capture) for capture in captures)
+
+
+class ReportIngestTest(TransactionTestCase):
+    """已上线资产的汇报入库（包括提交后各接收方的刷新）查询次数固定，接收方直接使用批次中的数据，结果与重新查询一致"""
+    databases = '__all__'
+
+    def test_query_count_flat(self):
+        counts = {}
+        for nics in (2, 20):
+            sn = 'INGEST%02d' % nics
+            approve_report(server_report(sn, nics=nics))
+            report = server_report(sn, nics=nics, os_release='CentOS 8', ram=[{'slot': 'DIMM0', 'capacity': 65536}])
+            counts[nics] = count_queries(lambda: ReportBatch([report]).process())
+        self.assertEqual(counts, {2: 33, 20: 33})
+
+    def test_listeners_match_database(self):
+        asset_id = approve_report(server_report('INGEST01'))
+        report = server_report('INGEST01', nics=3, cpu_core_count=48, physical_disk_driver=[])
+        report['nic'][0]['ip_address'] = '10.1.1.1'
+        result, = ReportBatch([report]).process()
+        self.assertEqual(result['status'], 'updated')
+        head = models.AssetHistoryHead.objects.get(asset_id=asset_id)
+        self.assertEqual(head.version, 2)
+        self.assertEqual(history.unpack(head.state), history.load_states([asset_id])[asset_id])
+        self.assertEqual(list(models.AssetCapacity.objects.values_list(*capacity.CONTRIBUTION_FIELDS)),
+                         list(capacity.contribution_queryset().filter(id=asset_id)))
+        self.assertEqual(models.AddressEntry.objects.filter(asset_id=asset_id, kind='ip').count(), 1)
+        self.assertEqual(conflicts.scan()['new'], 0)
+
+
+class SearchIndexTest(TransactionTestCase):
+    """内存索引按变更日志同步其他进程写入的变化，落后太多时退回 FTS5；一批汇报只刷新一次"""
+    databases = '__all__'
+
+    def setUp(self):
+        patcher = mock.patch.object(search, 'index', search.SearchIndex())
+        self.index = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.asset = models.Asset.objects.create(name='web-bj-01', sn='SEARCH01')
+        self.index.build()
+
+    def test_sync_changes_from_other_process(self):
+        self.assertEqual(search.search('web-bj'), ('index', [mock.ANY]))
+        # 其他进程的写入：本进程没有收到信号，只能从变更日志得知
+        models.Asset.objects.filter(id=self.asset.id).update(name='db-sh-01')
+        models.SearchChange.objects.create(asset_id=self.asset.id)
+        source, results = search.search('db-sh')
+        self.assertEqual(source, 'index')
+        self.assertEqual([row['name'] for row in results], ['db-sh-01'])
+        self.assertEqual(search.search('web-bj'), ('index', []))
+
+    def test_fall_back_when_behind(self):
+        for i in range(3):
+            models.Asset.objects.create(name='cache-gz-%02d' % i, sn='SEARCH1%d' % i)
+        with override_settings(ASSET_SEARCH={'SYNC_LIMIT': 2}):
+            self.assertFalse(self.index.sync())
+        self.assertFalse(self.index.ready)
+        self.index.build()
+        self.assertEqual(len(search.search('cache-gz')[1]), 3)
+
+    def test_batch_refreshes_once(self):
+        asset = models.Asset.objects.create(name='server: SEARCH02', sn='SEARCH02', asset_type='server')
+        ReportBatch([server_report('SEARCH02', nics=2)]).process()
+        before = models.SearchChange.objects.count()
+        # 移除一块网卡：post_delete 和 assets_changed 都涉及这台资产，只刷新一次
+        ReportBatch([server_report('SEARCH02', nics=1)]).process()
+        self.assertEqual(models.SearchChange.objects.count() - before, 1)
+        self.assertEqual([row['id'] for row in search.search('search02:01')[1]], [])
+        self.assertEqual([row['id'] for row in search.search('search02:00')[1]], [asset.id])
+
+
+class DeltaReportTest(TestCase):
+
+    def test_delta_applies(self):
+        asset_id = approve_report(server_report('DELTA02'))
+        base_hash = models.Asset.objects.get(id=asset_id).report_hash
+        report = delta_report('DELTA02', base_hash, {'os_release': 'CentOS 8'}, {
+            'nic': {'added': [{'name': 'eth2', 'model': 'X710', 'mac': 'DELTA02:02'}],
+                    'removed': [{'name': 'eth0', 'model': 'X710', 'mac': 'DELTA02:00'}]},
+            'ram': {'changed': [{'slot': 'DIMM0', 'capacity': 65536}]},
+        })
+        result, = ReportBatch([report]).process()
+        self.assertEqual(result['status'], 'updated', result)
+        asset = models.Asset.objects.get(id=asset_id)
+        self.assertEqual(asset.report_hash, report['report_hash'])
+        self.assertEqual(asset.server.os_release, 'CentOS 8')
+        self.assertEqual(sorted(asset.nic_set.values_list('mac', flat=True)), ['DELTA02:01', 'DELTA02:02'])
+        self.assertEqual(list(asset.ram_set.values_list('slot', 'capacity')), [('DIMM0', 65536)])
+        # 汇报中没有的部分保持不变
+        self.assertEqual(asset.disk_set.count(), 1)
+        self.assertEqual(asset.cpu.cpu_core_count, 32)
+
+    def test_base_mismatch(self):
+        asset_id = approve_report(server_report('DELTA03'))
+        result, = ReportBatch([delta_report('DELTA03', 'stale', {'os_release': 'CentOS 8'})]).process()
+        self.assertEqual(result['status'], 'full_report_required')
+        self.assertEqual(models.Server.objects.get(asset_id=asset_id).os_release, 'CentOS 7')
+        # 未上线的资产没有基线
+        result, = ReportBatch([delta_report('DELTA04', 'any')]).process()
+        self.assertEqual(result['status'], 'full_report_required')
+        self.assertFalse(models.NewAssetApprovalZone.objects.filter(sn='DELTA04').exists())
+
+    def test_missing_base_row(self):
+        asset_id = approve_report(server_report('DELTA01'))
+        base_hash = models.Asset.objects.get(id=asset_id).report_hash
+        models.CPU.objects.filter(asset_id=asset_id).delete()
+        result, = ReportBatch([delta_report('DELTA01', base_hash, {'cpu_core_count': 64})]).process()
+        # 增量汇报只有变化的字段，不能据此补建 CPU 行
+        self.assertEqual(result['status'], 'full_report_required', result)
+        self.assertFalse(models.CPU.objects.filter(asset_id=asset_id).exists())
+        self.assertEqual(models.Asset.objects.get(id=asset_id).report_hash, base_hash)
+
+
+class EventRecorderTest(TestCase):
+
+    def test_coalesce_and_rollback(self):
+        asset = models.Asset.objects.create(name='events-01', sn='EVENTS01')
+        recorder = EventRecorder()
+        for _ in range(3):
+            recorder.record('nic', 'eth0 MAC 变更', asset=asset, component='nic')
+        recorder.record('ram', 'DIMM0 容量变更', asset=asset, component='ram')
+        self.assertEqual(len(recorder), 2)
+        # 撤销标记之后记录的事件，包括合并到已有事件上的那一次
+        mark = recorder.mark()
+        recorder.record('nic', 'eth0 MAC 变更', asset=asset, component='nic')
+        recorder.record('disk', '硬盘移除', asset=asset, component='disk')
+        recorder.rollback(mark)
+        self.assertEqual(len(recorder), 2)
+        self.assertEqual(recorder.flush(), 2)
+        self.assertEqual(len(recorder), 0)
+        memos = dict(models.EventLog.objects.values_list('component', 'memo'))
+        self.assertEqual(set(memos), {'nic', 'ram'})
+        self.assertIn('合并了 3 条', memos['nic'])
+        self.assertIsNone(memos['ram'])
+
+    def test_recording_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with recording() as recorder:
+                recorder.record('asset', '状态变更')
+                raise RuntimeError('boom')
+        self.assertFalse(models.EventLog.objects.exists())
+
+
+class AssetHistoryTest(TestCase):
+
+    @override_settings(ASSET_HISTORY={'SNAPSHOT_EVERY': 3})
+    def test_state_at_across_snapshots(self):
+        asset = models.Asset.objects.create(name='history-01', sn='HISTORY01')
+        models.Server.objects.create(asset=asset, os_release='CentOS 7.0')
+        models.NIC.objects.create(asset=asset, name='eth0', mac='aa:00')
+        start = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        expected = {}
+        for i in range(8):
+            models.Server.objects.filter(asset=asset).update(os_release='CentOS 7.%d' % i)
+            if i == 4:
+                models.NIC.objects.create(asset=asset, name='eth1', mac='aa:01')
+            when = start + datetime.timedelta(hours=i)
+            self.assertEqual(history.record([asset.id], now=when), 1)
+            expected[i + 1] = (when, history.load_states([asset.id])[asset.id])
+        self.assertEqual(list(models.AssetSnapshot.objects.filter(asset_id=asset.id).order_by('version')
+                              .values_list('version', flat=True)), [1, 4, 7])
+        # 每个版本之后的任意时刻都还原出当时的状态，不论中间隔了几份快照
+        for version, (when, state) in expected.items():
+            self.assertEqual(history.state_at(asset.id, when + datetime.timedelta(minutes=30)), (version, state))
+        self.assertEqual(history.state_at(asset.id, start - datetime.timedelta(hours=1)), (0, None))
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(reverse('assets:asset_history_diff', args=[asset.id]), {
+            'from': (start + datetime.timedelta(hours=1, minutes=30)).isoformat(),
+            'to': (start + datetime.timedelta(hours=7, minutes=30)).isoformat()})
+        data = response.json()
+        self.assertEqual((data['from_version'], data['to_version']), (2, 8))
+        self.assertEqual(data['changes']['server']['changed'], {'': {'os_release': ['CentOS 7.1', 'CentOS 7.7']}})
+        self.assertEqual([row['name'] for row in data['changes']['nic']['added'].values()], ['eth1'])
+
+
+class ApprovalTest(TestCase):
+
+    def test_approve_server(self):
+        ReportBatch([server_report('APPROVE01')]).process()
+        zone = models.NewAssetApprovalZone.objects.get(sn='APPROVE01')
+        result, = ApprovalBatch([zone.id]).process()
+        self.assertEqual(result['status'], 'approved', result)
+        asset = models.Asset.objects.get(id=result['asset_id'])
+        self.assertEqual(asset.server.os_release, 'CentOS 7')
+        self.assertEqual(asset.nic_set.count(), 2)
+        # 系统版本只记录在服务器上，审批不创建软件授权记录
+        self.assertFalse(models.Software.objects.exists())
+
+    def test_long_event_names(self):
+        # 资产名称为 'server: <sn>'，sn 再长就无法生成名称，审批失败
+        for sn in ('S' * 56, 'F' * 128):
+            ReportBatch([server_report(sn)]).process()
+        zones = models.NewAssetApprovalZone.objects.order_by('sn').values_list('id', flat=True)
+        results = ApprovalBatch(zones).process()
+        self.assertEqual(sorted(result['status'] for result in results), ['approved', 'error'])
+        names = dict(models.EventLog.objects.values_list('event_type', 'name'))
+        self.assertTrue(names[2].endswith(': increased_asset'))
+        self.assertTrue(all(len(name) <= 128 for name in names.values()), names)
+
+
+class AssetCacheTest(TransactionTestCase):
+    """详情缓存命中时只查询 m_time，组件变化提交后立即失效"""
+    # 读写分离的配置下，事务之外的读取走读连接
+    databases = '__all__'
+
+    def setUp(self):
+        asset_cache.clear()
+        self.asset = models.Asset.objects.create(name='cache-01', sn='CACHE01')
+        models.NIC.objects.create(asset=self.asset, name='eth0', mac='aa:01')
+
+    def get_detail(self):
+        captures = [CaptureQueriesContext(connections[alias]) for alias in connections]
+        with ExitStack() as stack:
+            for capture in captures:
+                stack.enter_context(capture)
+            response = staff_get(views.asset_detail, self.asset.id)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)['result'], sum(len(capture) for capture in captures)
+
+    def test_hit_and_invalidate(self):
+        self.get_detail()
+        data, queries = self.get_detail()
+        self.assertEqual(queries, 1)
+        self.assertEqual([nic['mac'] for nic in data['nic']], ['aa:01'])
+        models.NIC.objects.create(asset=self.asset, name='eth1', mac='aa:02')
+        data, queries = self.get_detail()
+        self.assertGreater(queries, 1)
+        self.assertEqual([nic['mac'] for nic in data['nic']], ['aa:01', 'aa:02'])
+        asset_id = self.asset.id
+        self.asset.delete()
+        with self.assertRaises(Http404):
+            staff_get(views.asset_detail, asset_id)
+
+    def test_host_delete_keeps_vm(self):
+        host = models.Server.objects.create(asset=models.Asset.objects.create(name='host-01', sn='HOST01'))
+        models.Server.objects.create(asset=self.asset, hosted_on=host)
+        self.assertEqual(self.get_detail()[0]['sub_type']['hosted_on']['sn'], 'HOST01')
+        host.asset.delete()
+        # 虚拟机保留，宿主机置空；详情缓存和历史都收到了变化
+        self.assertIsNone(models.Server.objects.get(asset=self.asset).hosted_on_id)
+        self.assertNotIn('hosted_on', self.get_detail()[0]['sub_type'])
+        self.assertIsNone(history.state_at(self.asset.id)[1]['server']['']['hosted_on_id'])
+
+    def test_bump_from_other_process(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        backend = {'BACKEND': 'assets.cache_backends.FileCache', 'LOCATION': location, 'TIMEOUT': None}
+        with override_settings(CACHES=dict(settings.CACHES, assets=backend)):
+            self.get_detail()
+            self.assertEqual(self.get_detail()[1], 1)
+            # 另一个进程（ingest_worker）写入数据并改写版本号：没有信号到达本进程，只能通过共享的缓存得知
+            models.NIC.objects.filter(asset=self.asset).update(mac='aa:03')
+            other = FileCache(location, backend)
+            with mock.patch.object(asset_cache, 'get_cache', return_value=other):
+                asset_cache.bump([self.asset.id])
+            data, queries = self.get_detail()
+            self.assertGreater(queries, 1)
+            self.assertEqual([nic['mac'] for nic in data['nic']], ['aa:03'])
+
+
+class BusinessUnitTreeTest(TestCase):
+
+    def closure(self):
+        return set(models.BusinessUnitClosure.objects.values_list('ancestor__name', 'descendant__name', 'depth'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.closure()
+        bu_tree.rebuild_closure()
+        self.assertEqual(incremental, self.closure())
+
+    def test_closure_after_move_and_delete(self):
+        a = models.BusinessUnit.objects.create(name='a')
+        b = models.BusinessUnit.objects.create(name='b', parent_unit=a)
+        models.BusinessUnit.objects.create(name='c', parent_unit=b)
+        d = models.BusinessUnit.objects.create(name='d')
+        b.parent_unit = d
+        b.save()
+        self.assertEqual(self.closure(), {('a', 'a', 0), ('b', 'b', 0), ('c', 'c', 0), ('d', 'd', 0),
+                                          ('d', 'b', 1), ('d', 'c', 2), ('b', 'c', 1)})
+        self.assertMatchesRebuild()
+        # 删除后下级业务线成为顶级业务线
+        d.delete()
+        self.assertEqual(self.closure(), {('a', 'a', 0), ('b', 'b', 0), ('c', 'c', 0), ('b', 'c', 1)})
+        self.assertMatchesRebuild()
+        self.assertEqual([unit.name for unit in models.BusinessUnit.objects.get(name='c').ancestors()], ['c', 'b'])
+
+    def test_cycle_rejected(self):
+        root = models.BusinessUnit.objects.create(name='root')
+        child = models.BusinessUnit.objects.create(name='child', parent_unit=root)
+        root.parent_unit = child
+        with self.assertRaises(ValidationError):
+            root.save()
+        # 管理后台的表单显示错误，不返回 500
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        response = self.client.post(reverse('admin:assets_businessunit_change', args=[root.id]),
+                                    {'name': 'root', 'parent_unit': child.id, 'memo': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('parent_unit', response.context['adminform'].form.errors)
+        root.refresh_from_db()
+        self.assertIsNone(root.parent_unit_id)
+
+    def test_invalidate_from_other_process(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        backend = {'BACKEND': 'assets.cache_backends.FileCache', 'LOCATION': location, 'TIMEOUT': None}
+        unit = models.BusinessUnit.objects.create(name='before')
+        with override_settings(CACHES=dict(settings.CACHES, assets=backend)):
+            self.assertEqual(bu_tree.tree_cache.nodes()[unit.id]['name'], 'before')
+            # 另一个进程修改业务线并换了版本号：只能通过共享的缓存得知
+            models.BusinessUnit.objects.filter(id=unit.id).update(name='after')
+            other = FileCache(location, backend)
+            with mock.patch.object(asset_cache, 'get_cache', return_value=other):
+                bu_tree.TreeCache().invalidate()
+            self.assertIsNotNone(other.get(bu_tree.VERSION_KEY))
+            self.assertEqual(bu_tree.tree_cache.nodes()[unit.id]['name'], 'after')
+            # 版本号被淘汰后重新生成，同样会触发重新加载
+            models.BusinessUnit.objects.filter(id=unit.id).update(name='evicted')
+            other.delete(bu_tree.VERSION_KEY)
+            self.assertEqual(bu_tree.tree_cache.nodes()[unit.id]['name'], 'evicted')
+
+
+class CapacityTest(TransactionTestCase):
+    """业务线汇总包含所有下级业务线，上级关系从闭包表读取"""
+    databases = '__all__'
+
+    def business_unit_totals(self):
+        return {unit_id: (row['asset_count'], row['cpu_cores'])
+                for unit_id, row in capacity.summary('business_unit').items()}
+
+    def rollups(self):
+        # 增量更新可能留下全为 0 的行，整体重算时不会生成
+        return {row[:3]: row[3:] for row in models.CapacityRollup.objects.values_list(
+            'scope', 'scope_id', 'status', *capacity.METRICS) if any(row[3:])}
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        capacity.rebuild()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_rollups_follow_changes(self):
+        root = models.BusinessUnit.objects.create(name='root')
+        other = models.BusinessUnit.objects.create(name='other')
+        child = models.BusinessUnit.objects.create(name='child', parent_unit=root)
+        asset = models.Asset.objects.create(name='capacity-02', sn='CAPACITY02', business_unit=child)
+        models.CPU.objects.create(asset=asset, cpu_model='Xeon', cpu_core_count=16)
+        disk = models.Disk.objects.create(asset=asset, sn='CAPACITY02-D0', capacity=894.0)
+        models.RAM.objects.create(asset=asset, slot='DIMM0', capacity=32768)
+        self.assertEqual(capacity.summary('business_unit')[root.id]['ram_mb'], 32768)
+        models.RAM.objects.create(asset=asset, slot='DIMM1', capacity=32768)
+        disk.delete()
+        totals = capacity.summary('business_unit')[root.id]
+        self.assertEqual((totals['ram_mb'], totals['disk_gb']), (65536, 0))
+        self.assertMatchesRebuild()
+        child.parent_unit = other
+        child.save()
+        self.assertEqual(set(self.business_unit_totals()), {other.id, child.id})
+        self.assertMatchesRebuild()
+
+    def test_move_seen_without_cache_invalidation(self):
+        root = models.BusinessUnit.objects.create(name='root')
+        other = models.BusinessUnit.objects.create(name='other')
+        child = models.BusinessUnit.objects.create(name='child', parent_unit=root)
+        asset = models.Asset.objects.create(name='capacity-01', sn='CAPACITY01', business_unit=child)
+        bu_tree.tree_cache.ancestors()
+        # 另一个进程移动业务线：本进程的业务线树缓存没有收到失效通知
+        with mock.patch.object(bu_tree.tree_cache, 'invalidate'):
+            child.parent_unit = other
+            child.save()
+        self.assertEqual(bu_tree.tree_cache.ancestors()[child.id], [child.id, root.id])
+        models.CPU.objects.create(asset=asset, cpu_model='Xeon', cpu_core_count=16)
+        self.assertEqual(self.business_unit_totals(), {other.id: (1, 16), child.id: (1, 16)})
+
+
+class IngestQueueTest(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.queue = ingest_queue.IngestQueue(os.path.join(location, 'queue.sqlite3'), ingest_queue.get_config())
+        self.addCleanup(lambda: self.queue.conn.close())
+
+    def queued(self):
+        return self.queue.conn.execute('SELECT sn, claimed_at, last_error FROM report_queue ORDER BY id').fetchall()
+
+    def test_claim_release_and_visibility_timeout(self):
+        config = self.queue.config
+        self.queue.enqueue([server_report('QUEUE%02d' % i) for i in range(3)])
+        with mock.patch.object(ingest_queue, 'time') as clock:
+            clock.time.return_value = 1000.0
+            first = self.queue.claim(2)
+            self.assertEqual([data['sn'] for _, _, data in first], ['QUEUE00', 'QUEUE01'])
+            # 已被领取、尚未超时的记录不会再次投递
+            self.assertEqual([data['sn'] for _, _, data in self.queue.claim(10)], ['QUEUE02'])
+            self.assertEqual(self.queue.claim(10), [])
+            self.queue.release([first[0][0]], 'boom')
+            self.assertEqual([item[0] for item in self.queue.claim(10)], [first[0][0]])
+            self.assertEqual(self.queue.stats()['in_flight'], 3)
+            # 超过可见性超时仍未确认的记录重新投递
+            clock.time.return_value = 1000.0 + config['VISIBILITY_TIMEOUT'] + 1
+            again = self.queue.claim(10)
+            self.assertEqual(len(again), 3)
+            self.queue.ack([item[0] for item in again[1:]])
+            # 达到最大尝试次数后不再投递，计入 dead
+            for _ in range(config['MAX_ATTEMPTS']):
+                clock.time.return_value += config['VISIBILITY_TIMEOUT'] + 1
+                self.queue.claim(10)
+            self.assertEqual(self.queue.claim(10), [])
+            stats = self.queue.stats()
+        self.assertEqual((stats['depth'], stats['dead']), (0, 1))
+
+    def test_split_rounds(self):
+        claimed = [(1, 0, {'sn': 'A'}), (2, 0, {'sn': 'B'}), (3, 0, {'sn': 'A'}), (4, 0, {'sn': 'A'}),
+                   (5, 0, {'sn': 'C'})]
+        rounds = ingest_queue.split_rounds(claimed)
+        self.assertEqual([[item[0] for item in items] for items in rounds], [[1, 2, 5], [3], [4]])
+
+    def test_failed_round_releases_only_the_rest(self):
+        self.queue.enqueue([server_report('QUEUE01'), server_report('QUEUE02'),
+                            server_report('QUEUE01', os_release='CentOS 8')])
+        original, calls = ReportBatch.process, []
+
+        def process(batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise RuntimeError('boom')
+            return original(batch)
+        with mock.patch.object(ReportBatch, 'process', process), self.assertLogs(ingest_queue.logger, 'ERROR'):
+            self.assertEqual(ingest_queue.process_batch(self.queue, 10), 3)
+        # 第一轮已经提交并确认，只有第二轮的汇报放回队列
+        self.assertEqual(set(models.NewAssetApprovalZone.objects.values_list('sn', flat=True)), {'QUEUE01', 'QUEUE02'})
+        self.assertEqual(self.queued(), [('QUEUE01', None, "RuntimeError('boom')")])
+
+    def test_stale_delta_rejected_before_enqueue(self):
+        asset_id = approve_report(server_report('QUEUE03'))
+        base_hash = models.Asset.objects.get(id=asset_id).report_hash
+        full = server_report('QUEUE03', os_release='CentOS 8')
+        reports = [delta_report('QUEUE03', 'stale'), delta_report('QUEUE03', base_hash),
+                   full, delta_report('QUEUE03', report_fingerprint(full))]
+        with override_settings(ASSET_INGEST={'ASYNC': True, 'QUEUE_PATH': self.queue.path}):
+            response = self.client.post(reverse('assets:report'), {'asset_data': json.dumps(reports)})
+            # 基线不一致的增量汇报当场要求完整汇报；排在前面的汇报作为后续增量汇报的基线
+            self.assertEqual([row['status'] for row in response.json()['results']],
+                             ['full_report_required', 'queued', 'queued', 'queued'])
+            self.assertEqual(response.status_code, 202)
+            response = self.client.post(reverse('assets:report'),
+                                        {'asset_data': json.dumps(delta_report('QUEUE04', 'any'))})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'][0]['status'], 'full_report_required')
+        self.assertEqual(len(self.queued()), 3)
+
+    def test_rejected_reports_go_dead(self):
+        approve_report(server_report('QUEUE05'))
+        self.queue.enqueue([delta_report('QUEUE05', 'stale'), server_report('QUEUE06')])
+        with self.assertLogs(ingest_queue.logger, 'WARNING'):
+            self.assertEqual(ingest_queue.process_batch(self.queue, 10), 2)
+        # 入库时被拒绝的汇报不会被当作已入库确认，连同原因留在队列中
+        (sn, claimed_at, error), = self.queued()
+        self.assertEqual((sn, claimed_at), ('QUEUE05', None))
+        self.assertTrue(error.startswith('full_report_required'), error)
+        self.assertEqual(self.queue.claim(10), [])
+        self.assertEqual(self.queue.stats()['dead'], 1)
+
+
+class EventJournalTest(TestCase):
+    """多个进程共用同一个日志文件，每条事件只写入 EventLog 一次"""
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        path = os.path.join(location, 'journal.sqlite3')
+        self.first, self.second = EventJournal(path, claim_timeout=60), EventJournal(path, claim_timeout=60)
+        for journal in (self.first, self.second):
+            self.addCleanup(lambda journal=journal: journal.conn.close())
+
+    def make_events(self, count):
+        return [models.EventLog(name='journal-%02d' % i, detail='detail') for i in range(count)]
+
+    def test_claim_is_exclusive(self):
+        self.first.append(self.make_events(5))
+        claimed = self.first.claim(3)
+        # 另一个进程只能领到剩下的事件
+        self.assertEqual(drain(self.second, 2), 2)
+        self.assertEqual(drain(self.second, 2), 0)
+        self.first.delete([row[0] for row in claimed[:1]])
+        self.first.release([row[0] for row in claimed[1:]])
+        self.assertEqual(drain(self.second, 10), 2)
+        self.assertEqual(self.first.depth(), 0)
+        self.assertEqual(sorted(models.EventLog.objects.values_list('name', flat=True)),
+                         ['journal-%02d' % i for i in range(1, 5)])
+
+    def test_failed_and_abandoned_claims(self):
+        self.first.append(self.make_events(2))
+        with mock.patch.object(models.EventLog.objects, 'bulk_create', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                drain(self.first, 10)
+        # 写入失败的事件放回日志；领取后崩溃的事件在超时后被重新领取
+        self.assertEqual(len(self.second.claim(10)), 2)
+        self.assertEqual(drain(self.first, 10), 0)
+        with mock.patch.object(events, 'time') as clock:
+            clock.time.return_value = time.time() + 61
+            self.assertEqual(drain(self.first, 10), 2)
+        self.assertEqual(models.EventLog.objects.filter(name__startswith='journal-').count(), 2)
+
+
+class EventArchiveTest(TransactionTestCase):
+    """归档中途中断后重新运行，事件既不丢失也不重复，按资产和时间范围查询只返回命中的事件"""
+    databases = '__all__'
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.archive = EventArchive(location)
+        self.addCleanup(self.archive.close)
+
+    def add_event(self, asset, when):
+        event = models.EventLog.objects.create(name='event', asset=asset, detail='detail')
+        models.EventLog.objects.filter(id=event.id).update(date=when)
+        return event.id
+
+    def test_archive_recover_query(self):
+        first = models.Asset.objects.create(name='archive-01', sn='ARCHIVE01')
+        second = models.Asset.objects.create(name='archive-02', sn='ARCHIVE02')
+        utc = datetime.timezone.utc
+        old = {asset.id: [self.add_event(asset, datetime.datetime(2026, month, day, tzinfo=utc))
+                          for month in (1, 2) for day in (3, 20)] for asset in (first, second)}
+        recent = self.add_event(first, timezone.now())
+        cutoff = datetime.datetime(2026, 6, 1, tzinfo=utc)
+
+        # 第一个成员写入并登记后、删除业务库中的事件之前中断，文件末尾还留下半截数据
+        with mock.patch.object(EventArchive, '_delete_events', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                self.archive.archive(cutoff)
+        with open(self.archive.path('events-2026-01.jsonl.gz'), 'ab') as f:
+            f.write(b'partial member')
+        self.assertEqual(self.archive.archive(cutoff), 4)
+
+        self.assertEqual(list(models.EventLog.objects.values_list('id', flat=True)), [recent])
+        self.assertEqual(self.archive.stats()['events'], 8)
+        self.assertEqual([event['id'] for event in self.archive.query(first.id)], old[first.id])
+        february = [event['id'] for event in self.archive.query(
+            second.id, datetime.datetime(2026, 2, 1, tzinfo=utc), datetime.datetime(2026, 2, 10, tzinfo=utc))]
+        self.assertEqual(february, old[second.id][2:3])
+
+
+class ExpiryCalendarTest(TransactionTestCase):
+    """资产和合同保存后日历随之刷新，授权按合同下服务器的系统版本统计，每个到期日只提醒一次"""
+    databases = '__all__'
+
+    def test_calendar_and_notices(self):
+        today = timezone.localdate()
+        contract = models.Contract.objects.create(sn='C-01', name='os-support', price=1,
+                                                  end_day=today + datetime.timedelta(days=10), license_num=2)
+        models.Software.objects.create(version='CentOS 7', license_num=3)
+        for i in range(3):
+            asset = models.Asset.objects.create(name='expiry-%02d' % i, sn='EXPIRY%02d' % i, contract=contract,
+                                                expire_day=today + datetime.timedelta(days=5 * i))
+            models.Server.objects.create(asset=asset, os_release='CentOS 7')
+        self.assertEqual(expiry.refresh_licenses(), 1)
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(reverse('assets:expiring'), {'days': 7})
+        data = response.json()
+        self.assertEqual(data['counts'], {'warranty': 2, 'contract': 0, 'license': 0})
+        self.assertEqual([row['name'] for row in data['results']], ['expiry-00', 'expiry-01'])
+        license_row = expiry.expiring(days=30, kind='license')['results'][0]
+        # 合同到期后剩 1 个授权，3 台服务器在用
+        self.assertEqual(license_row['shortfall'], 2)
+
+        self.assertEqual(expiry.notify(days=10), {'warranty': 3, 'contract': 1, 'license': 1})
+        self.assertEqual(expiry.notify(days=10), {'warranty': 0, 'contract': 0, 'license': 0})
+        asset = models.Asset.objects.get(name='expiry-00')
+        asset.expire_day = today + datetime.timedelta(days=1)
+        asset.save()
+        self.assertEqual(expiry.notify(days=10)['warranty'], 1)
+        self.assertEqual(models.EventLog.objects.filter(asset=asset, event_type=expiry.EVENT_TYPE).count(), 2)
+        asset_id = asset.id
+        asset.delete()
+        self.assertFalse(models.ExpiryEntry.objects.filter(kind='warranty', object_id=asset_id).exists())
+
+
+class AddressConflictTest(TransactionTestCase):
+    """重复的 IP / MAC 在提交后进入冲突表，虚拟机与宿主机共用的值不算冲突，增量结果与全量扫描一致"""
+    databases = '__all__'
+
+    def test_conflicts(self):
+        host = models.Asset.objects.create(name='host-01', sn='HOST01', manage_ip='10.0.0.1')
+        host_server = models.Server.objects.create(asset=host)
+        vm = models.Asset.objects.create(name='vm-01', sn='VM01')
+        models.Server.objects.create(asset=vm, hosted_on=host_server)
+        other = models.Asset.objects.create(name='other-01', sn='OTHER01')
+        models.NIC.objects.create(asset=host, name='vnet0', mac='52:54:00:AA:BB:01')
+        models.NIC.objects.create(asset=vm, name='eth0', mac='52-54-00-aa-bb-01', ip_address='10.0.0.2')
+        nic = models.NIC.objects.create(asset=other, name='eth0', mac='52:54:00:aa:bb:02', ip_address='10.0.0.1')
+        models.NIC.objects.create(asset=other, name='lo', mac='00:00:00:00:00:00', ip_address='127.0.0.1')
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(reverse('assets:address_conflicts'))
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        conflict = data['results'][0]
+        self.assertEqual((conflict['kind'], conflict['value']), ('ip', '10.0.0.1'))
+        self.assertEqual({(asset['name'], tuple(asset['sources'])) for asset in conflict['assets']},
+                         {('host-01', ('asset.manage_ip',)), ('other-01', ('nic.ip_address',))})
+        self.assertEqual(conflicts.scan(), {'conflicts': {'ip': 1, 'mac': 0, 'sn': 0}, 'new': 0, 'resolved': 0})
+
+        # 虚拟机迁走后不再与原宿主机同组，MAC 冲突出现
+        models.Server.objects.filter(asset=vm).update(hosted_on=None)
+        conflicts.refresh([vm.id])
+        self.assertEqual(set(models.AddressConflict.objects.values_list('kind', 'value')),
+                         {('ip', '10.0.0.1'), ('mac', '525400aabb01')})
+        nic.ip_address = '10.0.0.3'
+        nic.save()
+        self.assertEqual(conflicts.conflicts('ip')[0], 0)
+        self.assertEqual(conflicts.scan()['resolved'], 0)
+
+
+class MetricsTest(TestCase):
+
+    def test_metrics_endpoint(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        metrics.registry.reset()
+        self.client.get(reverse('assets:asset_list'))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('asset_http_requests_total{view="assets:asset_list",method="GET",status="200"} 1', body)
+        self.assertIn('asset_http_request_duration_seconds_count{view="assets:asset_list",method="GET"} 1', body)
+        self.assertIn('asset_db_queries_total{view="assets:asset_list"}', body)
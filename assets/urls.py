@@ -0,0 +1,23 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'assets'
+
+urlpatterns = [
+    path('report/', views.report, name='report'),
+    path('report/queue/', views.queue_stats, name='queue_stats'),
+    path('approval/', views.approve_assets, name='approve_assets'),
+    path('approval/pending/', views.approval_queue, name='approval_queue'),
+    path('search/', views.search, name='search'),
+    path('api/assets/', views.asset_list, name='asset_list'),
+    path('api/assets/<int:asset_id>/', views.asset_detail, name='asset_detail'),
+    path('api/assets/cache/', views.cache_stats, name='cache_stats'),
+    path('api/assets/<int:asset_id>/history/', views.asset_history, name='asset_history'),
+    path('api/assets/<int:asset_id>/history/diff/', views.asset_history_diff, name='asset_history_diff'),
+    path('export/', views.export_inventory, name='export'),
+    path('api/expiring/', views.expiring, name='expiring'),
+    path('api/conflicts/', views.address_conflicts, name='address_conflicts'),
+    path('capacity/', views.capacity_summary, name='capacity'),
+    path('business-units/tree/', views.business_unit_tree, name='business_unit_tree'),
+]
@@ -1,3 +1,347 @@
-from django.shortcuts import render
+import functools
+import json
 
-# Create your views here.
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from . import api
+from . import approval
+from . import asset_cache
+from . import asset_handler
+from . import bu_tree
+from . import capacity
+from . import conflicts
+from . import expiry
+from . import export
+from . import history
+from . import ingest_queue
+from . import metrics as asset_metrics
+from . import search as asset_search
+from . import wire
+
+
+def staff_required(view):
+    """只允许管理员访问的视图，与 approve_assets 的权限检查相同"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_staff:
+            return JsonResponse({'status': 'error', 'message': '没有访问权限！'}, status=403,
+                                json_dumps_params={'ensure_ascii': False})
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@csrf_exempt
+def report(request):
+    """
+    接收客户端的资产汇报。
+    asset_data 可以是一台资产，也可以是多台资产组成的列表，整批在一个事务内比对入库。
+    """
+    if request.method != 'POST':
+        return HttpResponse('200 ok')
+    # 客户端在请求头中带上 sn 和数据指纹，指纹未变时无需解析请求体
+    sn = request.META.get('HTTP_X_ASSET_SN')
+    if asset_handler.touch_if_unchanged(sn, request.META.get('HTTP_X_REPORT_HASH')):
+        return JsonResponse({'status': 'ok', 'results': [{'sn': sn, 'status': 'unchanged', 'message': '资产数据没有变化！'}]},
+                            json_dumps_params={'ensure_ascii': False})
+    version = request.META.get('HTTP_X_REPORT_FORMAT', '1')
+    try:
+        if version == wire.FORMAT_VERSION:
+            # 新格式：请求体直接是（压缩后的）序列化数据
+            payload = wire.decode_body(request.body, request.content_type, request.META.get('HTTP_CONTENT_ENCODING'))
+            reports = asset_handler.parse_reports([payload])
+        elif version == '1':
+            raw_reports = request.POST.getlist('asset_data')
+            if not raw_reports:
+                return JsonResponse({'status': 'error', 'message': '没有数据！'}, status=400)
+            reports = asset_handler.parse_reports(raw_reports)
+        else:
+            raise wire.UnsupportedFormat('不支持的汇报格式版本：%s' % version)
+    except wire.UnsupportedFormat as e:
+        # 客户端收到 415 后应退回旧的表单格式
+        response = JsonResponse({'status': 'error', 'message': str(e)}, status=415,
+                                json_dumps_params={'ensure_ascii': False})
+        response['X-Report-Format'] = ','.join(wire.SUPPORTED_VERSIONS)
+        response['Accept'] = ','.join(wire.supported_content_types())
+        return response
+    except ValueError as e:
+        # json.JSONDecodeError 也是 ValueError 的子类
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    if not reports:
+        return JsonResponse({'status': 'error', 'message': '没有数据！'}, status=400)
+    if ingest_queue.is_async():
+        return enqueue_reports(reports)
+    results = asset_handler.ReportBatch(reports).process()
+    # 整批都没有通过检查时返回 400，与异步模式一致
+    status = 400 if all(result['status'] == 'error' for result in results) else 200
+    return JsonResponse({'status': 'ok', 'results': results}, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def enqueue_reports(reports):
+    """
+    异步模式：只做校验，合法的汇报写入队列后立即返回 202，由 ingest_worker 入库。
+    增量汇报的基线在入队前检查，不一致时直接要求完整汇报。
+    """
+    results, checked = [], []
+    for index, data in enumerate(reports):
+        error = asset_handler.validate_report(data)
+        if error:
+            results.append({'sn': asset_handler.report_label(data, index), 'status': 'error', 'message': error})
+        else:
+            checked.append((len(results), data))
+            results.append(None)
+    stale = asset_handler.stale_deltas([data for _, data in checked])
+    valid = []
+    for index, (position, data) in enumerate(checked):
+        if index in stale:
+            results[position] = {'sn': data['sn'], 'status': 'full_report_required',
+                                 'message': '增量汇报的基线与服务器不一致，请提交完整汇报！'}
+        else:
+            valid.append(data)
+            results[position] = {'sn': data['sn'], 'status': 'queued', 'message': '汇报已接收，等待入库！'}
+    if valid:
+        ingest_queue.IngestQueue().enqueue(valid)
+        status = 202
+    else:
+        # 与同步模式一致：整批都没有通过检查时返回 400
+        status = 400 if all(result['status'] == 'error' for result in results) else 200
+    return JsonResponse({'status': 'ok', 'results': results}, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def queue_stats(request):
+    """异步入库队列的深度、积压时间和批次耗时"""
+    return JsonResponse(ingest_queue.IngestQueue().stats())
+
+
+def approve_assets(request):
+    """
+    批量审批待审批区中的资产，只允许管理员调用。
+    POST 参数 ids 为待审批记录的 id，可以重复多次，也可以用 JSON 请求体 {"ids": [...]}；整批在一个事务中上线。
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': '只支持 POST 请求！'}, status=405,
+                            json_dumps_params={'ensure_ascii': False})
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '没有审批权限！'}, status=403,
+                            json_dumps_params={'ensure_ascii': False})
+    try:
+        if request.content_type == 'application/json':
+            ids = json.loads(request.body.decode('utf-8')).get('ids') or []
+        else:
+            ids = request.POST.getlist('ids')
+        ids = [int(approval_id) for approval_id in ids]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'ids 必须是整数列表！'}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    if not ids:
+        return JsonResponse({'status': 'error', 'message': '没有数据！'}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    results = approval.ApprovalBatch(ids, user=request.user).process()
+    return JsonResponse({'status': 'ok', 'approved': sum(result['status'] == 'approved' for result in results),
+                         'results': results}, json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def approval_queue(request):
+    """
+    待审批队列，按创建时间倒序，用 cursor 翻页。
+    可以按厂商、型号、CPU、操作系统、最小内存 / 硬盘容量，以及内存 / 硬盘 / 网卡型号、MAC、IP、组件 sn 筛选。
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', api.DEFAULT_PAGE_SIZE)), 1), api.MAX_PAGE_SIZE)
+        queryset = approval.pending_queue(request.GET)
+        rows, next_cursor = api.page(queryset, request.GET.get('cursor'), limit)
+    except (ValueError, ValidationError) as e:
+        message = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+        return JsonResponse({'status': 'error', 'message': message}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    return JsonResponse({'status': 'ok', 'results': [approval.serialize_pending(obj) for obj in rows],
+                         'next_cursor': next_cursor}, json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def search(request):
+    """
+    按名称、sn、IP、MAC、CPU 型号、标签查找资产，多个词之间用空格分隔。
+    source 表示结果来自内存索引（index）、FTS5 全文索引（fts）还是 ORM 查询（orm）。
+    """
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 200)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit 必须是整数！'}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    source, results = asset_search.search(query, limit)
+    return JsonResponse({'status': 'ok', 'source': source, 'results': results},
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def asset_list(request):
+    """
+    资产列表，按创建时间倒序，用 cursor 参数翻页（取自上一页返回的 next_cursor）。
+    可以按 asset_type、status、business_unit（包含下级业务线）筛选；limit 为每页条数。
+    """
+    queryset = api.asset_queryset()
+    if request.GET.get('asset_type'):
+        queryset = queryset.filter(asset_type=request.GET['asset_type'])
+    try:
+        if request.GET.get('status'):
+            queryset = queryset.filter(status=int(request.GET['status']))
+        if request.GET.get('business_unit'):
+            # 包含所有下级业务线的资产，经闭包表一次连接得到
+            queryset = queryset.filter(business_unit__ancestor_links__ancestor_id=int(request.GET['business_unit']))
+        limit = min(max(int(request.GET.get('limit', api.DEFAULT_PAGE_SIZE)), 1), api.MAX_PAGE_SIZE)
+        assets, next_cursor = api.page(queryset, request.GET.get('cursor'), limit)
+    except ValueError as e:
+        # api.InvalidCursor 也是 ValueError 的子类
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    return JsonResponse({'status': 'ok', 'results': [api.serialize_asset(asset) for asset in assets],
+                         'next_cursor': next_cursor}, json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def asset_detail(request, asset_id):
+    """资产详情，经 asset_cache 读取；events 参数为附带的最近事件条数"""
+    try:
+        events = int(request.GET.get('events', 0))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'events 必须是整数！'}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    data = asset_cache.asset_detail(asset_id, events)
+    if data is None:
+        raise Http404('资产不存在！')
+    return JsonResponse({'status': 'ok', 'result': data}, json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def cache_stats(request):
+    """资产详情缓存在本进程中的命中、未命中和淘汰次数"""
+    return JsonResponse(asset_cache.stats())
+
+
+@staff_required
+def asset_history(request, asset_id):
+    """资产历史：带 at 参数时返回该时刻的状态，否则返回版本列表（新的在前），limit 为返回的版本数"""
+    try:
+        if request.GET.get('at'):
+            version, state = history.state_at(asset_id, history.parse_time(request.GET['at']))
+            return JsonResponse({'status': 'ok', 'version': version, 'state': state},
+                                json_dumps_params={'ensure_ascii': False})
+        limit = min(max(int(request.GET.get('limit', 100)), 1), 1000)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    return JsonResponse({'status': 'ok', 'results': history.versions(asset_id, limit)},
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def asset_history_diff(request, asset_id):
+    """资产在 from 和 to 两个时刻之间的差异，to 不传时为现在"""
+    if not request.GET.get('from'):
+        return JsonResponse({'status': 'error', 'message': '缺少 from 参数！'}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    try:
+        start = history.parse_time(request.GET['from'])
+        end = history.parse_time(request.GET['to']) if request.GET.get('to') else None
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    from_version, old = history.state_at(asset_id, start)
+    to_version, new = history.state_at(asset_id, end)
+    return JsonResponse({'status': 'ok', 'from_version': from_version, 'to_version': to_version,
+                         'changes': history.compare(old, new)}, json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def export_inventory(request):
+    """
+    流式导出全量资产清单，format 为 csv 或 jsonl，gzip=1 时边导出边压缩。
+    数据逐批从数据库读取并立即写出，不会在内存中拼出整个文件。
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        return JsonResponse({'status': 'error', 'message': '不支持的导出格式：%s' % fmt}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    gzip = request.GET.get('gzip') in ('1', 'true')
+    response = StreamingHttpResponse(export.stream(fmt, gzip), content_type=export.content_type(fmt, gzip))
+    response['Content-Disposition'] = 'attachment; filename="%s"' % export.filename(fmt, gzip)
+    return response
+
+
+def capacity_summary(request):
+    """
+    容量汇总：scope 为 idc、business_unit 或 all，id 为机房或业务线的 id（不传则返回该范围的全部）。
+    业务线的数据包含所有下级业务线。
+    """
+    scope = request.GET.get('scope', 'all')
+    if scope not in capacity.SCOPES:
+        return JsonResponse({'status': 'error', 'message': '不支持的汇总范围：%s' % scope}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    try:
+        scope_id = int(request.GET['id']) if request.GET.get('id') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'id 必须是整数！'}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    return JsonResponse({'status': 'ok', 'scope': scope, 'results': capacity.summary(scope, scope_id)},
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def expiring(request):
+    """
+    即将到期的保修、合同和授权：days 天内到期（默认为提醒窗口），overdue=1 时包含已过期的，
+    kind 为 warranty、contract 或 license；按到期日排序，用 cursor 参数翻页，limit 为每页条数。
+    """
+    kind = request.GET.get('kind') or None
+    if kind is not None and kind not in expiry.KINDS:
+        return JsonResponse({'status': 'error', 'message': '不支持的到期类型：%s' % kind}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    try:
+        days = int(request.GET['days']) if request.GET.get('days') else None
+        limit = min(max(int(request.GET.get('limit', expiry.DEFAULT_PAGE_SIZE)), 1), expiry.MAX_PAGE_SIZE)
+        result = expiry.expiring(days, kind, request.GET.get('overdue') in ('1', 'true'),
+                                 request.GET.get('cursor'), limit)
+    except ValueError as e:
+        # expiry.InvalidCursor 也是 ValueError 的子类
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    return JsonResponse(dict(result, status='ok'), json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def address_conflicts(request):
+    """重复的 IP、MAC、序列号：kind 为 ip、mac 或 sn，limit 为返回的条数；虚拟机与宿主机共用的值不算冲突"""
+    kind = request.GET.get('kind') or None
+    if kind is not None and kind not in conflicts.KINDS:
+        return JsonResponse({'status': 'error', 'message': '不支持的地址类型：%s' % kind}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    try:
+        limit = min(max(int(request.GET.get('limit', conflicts.DEFAULT_PAGE_SIZE)), 1), conflicts.MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit 必须是整数！'}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    count, results = conflicts.conflicts(kind, limit)
+    return JsonResponse({'status': 'ok', 'count': count, 'results': results}, json_dumps_params={'ensure_ascii': False})
+
+
+def business_unit_tree(request):
+    """业务线树，来自进程内缓存；root 为子树的根业务线 id"""
+    try:
+        root = int(request.GET['root']) if request.GET.get('root') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'root 必须是整数！'}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    return JsonResponse({'status': 'ok', 'results': bu_tree.tree_cache.tree(root)}, json_dumps_params={'ensure_ascii': False})
+
+
+@staff_required
+def metrics(request):
+    """本进程的请求和 SQL 统计，Prometheus 文本格式"""
+    return HttpResponse(asset_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+汇报数据的传输格式。
+
+版本 1：表单字段 asset_data 中放 JSON 字符串（旧客户端，一直兼容）。
+版本 2：请求头 X-Report-Format: 2，请求体直接是序列化后的数据，
+        Content-Type 为 application/json 或 application/msgpack，
+        Content-Encoding 可以是 gzip、deflate（zlib）或不压缩。
+"""
+
+import gzip
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # msgpack 为可选依赖
+    msgpack = None
+
+FORMAT_VERSION = '2'
+SUPPORTED_VERSIONS = ('1', FORMAT_VERSION)
+
+# 解压后的数据上限，防止压缩炸弹
+MAX_DECODED_SIZE = 64 * 1024 * 1024
+
+
+class UnsupportedFormat(Exception):
+    """请求使用了服务器不支持的格式，对应 HTTP 415"""
+
+
+def supported_content_types():
+    types = ['application/json']
+    if msgpack is not None:
+        types.append('application/msgpack')
+    return types
+
+
+def decompress(body, content_encoding):
+    encoding = (content_encoding or 'identity').strip().lower()
+    if encoding == 'identity':
+        return body
+    if encoding == 'gzip':
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        decoder = zlib.decompressobj()
+    else:
+        raise UnsupportedFormat('不支持的压缩方式：%s' % encoding)
+    try:
+        data = decoder.decompress(body, MAX_DECODED_SIZE)
+    except zlib.error as e:
+        raise ValueError('数据解压失败：%s' % e)
+    if decoder.unconsumed_tail:
+        raise ValueError('解压后的数据超过 %s 字节' % MAX_DECODED_SIZE)
+    return data
+
+
+def loads(data, content_type):
+    content_type = (content_type or 'application/json').split(';')[0].strip().lower()
+    if content_type == 'application/json':
+        return json.loads(data.decode('utf-8'))
+    if content_type in ('application/msgpack', 'application/x-msgpack'):
+        if msgpack is None:
+            raise UnsupportedFormat('服务器未安装 msgpack')
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            raise ValueError('msgpack 数据解析失败：%s' % e)
+    raise UnsupportedFormat('不支持的数据类型：%s' % content_type)
+
+
+def decode_body(body, content_type, content_encoding):
+    """把版本 2 的请求体还原为 Python 对象"""
+    return loads(decompress(body, content_encoding), content_type)
+
+
+def encode_body(data, content_type='application/json', content_encoding='gzip'):
+    """与 decode_body 对应，客户端 core/wire.py 中有相同的实现"""
+    if content_type == 'application/json':
+        raw = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    elif content_type == 'application/msgpack':
+        if msgpack is None:
+            raise UnsupportedFormat('未安装 msgpack')
+        raw = msgpack.packb(data, use_bin_type=True)
+    else:
+        raise UnsupportedFormat('不支持的数据类型：%s' % content_type)
+    if content_encoding == 'gzip':
+        return gzip.compress(raw, compresslevel=6)
+    if content_encoding == 'deflate':
+        return zlib.compress(raw)
+    return raw